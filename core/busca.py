@@ -0,0 +1,200 @@
+"""
+Busca global de equipamentos, colaboradores e termos.
+
+Cada objeto indexado tem uma ``EntradaBusca`` com o texto já normalizado
+(minúsculas, sem acentos, separado em palavras). O índice invertido fica no
+banco: FTS5 no SQLite e tsvector + GIN no PostgreSQL; nos demais bancos a
+busca cai para ``LIKE``. As entradas são mantidas pelos sinais de
+``core.signals`` e, nas gravações em lote que não disparam sinais, pelas
+chamadas explícitas a ``indexar_queryset``.
+
+Todas as palavras da consulta precisam aparecer, sempre como prefixo
+("sn12" encontra "SN-1234"), e os resultados vêm ordenados por relevância,
+com peso maior para os identificadores (número de série, CPF, usuário, UUID).
+"""
+import re
+import unicodedata
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q
+
+from documents.models import Equipamento, TermoResponsabilidade
+
+from .models import EntradaBusca
+
+Tipo = EntradaBusca.Tipo
+PALAVRA_RE = re.compile(r'[a-z0-9]+')
+TAMANHO_LOTE = 1000
+LIMITE_PADRAO = 25
+CAMPOS_ATUALIZADOS = ['referencia', 'usuario_id', 'titulo', 'detalhe', 'chave', 'texto']
+
+
+def normalizar(*valores):
+    """Palavras dos valores em minúsculas e sem acentos, separadas por espaço."""
+    texto = unicodedata.normalize('NFKD', ' '.join(str(v) for v in valores if v))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return ' '.join(PALAVRA_RE.findall(texto))
+
+
+def normalizar_codigos(*codigos):
+    """
+    Como ``normalizar``, acrescentando cada código também sem separadores.
+
+    "SN-1234/B" é indexado como "sn 1234 b sn1234b", então tanto "1234"
+    quanto "SN1234" o encontram; o mesmo vale para CPF com ou sem pontuação.
+    """
+    palavras = []
+    for codigo in codigos:
+        partes = normalizar(codigo).split()
+        palavras.extend(partes)
+        if len(partes) > 1:
+            palavras.append(''.join(partes))
+    return ' '.join(palavras)
+
+
+def _entrada_equipamento(equipamento):
+    return EntradaBusca(
+        tipo=Tipo.EQUIPAMENTO, objeto_id=equipamento.pk, referencia=str(equipamento.pk),
+        usuario_id=equipamento.usuario_id,
+        titulo=f"{equipamento.get_tipo_display()} {equipamento.marca} {equipamento.modelo}"[:255],
+        detalhe=f"Nº de série {equipamento.numero_serie}"[:255],
+        chave=normalizar_codigos(equipamento.numero_serie),
+        texto=normalizar(equipamento.get_tipo_display(), equipamento.marca, equipamento.modelo, equipamento.descricao),
+    )
+
+
+def _entrada_colaborador(usuario):
+    return EntradaBusca(
+        tipo=Tipo.COLABORADOR, objeto_id=usuario.pk, referencia=str(usuario.pk),
+        usuario_id=usuario.pk,
+        titulo=(usuario.get_full_name() or usuario.username)[:255],
+        detalhe=' - '.join(filter(None, [usuario.cargo, usuario.departamento, usuario.email]))[:255],
+        chave=normalizar_codigos(usuario.username, usuario.cpf, usuario.email),
+        texto=normalizar(usuario.first_name, usuario.last_name, usuario.departamento, usuario.cargo),
+    )
+
+
+def _entrada_termo(termo):
+    return EntradaBusca(
+        tipo=Tipo.TERMO, objeto_id=termo.pk, referencia=str(termo.uuid),
+        usuario_id=termo.colaborador_id,
+        titulo=termo.modelo.titulo[:255],
+        detalhe=f"{termo.colaborador.get_full_name() or termo.colaborador.username} - {termo.get_status_display()}"[:255],
+        chave=normalizar_codigos(str(termo.uuid)),
+        texto=normalizar(termo.modelo.titulo),
+    )
+
+
+def _indexadores():
+    return {
+        Equipamento: (Tipo.EQUIPAMENTO, _entrada_equipamento, []),
+        get_user_model(): (Tipo.COLABORADOR, _entrada_colaborador, []),
+        TermoResponsabilidade: (Tipo.TERMO, _entrada_termo, ['modelo', 'colaborador']),
+    }
+
+
+def indexar(objetos):
+    """Cria ou atualiza as entradas dos objetos (todos do mesmo modelo)."""
+    objetos = list(objetos)
+    if not objetos:
+        return
+    _, entrada, _ = _indexadores()[type(objetos[0])]
+    EntradaBusca.objects.bulk_create(
+        [entrada(objeto) for objeto in objetos],
+        update_conflicts=True,
+        unique_fields=['tipo', 'objeto_id'],
+        update_fields=CAMPOS_ATUALIZADOS,
+    )
+
+
+def indexar_queryset(queryset, tamanho_lote=TAMANHO_LOTE):
+    """Indexa os objetos do queryset em lotes; retorna quantos foram indexados."""
+    _, _, relacionados = _indexadores()[queryset.model]
+    queryset = queryset.select_related(*relacionados).order_by('pk')
+    total = 0
+    lote = []
+    for objeto in queryset.iterator(chunk_size=tamanho_lote):
+        lote.append(objeto)
+        if len(lote) >= tamanho_lote:
+            indexar(lote)
+            total += len(lote)
+            lote = []
+    indexar(lote)
+    return total + len(lote)
+
+
+def remover(modelo, pks):
+    tipo, _, _ = _indexadores()[modelo]
+    EntradaBusca.objects.filter(tipo=tipo, objeto_id__in=pks).delete()
+
+
+def reindexar_tudo(tamanho_lote=TAMANHO_LOTE):
+    """Reconstrói o índice inteiro; retorna o total de entradas por tipo."""
+    EntradaBusca.objects.all().delete()
+    return {
+        tipo: indexar_queryset(modelo._default_manager.all(), tamanho_lote)
+        for modelo, (tipo, _, _) in _indexadores().items()
+    }
+
+
+def _consulta_sqlite(palavras, usuario_id, limite):
+    # Aspas evitam que palavras como "and"/"or"/"not" virem operadores do FTS5
+    expressao = ' '.join(f'"{palavra}"*' for palavra in palavras)
+    filtro = 'AND e.usuario_id = %s' if usuario_id is not None else ''
+    parametros = [expressao] + ([usuario_id] if usuario_id is not None else []) + [limite]
+    return EntradaBusca.objects.raw(
+        f"""
+        SELECT e.* FROM core_entradabusca_fts f
+        JOIN core_entradabusca e ON e.id = f.rowid
+        WHERE core_entradabusca_fts MATCH %s {filtro}
+        ORDER BY bm25(core_entradabusca_fts, 10.0, 1.0), e.id
+        LIMIT %s
+        """,
+        parametros,
+    )
+
+
+def _consulta_postgresql(palavras, usuario_id, limite):
+    expressao = ' & '.join(f'{palavra}:*' for palavra in palavras)
+    filtro = 'AND e.usuario_id = %s' if usuario_id is not None else ''
+    parametros = [expressao] + ([usuario_id] if usuario_id is not None else []) + [limite]
+    return EntradaBusca.objects.raw(
+        f"""
+        SELECT e.* FROM core_entradabusca e, to_tsquery('simple', %s) q
+        WHERE e.vetor @@ q {filtro}
+        ORDER BY ts_rank(e.vetor, q) DESC, e.id
+        LIMIT %s
+        """,
+        parametros,
+    )
+
+
+def _consulta_like(palavras, usuario_id, limite):
+    queryset = EntradaBusca.objects.all()
+    for palavra in palavras:
+        queryset = queryset.filter(Q(chave__contains=palavra) | Q(texto__contains=palavra))
+    if usuario_id is not None:
+        queryset = queryset.filter(usuario_id=usuario_id)
+    return queryset.order_by('tipo', 'titulo')[:limite]
+
+
+CONSULTAS = {
+    'sqlite': _consulta_sqlite,
+    'postgresql': _consulta_postgresql,
+}
+
+
+def buscar(consulta, usuario=None, limite=LIMITE_PADRAO):
+    """
+    Retorna as entradas que casam com ``consulta``, das mais relevantes às menos.
+
+    Se ``usuario`` for informado e não for da equipe, só retorna os objetos
+    dele (seus equipamentos, seus termos e o próprio cadastro).
+    """
+    palavras = normalizar(consulta).split()
+    if not palavras:
+        return []
+    usuario_id = usuario.pk if usuario is not None and not usuario.is_staff else None
+    executar = CONSULTAS.get(connection.vendor, _consulta_like)
+    return list(executar(palavras, usuario_id, limite))
@@ -0,0 +1,65 @@
+"""
+Estatísticas exibidas no dashboard.
+
+As contagens por status dos termos saem de uma única consulta com agregação
+condicional e ficam em cache por perfil (equipe) ou por colaborador durante
+``DASHBOARD_CACHE_TIMEOUT`` segundos. Salvar ou excluir um termo ou
+equipamento incrementa a versão das chaves (ver ``core.signals``), o que
+descarta de uma vez as estatísticas de todos os usuários.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from documents.models import Equipamento, TermoResponsabilidade
+
+CHAVE_VERSAO = 'dashboard:estatisticas:versao'
+
+
+def _versao():
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        # Valor inicial baseado no relógio para não reaproveitar chaves de uma versão anterior
+        cache.add(CHAVE_VERSAO, int(time.time()), None)
+        versao = cache.get(CHAVE_VERSAO, 0)
+    return versao
+
+
+def invalidar_estatisticas():
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.add(CHAVE_VERSAO, int(time.time()), None)
+
+
+def _contar_termos(termos):
+    status = TermoResponsabilidade.Status
+    return termos.aggregate(
+        total_termos=Count('pk'),
+        total_pendentes=Count('pk', filter=Q(status=status.PENDENTE)),
+        total_assinados=Count('pk', filter=Q(status=status.ASSINADO)),
+    )
+
+
+def calcular_estatisticas(user):
+    """Contagens de termos e equipamentos visíveis para o usuário."""
+    if user.is_staff:
+        estatisticas = _contar_termos(TermoResponsabilidade.objects.all())
+        estatisticas['total_equipamentos'] = Equipamento.objects.count()
+    else:
+        estatisticas = _contar_termos(TermoResponsabilidade.objects.filter(colaborador=user))
+        estatisticas['total_equipamentos'] = Equipamento.objects.filter(usuario=user).count()
+    return estatisticas
+
+
+def obter_estatisticas(user):
+    """Retorna as estatísticas do dashboard, calculando-as apenas se não estiverem em cache."""
+    perfil = 'equipe' if user.is_staff else f'usuario:{user.pk}'
+    chave = f'dashboard:estatisticas:{_versao()}:{perfil}'
+    estatisticas = cache.get(chave)
+    if estatisticas is None:
+        estatisticas = calcular_estatisticas(user)
+        cache.set(chave, estatisticas, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60))
+    return estatisticas
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.busca import TAMANHO_LOTE, reindexar_tudo
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice da busca global (equipamentos, colaboradores e termos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE,
+                            help=f'Objetos indexados por INSERT (padrão: {TAMANHO_LOTE})')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        totais = reindexar_tudo(tamanho_lote=max(1, options['lote']))
+        detalhes = ', '.join(f'{total} {tipo}(s)' for tipo, total in totais.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice reconstruído em {time.perf_counter() - inicio:.1f}s: {detalhes}.'
+        ))
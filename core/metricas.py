@@ -0,0 +1,162 @@
+"""
+Métricas de desempenho no formato de exposição do Prometheus.
+
+As métricas ficam em memória, por processo: cada worker do servidor expõe as
+suas em ``/metricas/`` (coletadas pelo Prometheus de cada instância). São
+registradas pelo ``core.middleware.InstrumentacaoMiddleware`` (tempo por view,
+consultas ao banco, acessos ao cache) e por ``medir`` nos trechos de código
+que interessam, como as etapas de geração de PDF.
+
+Durante uma requisição instrumentada, ``medir`` também soma o tempo da etapa
+no resumo da requisição, usado no log de requisições lentas.
+"""
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+# Limites (s) dos buckets dos histogramas de duração
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DESCRICOES = {
+    'portal_requisicoes_total': 'Requisições atendidas, por view, método e status.',
+    'portal_requisicao_segundos': 'Duração das requisições, por view.',
+    'portal_db_consultas_total': 'Consultas ao banco feitas pelas requisições, por view.',
+    'portal_db_segundos_total': 'Tempo gasto em consultas ao banco pelas requisições, por view.',
+    'portal_cache_acessos_total': 'Leituras do cache pelas requisições, por view e resultado (hit/miss).',
+    'portal_etapa_segundos': 'Duração das etapas instrumentadas (geração de PDF, etc.).',
+}
+
+
+def instrumentacao_ativa():
+    return settings.INSTRUMENTACAO['ATIVA']
+
+
+@dataclass
+class ResumoRequisicao:
+    """Totais de uma requisição, acumulados enquanto ela é atendida."""
+    consultas: int = 0
+    tempo_banco: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    etapas: dict = field(default_factory=lambda: defaultdict(float))
+
+
+_resumo_atual = contextvars.ContextVar('resumo_requisicao', default=None)
+
+
+def iniciar_resumo():
+    resumo = ResumoRequisicao()
+    return resumo, _resumo_atual.set(resumo)
+
+
+def encerrar_resumo(token):
+    _resumo_atual.reset(token)
+
+
+def resumo_atual():
+    return _resumo_atual.get()
+
+
+class Registro:
+    """Contadores e histogramas em memória, seguros entre threads."""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._contadores = defaultdict(float)
+        self._histogramas = {}
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._trava:
+            self._contadores[chave] += valor
+
+    def observar(self, nome, valor, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._trava:
+            contagens, soma = self._histogramas.get(chave, ([0] * len(BUCKETS), 0.0))
+            for i, limite in enumerate(BUCKETS):
+                if valor <= limite:
+                    contagens[i] += 1
+            self._histogramas[chave] = (contagens, soma + valor)
+            self._contadores[(f'{nome}_count', chave[1])] += 1
+
+    def limpar(self):
+        with self._trava:
+            self._contadores.clear()
+            self._histogramas.clear()
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)."""
+        with self._trava:
+            contadores = dict(self._contadores)
+            histogramas = {chave: (list(c), s) for chave, (c, s) in self._histogramas.items()}
+
+        linhas = []
+        nomes_histogramas = {nome for nome, _ in histogramas}
+        for nome in sorted({nome for nome, _ in contadores if not nome.endswith('_count')}):
+            linhas.extend(_cabecalho(nome, 'counter'))
+            for (n, rotulos), valor in sorted(contadores.items()):
+                if n == nome:
+                    linhas.append(f'{nome}{_rotulos(rotulos)} {_numero(valor)}')
+        for nome in sorted(nomes_histogramas):
+            linhas.extend(_cabecalho(nome, 'histogram'))
+            for (n, rotulos), (contagens, soma) in sorted(histogramas.items()):
+                if n != nome:
+                    continue
+                for limite, quantidade in zip(BUCKETS, contagens):
+                    linhas.append(f'{nome}_bucket{_rotulos(rotulos + (("le", str(limite)),))} {quantidade}')
+                total = int(contadores[(f'{nome}_count', rotulos)])
+                linhas.append(f'{nome}_bucket{_rotulos(rotulos + (("le", "+Inf"),))} {total}')
+                linhas.append(f'{nome}_sum{_rotulos(rotulos)} {_numero(soma)}')
+                linhas.append(f'{nome}_count{_rotulos(rotulos)} {total}')
+        return '\n'.join(linhas) + '\n'
+
+
+def _cabecalho(nome, tipo):
+    if nome in DESCRICOES:
+        yield f'# HELP {nome} {DESCRICOES[nome]}'
+    yield f'# TYPE {nome} {tipo}'
+
+
+def _rotulos(rotulos):
+    if not rotulos:
+        return ''
+    pares = ','.join(f'{chave}="{_escapar(valor)}"' for chave, valor in rotulos)
+    return '{' + pares + '}'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _numero(valor):
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+registro = Registro()
+
+
+@contextmanager
+def medir(etapa):
+    """
+    Mede a duração do bloco como ``portal_etapa_segundos{etapa=...}``.
+
+    Sem a instrumentação ativa o bloco é executado sem nenhuma medição.
+    """
+    if not instrumentacao_ativa():
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        registro.observar('portal_etapa_segundos', duracao, etapa=etapa)
+        resumo = resumo_atual()
+        if resumo is not None:
+            resumo.etapas[etapa] += duracao
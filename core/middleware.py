@@ -0,0 +1,129 @@
+import cProfile
+import logging
+import os
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+from .metricas import encerrar_resumo, iniciar_resumo, instrumentacao_ativa, registro, resumo_atual
+
+logger = logging.getLogger(__name__)
+
+_AUSENTE = object()
+
+
+def _instrumentar_cache(backend):
+    """Conta hits e misses das leituras (``get``) do backend na requisição atual."""
+    if getattr(backend, '_instrumentado', False):
+        return
+    get_original = backend.get
+
+    def get(key, default=None, version=None):
+        valor = get_original(key, _AUSENTE, version=version)
+        resumo = resumo_atual()
+        if resumo is not None:
+            if valor is _AUSENTE:
+                resumo.cache_misses += 1
+            else:
+                resumo.cache_hits += 1
+        return default if valor is _AUSENTE else valor
+
+    backend.get = get
+    backend._instrumentado = True
+
+
+def _medir_consultas(resumo):
+    def executar(execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            resumo.consultas += 1
+            resumo.tempo_banco += time.perf_counter() - inicio
+    return executar
+
+
+class InstrumentacaoMiddleware:
+    """
+    Registra, por view, a duração das requisições, as consultas ao banco (quantidade
+    e tempo) e as leituras do cache, expostas em ``/metricas/`` (ver ``core.metricas``).
+
+    Requisições acima de ``INSTRUMENTACAO['LIMITE_LENTA']`` segundos são registradas
+    no log com a divisão do tempo entre banco e etapas medidas (renderização do
+    Word, conversão, assinatura...). Uma fração ``AMOSTRAGEM_PERFIL`` das requisições
+    roda sob o cProfile, e o perfil das que forem lentas é gravado em
+    ``DIRETORIO_PERFIS`` (abrir com ``python -m pstats`` ou snakeviz).
+
+    Só é carregado com ``INSTRUMENTACAO['ATIVA']``; respostas em streaming são
+    medidas até o início do envio.
+    """
+
+    def __init__(self, get_response):
+        if not instrumentacao_ativa():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = settings.INSTRUMENTACAO
+        perfil = self._iniciar_perfil(config['AMOSTRAGEM_PERFIL'])
+        resumo, token = iniciar_resumo()
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pilha:
+                for conexao in connections.all():
+                    pilha.enter_context(conexao.execute_wrapper(_medir_consultas(resumo)))
+                for alias in settings.CACHES:
+                    _instrumentar_cache(caches[alias])
+                response = self.get_response(request)
+        finally:
+            duracao = time.perf_counter() - inicio
+            encerrar_resumo(token)
+            if perfil is not None:
+                perfil.disable()
+
+        view = request.resolver_match.view_name if request.resolver_match else 'nao_resolvida'
+        self._registrar(view, request.method, response.status_code, duracao, resumo)
+        if duracao >= config['LIMITE_LENTA']:
+            etapas = ', '.join(f'{etapa} {tempo:.3f}s' for etapa, tempo in resumo.etapas.items()) or 'nenhuma'
+            logger.warning(
+                f"Requisição lenta: {request.method} {request.path} ({view}) em {duracao:.3f}s; "
+                f"banco: {resumo.consultas} consulta(s) em {resumo.tempo_banco:.3f}s; "
+                f"cache: {resumo.cache_hits} hit(s), {resumo.cache_misses} miss(es); etapas: {etapas}"
+            )
+            if perfil is not None:
+                self._gravar_perfil(perfil, view, duracao, config['DIRETORIO_PERFIS'])
+        return response
+
+    def _iniciar_perfil(self, amostragem):
+        if not amostragem or random.random() >= amostragem:
+            return None
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Outro profiler já ativo (outra requisição na mesma thread, depurador...)
+            return None
+        return perfil
+
+    def _registrar(self, view, metodo, status, duracao, resumo):
+        registro.incrementar('portal_requisicoes_total', view=view, metodo=metodo, status=status)
+        registro.observar('portal_requisicao_segundos', duracao, view=view)
+        registro.incrementar('portal_db_consultas_total', resumo.consultas, view=view)
+        registro.incrementar('portal_db_segundos_total', resumo.tempo_banco, view=view)
+        if resumo.cache_hits:
+            registro.incrementar('portal_cache_acessos_total', resumo.cache_hits, view=view, resultado='hit')
+        if resumo.cache_misses:
+            registro.incrementar('portal_cache_acessos_total', resumo.cache_misses, view=view, resultado='miss')
+
+    def _gravar_perfil(self, perfil, view, duracao, diretorio):
+        os.makedirs(diretorio, exist_ok=True)
+        nome = f"{timezone.now():%Y%m%d-%H%M%S}-{view.replace(':', '_')}-{duracao * 1000:.0f}ms.prof"
+        caminho = os.path.join(diretorio, nome)
+        perfil.dump_stats(caminho)
+        logger.info(f"Perfil da requisição gravado em {caminho}")
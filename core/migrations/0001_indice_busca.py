@@ -0,0 +1,187 @@
+# Generated by Django 4.2.10 on 2026-10-18 15:35
+
+import itertools
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+
+SQLITE = [
+    # Tabela FTS5 com conteúdo externo: guarda só o índice invertido e é
+    # mantida pelos gatilhos a cada INSERT/UPDATE/DELETE em core_entradabusca
+    """
+    CREATE VIRTUAL TABLE core_entradabusca_fts USING fts5(
+        chave, texto,
+        content='core_entradabusca', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER core_entradabusca_ai AFTER INSERT ON core_entradabusca BEGIN
+        INSERT INTO core_entradabusca_fts(rowid, chave, texto) VALUES (new.id, new.chave, new.texto);
+    END
+    """,
+    """
+    CREATE TRIGGER core_entradabusca_ad AFTER DELETE ON core_entradabusca BEGIN
+        INSERT INTO core_entradabusca_fts(core_entradabusca_fts, rowid, chave, texto)
+        VALUES ('delete', old.id, old.chave, old.texto);
+    END
+    """,
+    """
+    CREATE TRIGGER core_entradabusca_au AFTER UPDATE ON core_entradabusca BEGIN
+        INSERT INTO core_entradabusca_fts(core_entradabusca_fts, rowid, chave, texto)
+        VALUES ('delete', old.id, old.chave, old.texto);
+        INSERT INTO core_entradabusca_fts(rowid, chave, texto) VALUES (new.id, new.chave, new.texto);
+    END
+    """,
+]
+SQLITE_REVERSO = [
+    'DROP TRIGGER IF EXISTS core_entradabusca_au',
+    'DROP TRIGGER IF EXISTS core_entradabusca_ad',
+    'DROP TRIGGER IF EXISTS core_entradabusca_ai',
+    'DROP TABLE IF EXISTS core_entradabusca_fts',
+]
+
+POSTGRESQL = [
+    """
+    ALTER TABLE core_entradabusca ADD COLUMN vetor tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', chave), 'A') || setweight(to_tsvector('simple', texto), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX core_entradabusca_vetor_idx ON core_entradabusca USING GIN (vetor)',
+]
+POSTGRESQL_REVERSO = [
+    'DROP INDEX IF EXISTS core_entradabusca_vetor_idx',
+    'ALTER TABLE core_entradabusca DROP COLUMN IF EXISTS vetor',
+]
+
+
+def _executar(schema_editor, comandos):
+    for comando in comandos.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(comando)
+
+
+def criar_indice_textual(apps, schema_editor):
+    # Outros bancos usam a busca por LIKE de core.busca, sem índice textual
+    _executar(schema_editor, {'sqlite': SQLITE, 'postgresql': POSTGRESQL})
+
+
+def remover_indice_textual(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': SQLITE_REVERSO, 'postgresql': POSTGRESQL_REVERSO})
+
+
+# Cópia congelada da indexação de core.busca, como era ao criar o índice: a
+# migração não importa o módulo, que pode mudar depois sem alterar o que ela faz.
+# Para reconstruir o índice com a versão atual, use o comando reindexar_busca
+_PALAVRA_RE = re.compile(r'[a-z0-9]+')
+_TAMANHO_LOTE = 1000
+
+
+def _normalizar(*valores):
+    texto = unicodedata.normalize('NFKD', ' '.join(str(v) for v in valores if v))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return ' '.join(_PALAVRA_RE.findall(texto))
+
+
+def _normalizar_codigos(*codigos):
+    palavras = []
+    for codigo in codigos:
+        partes = _normalizar(codigo).split()
+        palavras.extend(partes)
+        if len(partes) > 1:
+            palavras.append(''.join(partes))
+    return ' '.join(palavras)
+
+
+def _nome(usuario):
+    return f"{usuario.first_name} {usuario.last_name}".strip() or usuario.username
+
+
+def _entrada_equipamento(equipamento):
+    tipo = equipamento.get_tipo_display()
+    return dict(
+        tipo='equipamento', objeto_id=equipamento.pk, referencia=str(equipamento.pk),
+        usuario_id=equipamento.usuario_id,
+        titulo=f"{tipo} {equipamento.marca} {equipamento.modelo}"[:255],
+        detalhe=f"Nº de série {equipamento.numero_serie}"[:255],
+        chave=_normalizar_codigos(equipamento.numero_serie),
+        texto=_normalizar(tipo, equipamento.marca, equipamento.modelo, equipamento.descricao),
+    )
+
+
+def _entrada_colaborador(usuario):
+    return dict(
+        tipo='colaborador', objeto_id=usuario.pk, referencia=str(usuario.pk),
+        usuario_id=usuario.pk,
+        titulo=_nome(usuario)[:255],
+        detalhe=' - '.join(filter(None, [usuario.cargo, usuario.departamento, usuario.email]))[:255],
+        chave=_normalizar_codigos(usuario.username, usuario.cpf, usuario.email),
+        texto=_normalizar(usuario.first_name, usuario.last_name, usuario.departamento, usuario.cargo),
+    )
+
+
+def _entrada_termo(termo):
+    return dict(
+        tipo='termo', objeto_id=termo.pk, referencia=str(termo.uuid),
+        usuario_id=termo.colaborador_id,
+        titulo=termo.modelo.titulo[:255],
+        detalhe=f"{_nome(termo.colaborador)} - {termo.get_status_display()}"[:255],
+        chave=_normalizar_codigos(str(termo.uuid)),
+        texto=_normalizar(termo.modelo.titulo),
+    )
+
+
+def popular_indice(apps, schema_editor):
+    # Numa base já existente, a busca funciona logo após o migrate
+    EntradaBusca = apps.get_model('core', 'EntradaBusca')
+    indexadores = [
+        (apps.get_model('documents', 'Equipamento').objects.all(), _entrada_equipamento),
+        (apps.get_model(settings.AUTH_USER_MODEL).objects.all(), _entrada_colaborador),
+        (apps.get_model('documents', 'TermoResponsabilidade').objects.select_related('modelo', 'colaborador'),
+         _entrada_termo),
+    ]
+    for queryset, entrada in indexadores:
+        objetos = queryset.order_by('pk').iterator(chunk_size=_TAMANHO_LOTE)
+        while True:
+            lote = [EntradaBusca(**entrada(objeto)) for objeto in itertools.islice(objetos, _TAMANHO_LOTE)]
+            if not lote:
+                break
+            EntradaBusca.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0012_digest_pdf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntradaBusca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('equipamento', 'Equipamento'), ('colaborador', 'Colaborador'), ('termo', 'Termo')], max_length=20, verbose_name='Tipo')),
+                ('objeto_id', models.PositiveBigIntegerField(verbose_name='ID do objeto')),
+                ('referencia', models.CharField(max_length=64, verbose_name='Referência')),
+                ('usuario_id', models.PositiveBigIntegerField(blank=True, db_index=True, null=True, verbose_name='Usuário')),
+                ('titulo', models.CharField(max_length=255, verbose_name='Título')),
+                ('detalhe', models.CharField(blank=True, max_length=255, verbose_name='Detalhe')),
+                ('chave', models.TextField(blank=True, verbose_name='Identificadores')),
+                ('texto', models.TextField(blank=True, verbose_name='Texto')),
+            ],
+            options={
+                'verbose_name': 'Entrada da busca',
+                'verbose_name_plural': 'Entradas da busca',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='entradabusca',
+            constraint=models.UniqueConstraint(fields=('tipo', 'objeto_id'), name='busca_tipo_objeto_unico'),
+        ),
+        migrations.RunPython(criar_indice_textual, remover_indice_textual),
+        migrations.RunPython(popular_indice, migrations.RunPython.noop),
+    ]
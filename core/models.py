@@ -1,3 +1,39 @@
 from django.db import models
 
-# Create your models here.
+
+class EntradaBusca(models.Model):
+    """
+    Entrada do índice de busca global (um registro por objeto indexado).
+
+    ``chave`` guarda os identificadores (número de série, CPF, usuário, UUID),
+    que pesam mais no ranking, e ``texto`` o restante; ambos já normalizados
+    por ``core.busca.normalizar``. O índice invertido propriamente dito fica
+    no banco: uma tabela FTS5 no SQLite ou uma coluna tsvector com índice GIN
+    no PostgreSQL (ver a migração 0001).
+    """
+
+    class Tipo(models.TextChoices):
+        EQUIPAMENTO = 'equipamento', 'Equipamento'
+        COLABORADOR = 'colaborador', 'Colaborador'
+        TERMO = 'termo', 'Termo'
+
+    tipo = models.CharField('Tipo', max_length=20, choices=Tipo.choices)
+    objeto_id = models.PositiveBigIntegerField('ID do objeto')
+    # Identificador usado na URL do objeto (pk ou uuid)
+    referencia = models.CharField('Referência', max_length=64)
+    # Colaborador dono do objeto: usuários comuns só encontram o que é seu
+    usuario_id = models.PositiveBigIntegerField('Usuário', null=True, blank=True, db_index=True)
+    titulo = models.CharField('Título', max_length=255)
+    detalhe = models.CharField('Detalhe', max_length=255, blank=True)
+    chave = models.TextField('Identificadores', blank=True)
+    texto = models.TextField('Texto', blank=True)
+
+    class Meta:
+        verbose_name = 'Entrada da busca'
+        verbose_name_plural = 'Entradas da busca'
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'objeto_id'], name='busca_tipo_objeto_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()}: {self.titulo}"
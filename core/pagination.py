@@ -0,0 +1,172 @@
+"""
+Paginação por cursor (keyset), filtros e ordenação das listagens.
+
+Em vez de ``OFFSET``, cada página continua a partir dos valores das colunas de
+ordenação do último (ou primeiro) registro exibido, codificados no cursor
+``?depois=`` (ou ``?antes=``). A consulta de qualquer página percorre apenas o
+índice a partir desse ponto, então o tempo de resposta não cresce com a
+posição da página nem com o tamanho da tabela, e não há ``COUNT(*)``.
+
+As colunas de ordenação precisam ser não nulas; a chave primária é sempre
+acrescentada como desempate, para que a ordem seja total.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+def _codificar_cursor(valores):
+    dados = json.dumps(valores, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+
+def _decodificar_cursor(cursor):
+    preenchimento = '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+
+
+class PaginaKeyset:
+    """Página de uma listagem paginada por cursor, com os links para as páginas vizinhas."""
+
+    def __init__(self, request, object_list, cursor_anterior, cursor_proximo):
+        self.request = request
+        self.object_list = object_list
+        self.cursor_anterior = cursor_anterior
+        self.cursor_proximo = cursor_proximo
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_next(self):
+        return self.cursor_proximo is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def _querystring(self, **parametros):
+        query = self.request.GET.copy()
+        query.pop('depois', None)
+        query.pop('antes', None)
+        query.update(parametros)
+        return query.urlencode()
+
+    def previous_querystring(self):
+        return self._querystring(antes=self.cursor_anterior) if self.has_previous() else ''
+
+    def next_querystring(self):
+        return self._querystring(depois=self.cursor_proximo) if self.has_next() else ''
+
+
+class KeysetPaginationMixin:
+    """
+    Filtros, ordenação e paginação por cursor para ``ListView``.
+
+    ``filtros`` associa parâmetros da querystring a lookups do ORM; valores
+    vazios ou inválidos são ignorados. ``ordenacoes`` associa o parâmetro
+    ``?ordem=`` a um rótulo e às colunas de ordenação.
+    """
+    paginate_by = 25
+    filtros = {}
+    ordenacoes = {'recentes': ('Mais recentes', ['-pk'])}
+    ordenacao_padrao = 'recentes'
+
+    def get_ordem(self):
+        ordem = self.request.GET.get('ordem')
+        return ordem if ordem in self.ordenacoes else self.ordenacao_padrao
+
+    def get_campos_ordenacao(self):
+        """Lista de (campo, decrescente), terminando pela chave primária."""
+        campos = []
+        for campo in self.ordenacoes[self.get_ordem()][1]:
+            decrescente = campo.startswith('-')
+            nome = campo.lstrip('-')
+            if nome == 'pk':
+                nome = self.model._meta.pk.name
+            campos.append((nome, decrescente))
+        nome_pk = self.model._meta.pk.name
+        if nome_pk not in (nome for nome, _ in campos):
+            campos.append((nome_pk, campos[0][1] if campos else True))
+        return campos
+
+    def filtrar(self, queryset):
+        for parametro, lookup in self.filtros.items():
+            valor = self.request.GET.get(parametro)
+            if not valor:
+                continue
+            try:
+                queryset = queryset.filter(**{lookup: valor})
+            except (ValueError, ValidationError):
+                continue
+        return queryset
+
+    def get_queryset(self):
+        queryset = self.filtrar(super().get_queryset())
+        return queryset.order_by(*(('-' if desc else '') + nome for nome, desc in self.get_campos_ordenacao()))
+
+    def _valores(self, obj, campos):
+        return [getattr(obj, self.model._meta.get_field(nome).attname) for nome, _ in campos]
+
+    def _ler_cursor(self, cursor, campos):
+        try:
+            valores = _decodificar_cursor(cursor)
+            if not isinstance(valores, list) or len(valores) != len(campos):
+                return None
+            return [self.model._meta.get_field(nome).to_python(valor) for (nome, _), valor in zip(campos, valores)]
+        except (ValueError, TypeError, binascii.Error, ValidationError, FieldDoesNotExist):
+            return None
+
+    @staticmethod
+    def _apos(campos, valores, avancar):
+        """Condição "vem depois de ``valores``" na ordem dos campos (ou antes, se ``avancar`` for falso)."""
+        condicao = Q()
+        for i, (nome, decrescente) in enumerate(campos):
+            operador = 'lt' if decrescente == avancar else 'gt'
+            iguais = {campo: valor for (campo, _), valor in zip(campos[:i], valores[:i])}
+            condicao |= Q(**iguais, **{f'{nome}__{operador}': valores[i]})
+        return condicao
+
+    def paginate_queryset(self, queryset, page_size):
+        campos = self.get_campos_ordenacao()
+        depois = self.request.GET.get('depois')
+        antes = self.request.GET.get('antes')
+        avancar = not antes
+        valores = self._ler_cursor(depois or antes, campos) if (depois or antes) else None
+
+        if valores is None:
+            avancar = True
+        else:
+            queryset = queryset.filter(self._apos(campos, valores, avancar))
+        if not avancar:
+            queryset = queryset.reverse()
+
+        registros = list(queryset[:page_size + 1])
+        ha_mais = len(registros) > page_size
+        registros = registros[:page_size]
+        if not avancar:
+            registros.reverse()
+
+        if avancar:
+            tem_anterior, tem_proximo = valores is not None, ha_mais
+        else:
+            tem_anterior, tem_proximo = ha_mais, True
+        cursor_anterior = _codificar_cursor(self._valores(registros[0], campos)) if tem_anterior and registros else None
+        cursor_proximo = _codificar_cursor(self._valores(registros[-1], campos)) if tem_proximo and registros else None
+
+        pagina = PaginaKeyset(self.request, registros, cursor_anterior, cursor_proximo)
+        return None, pagina, registros, pagina.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['ordenacoes'] = [(valor, rotulo) for valor, (rotulo, _) in self.ordenacoes.items()]
+        context['ordem_atual'] = self.get_ordem()
+        return context
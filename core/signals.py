@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from documents.models import DocumentoModelo, Equipamento, TermoResponsabilidade
+
+from . import busca
+from .estatisticas import invalidar_estatisticas
+
+User = get_user_model()
+
+# Campos do usuário que aparecem no índice de busca; salvar só outros campos
+# (o last_login a cada login, por exemplo) não reindexa nada
+CAMPOS_BUSCA_USUARIO = {'username', 'first_name', 'last_name', 'email', 'cpf', 'cargo', 'departamento'}
+
+# Campos do PDF do termo, que não entram nas estatísticas nem na busca: a
+# gravação do PDF gerado (``registrar_pdf_termo``) não invalida nem reindexa nada
+CAMPOS_PDF_TERMO = {'arquivo_pdf', 'digest_pdf', 'digest_pdf_verificado_em', 'status_pdf', 'geracao_pdf_iniciada_em'}
+
+
+def _so_campos_do_pdf(sender, update_fields):
+    return sender is TermoResponsabilidade and update_fields is not None and set(update_fields) <= CAMPOS_PDF_TERMO
+
+
+@receiver([post_save, post_delete], sender=TermoResponsabilidade)
+@receiver([post_save, post_delete], sender=Equipamento)
+def atualizar_estatisticas(sender, update_fields=None, **kwargs):
+    if not _so_campos_do_pdf(sender, update_fields):
+        invalidar_estatisticas()
+
+
+@receiver(post_save, sender=TermoResponsabilidade)
+@receiver(post_save, sender=Equipamento)
+def indexar_objeto(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and not _so_campos_do_pdf(sender, update_fields):
+        busca.indexar([instance])
+
+
+@receiver(post_save, sender=User)
+def indexar_usuario(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not CAMPOS_BUSCA_USUARIO & set(update_fields)):
+        return
+    busca.indexar([instance])
+    # O nome do colaborador aparece nos resultados dos seus termos
+    busca.indexar_queryset(TermoResponsabilidade.objects.filter(colaborador=instance))
+
+
+@receiver(post_save, sender=DocumentoModelo)
+def indexar_termos_do_modelo(sender, instance, raw=False, **kwargs):
+    if not raw:
+        busca.indexar_queryset(TermoResponsabilidade.objects.filter(modelo=instance))
+
+
+@receiver(post_delete, sender=TermoResponsabilidade)
+@receiver(post_delete, sender=Equipamento)
+@receiver(post_delete, sender=User)
+def remover_do_indice(sender, instance, **kwargs):
+    busca.remover(sender, [instance.pk])
+
+
+@receiver(connection_created)
+def configurar_sqlite(sender, connection, **kwargs):
+    """Aplica ``SQLITE_PRAGMAS`` (modo WAL...) a cada nova conexão SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, valor in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {valor}')
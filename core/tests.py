@@ -1,3 +1,347 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from documents.models import DocumentoModelo, Equipamento, TermoResponsabilidade
+from documents.tests import ConsultasConstantesMixin, criar_termo
+
+from . import busca
+from .metricas import medir, registro
+from .models import EntradaBusca
+from .estatisticas import calcular_estatisticas, obter_estatisticas
+
+User = get_user_model()
+
+
+class DashboardConsultasTests(ConsultasConstantesMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.modelo = DocumentoModelo.objects.create(titulo='Termo', conteudo='<p>${NOME}</p>', versao='1')
+
+    def test_dashboard_do_colaborador(self):
+        colaborador = User.objects.create_user(username='colaborador', password='senha')
+        self.client.force_login(colaborador)
+
+        def criar_termos(quantidade):
+            for _ in range(quantidade):
+                criar_termo(colaborador, modelo=self.modelo, equipamentos=3, status=TermoResponsabilidade.Status.PENDENTE)
+
+        self.assertConsultasConstantes(reverse('core:dashboard'), criar_termos)
+
+    def test_dashboard_da_equipe(self):
+        staff = User.objects.create_user(username='admin', password='senha', is_staff=True)
+        self.client.force_login(staff)
+        total = [0]
+
+        def criar_termos(quantidade):
+            for _ in range(quantidade):
+                total[0] += 1
+                colaborador = User.objects.create_user(username=f'colaborador{total[0]}', password='senha')
+                criar_termo(colaborador, modelo=self.modelo)
+
+        self.assertConsultasConstantes(reverse('core:dashboard'), criar_termos)
+
+
+class EstatisticasDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.modelo = DocumentoModelo.objects.create(titulo='Termo', conteudo='<p>${NOME}</p>', versao='1')
+        self.staff = User.objects.create_user(username='admin', password='senha', is_staff=True)
+        self.colaborador = User.objects.create_user(username='colaborador', password='senha')
+        self.outro = User.objects.create_user(username='outro', password='senha')
+        criar_termo(self.colaborador, modelo=self.modelo, equipamentos=2)
+        criar_termo(self.colaborador, modelo=self.modelo, status=TermoResponsabilidade.Status.ASSINADO)
+        criar_termo(self.outro, modelo=self.modelo, status=TermoResponsabilidade.Status.CANCELADO)
+
+    def test_contagens_em_uma_consulta_por_tabela(self):
+        with self.assertNumQueries(2):
+            estatisticas = calcular_estatisticas(self.staff)
+        self.assertEqual(estatisticas, {
+            'total_termos': 3, 'total_pendentes': 1, 'total_assinados': 1, 'total_equipamentos': 4,
+        })
+        self.assertEqual(calcular_estatisticas(self.colaborador), {
+            'total_termos': 2, 'total_pendentes': 1, 'total_assinados': 1, 'total_equipamentos': 0,
+        })
+
+    def test_cache_por_usuario_invalidado_ao_salvar(self):
+        self.assertEqual(obter_estatisticas(self.colaborador)['total_pendentes'], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(obter_estatisticas(self.colaborador)['total_pendentes'], 1)
+        self.assertEqual(obter_estatisticas(self.outro)['total_termos'], 1)
+
+        termo = TermoResponsabilidade.objects.filter(colaborador=self.colaborador, status='PENDENTE').get()
+        termo.status = TermoResponsabilidade.Status.ASSINADO
+        termo.save()
+        self.assertEqual(obter_estatisticas(self.colaborador)['total_assinados'], 2)
+
+        termo.delete()
+        self.assertEqual(obter_estatisticas(self.colaborador)['total_termos'], 1)
+
+
+class PaginacaoKeysetTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='admin', password='senha', is_staff=True)
+        self.client.force_login(self.staff)
+        for i in range(7):
+            Equipamento.objects.create(
+                tipo='NOTEBOOK' if i % 2 else 'MONITOR', marca='Dell', modelo='X',
+                numero_serie=f'SN-{i:02d}', descricao='-', valor=Decimal('100.00'),
+                # Datas repetidas: o desempate pela chave primária mantém a ordem total
+                data_aquisicao=date(2024, 1, 1 + i // 3),
+            )
+        self.url = reverse('documents:equipamento_list')
+
+    def percorrer(self, params):
+        vistos, paginas = [], []
+        response = self.client.get(self.url, params)
+        while True:
+            pagina = response.context['page_obj']
+            paginas.append([e.pk for e in pagina])
+            vistos.extend(e.numero_serie for e in pagina)
+            if not pagina.has_next():
+                return vistos, paginas, response
+            response = self.client.get(f'{self.url}?{pagina.next_querystring()}')
+
+    def test_percorre_todas_as_paginas_nos_dois_sentidos(self):
+        with mock.patch('documents.views.EquipamentoListView.paginate_by', 3):
+            vistos, paginas, response = self.percorrer({'ordem': 'numero_serie'})
+            self.assertEqual(vistos, [f'SN-{i:02d}' for i in range(7)])
+            self.assertEqual([len(p) for p in paginas], [3, 3, 1])
+
+            # Voltando a partir da última página
+            pagina = response.context['page_obj']
+            response = self.client.get(f'{self.url}?{pagina.previous_querystring()}')
+            self.assertEqual([e.pk for e in response.context['page_obj']], paginas[1])
+            response = self.client.get(f"{self.url}?{response.context['page_obj'].previous_querystring()}")
+            self.assertEqual([e.pk for e in response.context['page_obj']], paginas[0])
+            self.assertFalse(response.context['page_obj'].has_previous())
+
+            vistos, _, _ = self.percorrer({'ordem': 'recentes'})
+            self.assertEqual(len(set(vistos)), 7)
+            esperado = list(Equipamento.objects.order_by('-data_aquisicao', '-pk').values_list('numero_serie', flat=True))
+            self.assertEqual(vistos, esperado)
+
+    def test_filtros_e_parametros_invalidos(self):
+        response = self.client.get(self.url, {'tipo': 'MONITOR', 'ate': '2024-01-02'})
+        self.assertEqual({e.numero_serie for e in response.context['equipamentos']}, {'SN-00', 'SN-02', 'SN-04'})
+
+        response = self.client.get(self.url, {'colaborador': 'abc', 'de': 'ontem', 'depois': 'xyz', 'ordem': '?'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['equipamentos']), 7)
+
+        response = self.client.get(reverse('users:colaborador_list'), {'ativo': '1', 'ordem': 'username'})
+        self.assertEqual([u.username for u in response.context['users']], ['admin'])
+
+
+class BuscaGlobalTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='admin', password='senha', is_staff=True)
+        self.colaborador = User.objects.create_user(
+            username='jsilva', password='senha', first_name='João', last_name='Simões',
+            cpf='123.456.789-00', departamento='Logística',
+        )
+        self.outro = User.objects.create_user(username='outro', password='senha', first_name='Maria')
+        self.modelo = DocumentoModelo.objects.create(titulo='Termo de Notebook', conteudo='<p>${NOME}</p>', versao='1')
+        self.notebook = Equipamento.objects.create(
+            tipo='NOTEBOOK', marca='Dell', modelo='Latitude 5440', numero_serie='ABX-77812/B',
+            descricao='Notebook da logística', valor=Decimal('3500.00'), data_aquisicao=date(2024, 1, 1),
+            usuario=self.colaborador,
+        )
+        self.monitor = Equipamento.objects.create(
+            tipo='MONITOR', marca='LG', modelo='27UL', numero_serie='MON-1',
+            descricao='Monitor com nº ABX na etiqueta', valor=Decimal('900.00'), data_aquisicao=date(2024, 1, 1),
+        )
+        self.termo = TermoResponsabilidade.objects.create(colaborador=self.colaborador, modelo=self.modelo)
+
+    def buscar(self, consulta, usuario=None):
+        return [(e.tipo, e.objeto_id) for e in busca.buscar(consulta, usuario=usuario)]
+
+    def test_prefixo_numero_de_serie_e_acentos(self):
+        equipamento = ('equipamento', self.notebook.pk)
+        self.assertEqual(self.buscar('77812'), [equipamento])
+        self.assertEqual(self.buscar('abx778'), [equipamento])
+        self.assertEqual(self.buscar('ABX-778'), [equipamento])
+        self.assertEqual(self.buscar('simoes joao'), [('colaborador', self.colaborador.pk)])
+        self.assertEqual(self.buscar('12345678900'), [('colaborador', self.colaborador.pk)])
+        self.assertEqual(self.buscar(str(self.termo.uuid)[:8]), [('termo', self.termo.pk)])
+        self.assertEqual(self.buscar('inexistente'), [])
+        self.assertEqual(self.buscar(' - '), [])
+
+    def test_identificadores_pesam_mais_no_ranking(self):
+        # "abx" é prefixo do número de série do notebook e só aparece na descrição do monitor
+        self.assertEqual(self.buscar('abx'), [('equipamento', self.notebook.pk), ('equipamento', self.monitor.pk)])
+
+    def test_colaborador_so_encontra_o_que_e_seu(self):
+        self.assertEqual(self.buscar('notebook', usuario=self.colaborador),
+                         [('equipamento', self.notebook.pk), ('termo', self.termo.pk)])
+        self.assertEqual(self.buscar('monitor', usuario=self.colaborador), [])
+        self.assertEqual(self.buscar('maria', usuario=self.colaborador), [])
+        self.assertEqual(self.buscar('maria', usuario=self.staff), [('colaborador', self.outro.pk)])
+
+    def test_indice_acompanha_alteracoes(self):
+        self.notebook.numero_serie = 'NOVO-999'
+        self.notebook.save()
+        self.assertEqual(self.buscar('77812'), [])
+        self.assertEqual(self.buscar('novo999'), [('equipamento', self.notebook.pk)])
+
+        # O nome do colaborador também é atualizado nos termos dele
+        self.colaborador.last_name = 'Pereira'
+        self.colaborador.save()
+        entrada = EntradaBusca.objects.get(tipo='termo', objeto_id=self.termo.pk)
+        self.assertIn('Pereira', entrada.detalhe)
+
+        # Salvar só o último acesso não reindexa
+        with self.assertNumQueries(1):
+            self.colaborador.save(update_fields=['last_login'])
+        # Nem gravar o PDF gerado do termo, que também não muda as estatísticas
+        self.termo.digest_pdf = 'a' * 64
+        with self.assertNumQueries(1), mock.patch('core.signals.invalidar_estatisticas') as invalidar:
+            self.termo.save(update_fields=['arquivo_pdf', 'digest_pdf', 'digest_pdf_verificado_em'])
+        invalidar.assert_not_called()
+
+        self.monitor.delete()
+        self.assertEqual(self.buscar('monitor'), [])
+        call_command('reindexar_busca', stdout=StringIO())
+        self.assertEqual(EntradaBusca.objects.count(), 5)
+        self.assertEqual(self.buscar('novo999'), [('equipamento', self.notebook.pk)])
+
+    def test_migracao_popula_o_indice_com_os_modelos_historicos(self):
+        executor = MigrationExecutor(connection)
+        estado = executor.loader.project_state(('core', '0001_indice_busca'))
+        migracao = import_module('core.migrations.0001_indice_busca')
+        EntradaBusca.objects.all().delete()
+        migracao.popular_indice(estado.apps, None)
+        self.assertEqual(EntradaBusca.objects.count(), 6)
+        self.assertEqual(self.buscar('abx778'), [('equipamento', self.notebook.pk)])
+        entrada = EntradaBusca.objects.get(tipo='termo', objeto_id=self.termo.pk)
+        self.assertIn('Simões', entrada.detalhe)
+
+    def test_view_de_busca(self):
+        self.client.force_login(self.colaborador)
+        response = self.client.get(reverse('core:busca'), {'q': 'latitude'})
+        self.assertContains(response, reverse('documents:equipamento_detail', args=[self.notebook.pk]))
+        response = self.client.get(reverse('core:busca'), {'q': str(self.termo.uuid)})
+        self.assertContains(response, reverse('documents:termo_detail', args=[self.termo.uuid]))
+        response = self.client.get(reverse('core:busca'), {'q': 'monitor'})
+        self.assertContains(response, 'Nenhum resultado')
+
+
+class InstrumentacaoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        registro.limpar()
+        self.addCleanup(registro.limpar)
+        self.perfis = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.perfis, ignore_errors=True)
+        self.colaborador = User.objects.create_user(username='colaborador', password='senha')
+        self.client.force_login(self.colaborador)
+
+    def configuracao(self, **extra):
+        return override_settings(INSTRUMENTACAO={
+            'ATIVA': True, 'LIMITE_LENTA': 60.0, 'AMOSTRAGEM_PERFIL': 0.0,
+            'DIRETORIO_PERFIS': self.perfis, 'IPS_METRICAS': ['127.0.0.1'], **extra,
+        })
+
+    def test_metricas_por_view(self):
+        with self.configuracao():
+            self.client.get(reverse('core:dashboard'))
+            self.client.get(reverse('core:dashboard'))
+            with medir('pdf_conversao'):
+                pass
+            response = self.client.get(reverse('core:metricas'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        texto = response.content.decode()
+        self.assertIn('portal_requisicoes_total{metodo="GET",status="200",view="core:dashboard"} 2', texto)
+        self.assertIn('portal_requisicao_segundos_count{view="core:dashboard"} 2', texto)
+        self.assertIn('portal_requisicao_segundos_bucket{view="core:dashboard",le="+Inf"} 2', texto)
+        self.assertIn('portal_db_consultas_total{view="core:dashboard"}', texto)
+        # Estatísticas calculadas na primeira requisição e lidas do cache na segunda
+        self.assertIn('portal_cache_acessos_total{resultado="hit",view="core:dashboard"}', texto)
+        self.assertIn('portal_etapa_segundos_count{etapa="pdf_conversao"} 1', texto)
+        self.assertIn('# TYPE portal_requisicao_segundos histogram', texto)
+
+    def test_requisicao_lenta_registra_log_e_perfil(self):
+        with self.configuracao(LIMITE_LENTA=0.0, AMOSTRAGEM_PERFIL=1.0):
+            with self.assertLogs('core.middleware', level='WARNING') as logs:
+                self.client.get(reverse('core:dashboard'))
+        self.assertIn('Requisição lenta: GET /dashboard/ (core:dashboard)', logs.output[0])
+        self.assertRegex(logs.output[0], r'banco: \d+ consulta\(s\)')
+        perfis = os.listdir(self.perfis)
+        self.assertEqual(len(perfis), 1)
+        self.assertTrue(perfis[0].endswith('.prof') and 'core_dashboard' in perfis[0])
+
+    def test_endpoint_desativado_ou_restrito(self):
+        self.assertEqual(self.client.get(reverse('core:metricas')).status_code, 404)
+        with self.configuracao(IPS_METRICAS=[]):
+            self.assertEqual(self.client.get(reverse('core:metricas')).status_code, 403)
+
+    def test_requisicao_repassada_pelo_proxy_local_nao_e_liberada_pelo_ip(self):
+        self.client.logout()
+        url = reverse('core:metricas')
+        with self.configuracao(TOKEN_METRICAS='segredo'):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code, 200)
+            response = self.client.get(url, REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.7')
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get(url, REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.7',
+                                       HTTP_AUTHORIZATION='Bearer errado')
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get(url, REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.7',
+                                       HTTP_AUTHORIZATION='Bearer segredo')
+            self.assertEqual(response.status_code, 200)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'configuração específica do SQLite')
+class ConexaoSQLiteTests(SimpleTestCase):
+    def setUp(self):
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio, ignore_errors=True)
+        self.settings_dict = {**connection.settings_dict, 'NAME': os.path.join(diretorio, 'portal.sqlite3')}
+
+    def conectar(self, alias):
+        conexao = SQLiteDatabaseWrapper(self.settings_dict, alias=alias)
+        self.addCleanup(conexao.close)
+        return conexao
+
+    def test_wal_e_espera_por_escritas_simultaneas(self):
+        primeira, segunda = self.conectar('primeira'), self.conectar('segunda')
+        with primeira.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], self.settings_dict['OPTIONS']['timeout'] * 1000)
+            cursor.execute('CREATE TABLE assinatura (id integer PRIMARY KEY)')
+
+        # Enquanto a primeira conexão escreve, a segunda lê sem esperar e a
+        # sua escrita aguarda o commit em vez de falhar com "database is locked"
+        primeira.set_autocommit(False)
+        primeira.inc_thread_sharing()
+        self.addCleanup(primeira.dec_thread_sharing)
+        with primeira.cursor() as cursor:
+            cursor.execute('INSERT INTO assinatura VALUES (1)')
+        with segunda.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM assinatura')
+            self.assertEqual(cursor.fetchone()[0], 0)
+            commit = threading.Timer(0.3, primeira.commit)
+            commit.start()
+            cursor.execute('INSERT INTO assinatura VALUES (2)')
+            commit.join()
+            cursor.execute('SELECT COUNT(*) FROM assinatura')
+            self.assertEqual(cursor.fetchone()[0], 2)
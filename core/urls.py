@@ -6,4 +6,6 @@ app_name = 'core'
 urlpatterns = [
     path('', views.HomeView.as_view(), name='home'),
     path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
+    path('busca/', views.BuscaView.as_view(), name='busca'),
+    path('metricas/', views.MetricasView.as_view(), name='metricas'),
 ] 
\ No newline at end of file
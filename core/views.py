@@ -1,8 +1,18 @@
+import hmac
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.views import View
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from documents.models import Equipamento, TermoResponsabilidade, DocumentoModelo
 
+from . import busca
+from .estatisticas import obter_estatisticas
+from .metricas import instrumentacao_ativa, registro
+
 # Create your views here.
 
 class HomeView(TemplateView):
@@ -15,23 +25,56 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         user = self.request.user
         
+        # Contagens (uma consulta agregada, em cache)
+        context.update(obter_estatisticas(user))
+        
         if user.is_staff:
-            # Contexto para administradores
-            # Contagens
-            context['total_equipamentos'] = Equipamento.objects.count()
-            context['total_termos'] = TermoResponsabilidade.objects.count()
-            context['termos_pendentes'] = TermoResponsabilidade.objects.filter(status='PENDENTE').count()
-            context['termos_assinados'] = TermoResponsabilidade.objects.filter(status='ASSINADO').count()
-            
             # Listas para tabelas
-            context['ultimos_termos'] = TermoResponsabilidade.objects.all().order_by('-data_envio')[:5]
+            context['ultimos_termos'] = TermoResponsabilidade.objects.select_related('colaborador').order_by('-data_envio')[:5]
             context['ultimos_equipamentos'] = Equipamento.objects.all().order_by('-data_aquisicao')[:5]
         else:
             # Contexto para colaboradores
             context['meus_equipamentos'] = Equipamento.objects.filter(usuario=user)
-            context['termos_pendentes'] = TermoResponsabilidade.objects.filter(colaborador=user, status='PENDENTE')
-            context['termos_assinados'] = TermoResponsabilidade.objects.filter(colaborador=user, status='ASSINADO')
-            context['total_equipamentos'] = context['meus_equipamentos'].count()
-            context['total_termos'] = TermoResponsabilidade.objects.filter(colaborador=user).count()
+            # Modelo e equipamentos de cada termo pendente são exibidos na lista
+            context['termos_pendentes'] = (
+                TermoResponsabilidade.objects.filter(colaborador=user, status='PENDENTE')
+                .select_related('modelo')
+                .prefetch_related('itemtermo_set__equipamento')
+            )
         
         return context
+
+class BuscaView(LoginRequiredMixin, TemplateView):
+    """Busca global; colaboradores só encontram os próprios equipamentos e termos."""
+    template_name = 'core/busca.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        consulta = self.request.GET.get('q', '').strip()
+        context['consulta'] = consulta
+        context['resultados'] = busca.buscar(consulta, usuario=self.request.user) if consulta else []
+        return context
+
+
+class MetricasView(View):
+    """Métricas deste processo no formato de exposição do Prometheus."""
+
+    def get(self, request):
+        if not instrumentacao_ativa():
+            raise Http404
+        if not (request.user.is_staff or self.token_valido(request) or self.ip_liberado(request)):
+            raise PermissionDenied
+        return HttpResponse(registro.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    def token_valido(self, request):
+        token = settings.INSTRUMENTACAO.get('TOKEN_METRICAS')
+        autorizacao = request.META.get('HTTP_AUTHORIZATION', '')
+        if not token or not autorizacao.startswith('Bearer '):
+            return False
+        return hmac.compare_digest(autorizacao[len('Bearer '):].encode(), token.encode())
+
+    def ip_liberado(self, request):
+        # Uma requisição repassada por proxy chega do IP do proxy, não do cliente
+        if 'HTTP_X_FORWARDED_FOR' in request.META or 'HTTP_X_REAL_IP' in request.META:
+            return False
+        return request.META.get('REMOTE_ADDR') in settings.INSTRUMENTACAO['IPS_METRICAS']
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Equipamento, DocumentoModelo, TermoResponsabilidade, ItemTermo
+from django.utils import timezone
+from .models import Equipamento, DocumentoModelo, TermoResponsabilidade, ItemTermo, TarefaPDF
 
 class ItemTermoInline(admin.TabularInline):
     model = ItemTermo
@@ -26,11 +27,30 @@ class DocumentoModeloAdmin(admin.ModelAdmin):
 
 @admin.register(TermoResponsabilidade)
 class TermoResponsabilidadeAdmin(admin.ModelAdmin):
-    list_display = ('uuid', 'colaborador', 'modelo', 'status', 'data_envio', 'data_assinatura')
-    list_filter = ('status',)
+    list_display = ('uuid', 'colaborador', 'modelo', 'status', 'status_pdf', 'data_envio', 'data_assinatura')
+    list_filter = ('status', 'status_pdf')
     search_fields = ('uuid', 'colaborador__username', 'colaborador__first_name', 'colaborador__last_name')
     inlines = [ItemTermoInline]
-    readonly_fields = ('uuid', 'data_envio', 'data_assinatura', 'ip_assinatura', 'hash_assinatura')
+    readonly_fields = ('uuid', 'data_envio', 'data_assinatura', 'ip_assinatura', 'hash_assinatura', 'status_pdf',
+                       'digest_pdf', 'digest_pdf_verificado_em')
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('colaborador', 'modelo')
+
+@admin.register(TarefaPDF)
+class TarefaPDFAdmin(admin.ModelAdmin):
+    list_display = ('termo', 'status', 'tentativas', 'max_tentativas', 'agendada_para', 'data_criacao', 'data_conclusao')
+    list_filter = ('status',)
+    search_fields = ('termo__uuid',)
+    readonly_fields = ('data_criacao', 'data_conclusao', 'erro')
+    actions = ['reenfileirar']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('termo__colaborador')
+
+    @admin.action(description='Reenfileirar tarefas selecionadas')
+    def reenfileirar(self, request, queryset):
+        atualizadas = queryset.exclude(status=TarefaPDF.Status.PROCESSANDO).update(
+            status=TarefaPDF.Status.PENDENTE, tentativas=0, agendada_para=timezone.now()
+        )
+        self.message_user(request, f"{atualizadas} tarefa(s) reenfileirada(s).")
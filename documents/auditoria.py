@@ -0,0 +1,264 @@
+"""
+Auditoria de integridade dos termos assinados.
+
+Para cada termo assinado, verifica se o ``hash_assinatura`` ainda pode ser
+recalculado a partir dos dados gravados e se o ``arquivo_pdf`` continua igual
+ao registrado em ``digest_pdf`` (SHA-256 calculado na geração do PDF ou, para
+PDFs antigos, na primeira auditoria). Opcionalmente valida também a assinatura
+digital embutida no PDF.
+
+Os termos são lidos do banco em lotes e verificados em paralelo por um pool de
+processos; os arquivos são lidos em blocos, sem carregá-los inteiros na
+memória. Com ``incremental``, arquivos que não foram modificados desde a última
+verificação bem-sucedida não são lidos de novo.
+
+O hash da assinatura é calculado com o IP na forma canônica. Termos assinados
+antes disso podem ter o hash calculado com o texto do cabeçalho (por exemplo
+"2001:DB8:0:0::1", gravado no banco como "2001:db8::1"); quando o hash confere
+com o IP registrado nas observações, o termo é listado em ``hashes_legados``
+e não como problema de integridade. Esses hashes não são recalculados: o
+valor original é o registro da assinatura.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+
+import django
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_ipv46_address
+from django.utils import timezone
+from django.utils.ipv6 import clean_ipv6_address
+
+from .models import TermoResponsabilidade
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_BLOCO = 1024 * 1024
+TAMANHO_LOTE = 200
+IP_NAO_IDENTIFICADO = "IP não identificado"
+# Bloco que a view de assinatura acrescenta às observações do termo
+_IP_OBSERVACOES_RE = re.compile(r'Informações da assinatura:\nIP: ([^\n]*)')
+
+
+def normalizar_ip(valor):
+    """
+    Forma canônica do endereço, a mesma que o ``GenericIPAddressField`` grava,
+    ou None se ``valor`` não for um IPv4/IPv6 válido.
+
+    "2001:DB8:0:0::1" vira "2001:db8::1": o IP gravado e o usado no hash da
+    assinatura precisam ser o mesmo texto.
+    """
+    valor = (valor or '').strip()
+    try:
+        validate_ipv46_address(valor)
+    except ValidationError:
+        return None
+    return clean_ipv6_address(valor) if ':' in valor else valor
+
+
+def _hash(uuid, username, data_assinatura, ip):
+    dados = f"{uuid}_{username}_{data_assinatura.isoformat()}_{ip}"
+    return hashlib.sha256(dados.encode()).hexdigest()
+
+
+def calcular_hash_assinatura(uuid, username, data_assinatura, ip_assinatura):
+    """
+    Hash da assinatura eletrônica, gravado em ``hash_assinatura`` ao assinar.
+
+    O IP entra sempre na forma canônica (``normalizar_ip``), tanto ao assinar
+    quanto na auditoria, independentemente de como o banco o devolve.
+    """
+    return _hash(uuid, username, data_assinatura, normalizar_ip(ip_assinatura) or IP_NAO_IDENTIFICADO)
+
+
+def ip_das_observacoes(observacoes):
+    """IP registrado como texto nas observações pela última assinatura, ou None."""
+    encontrados = _IP_OBSERVACOES_RE.findall(observacoes or '')
+    return encontrados[-1].strip() if encontrados else None
+
+
+def digest_arquivo(caminho, tamanho_bloco=TAMANHO_BLOCO):
+    """SHA-256 do arquivo, lido em blocos de ``tamanho_bloco`` bytes."""
+    digest = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+            digest.update(bloco)
+    return digest.hexdigest()
+
+
+@dataclass
+class ResultadoAuditoria:
+    verificados: int = 0
+    pdfs_lidos: int = 0
+    pdfs_inalterados: int = 0  # pulados na auditoria incremental
+    digests_registrados: int = 0
+    sem_pdf: int = 0
+    problemas: list = field(default_factory=list)  # (uuid, mensagem)
+    # Termos assinados antes da normalização do IP, cujo hash foi calculado com
+    # o texto do cabeçalho (ex.: "2001:DB8::1") e confere com o IP registrado
+    # nas observações: não são falhas de integridade, são listados à parte
+    hashes_legados: list = field(default_factory=list)  # uuid
+    duracao: float = 0.0
+
+    @property
+    def termos_com_problema(self):
+        return len({uuid for uuid, _ in self.problemas})
+
+
+def _verificar_termo(termo, incremental, assinatura_digital):
+    """
+    Verifica um termo (tupla lida do banco) sem acessar o banco de dados.
+
+    Retorna ``(pk, digest, status, problemas, hash_legado)``, em que ``status``
+    é ``'lido'``, ``'inalterado'`` ou ``'sem_pdf'``.
+    """
+    (pk, uuid, username, data_assinatura, ip, hash_assinatura, caminho, digest_registrado, verificado_em,
+     ip_original) = termo
+    problemas = []
+    hash_legado = False
+
+    if not hash_assinatura or data_assinatura is None:
+        problemas.append("termo assinado sem hash ou data da assinatura")
+    elif calcular_hash_assinatura(uuid, username, data_assinatura, ip) != hash_assinatura:
+        hash_legado = (
+            ip_original is not None and normalizar_ip(ip_original) == normalizar_ip(ip)
+            and _hash(uuid, username, data_assinatura, ip_original) == hash_assinatura
+        )
+        if not hash_legado:
+            problemas.append("hash_assinatura não confere com os dados gravados do termo")
+
+    if not caminho:
+        return pk, None, 'sem_pdf', problemas, hash_legado
+    try:
+        modificado_em = os.stat(caminho).st_mtime
+    except OSError:
+        problemas.append(f"arquivo PDF não encontrado: {caminho}")
+        return pk, None, 'lido', problemas, hash_legado
+
+    if incremental and digest_registrado and verificado_em and modificado_em <= verificado_em:
+        return pk, digest_registrado, 'inalterado', problemas, hash_legado
+
+    digest = digest_arquivo(caminho)
+    if digest_registrado and digest != digest_registrado:
+        problemas.append("conteúdo do PDF diferente do registrado (digest_pdf)")
+
+    if assinatura_digital:
+        from .signing import verificar_pdf
+
+        try:
+            assinaturas = verificar_pdf(caminho)
+        except Exception as e:
+            problemas.append(f"não foi possível validar a assinatura digital: {e}")
+        else:
+            if not assinaturas:
+                problemas.append("PDF sem assinatura digital")
+            elif not all(status.intact for status in assinaturas):
+                problemas.append("assinatura digital não confere com o conteúdo do PDF")
+            elif not all(status.bottom_line for status in assinaturas):
+                problemas.append("assinatura digital inválida ou de certificado não confiável")
+    return pk, digest, 'lido', problemas, hash_legado
+
+
+def _verificar_lote(lote, incremental, assinatura_digital):
+    return [_verificar_termo(termo, incremental, assinatura_digital) for termo in lote]
+
+
+def _lotes(queryset, tamanho_lote):
+    """
+    Gera lotes de tuplas prontas para os workers, com o caminho absoluto do PDF
+    e o IP como foi registrado nas observações (só o IP segue para o worker).
+    """
+    armazenamento = TermoResponsabilidade._meta.get_field('arquivo_pdf').storage
+    linhas = queryset.order_by('pk').values_list(
+        'pk', 'uuid', 'colaborador__username', 'data_assinatura', 'ip_assinatura',
+        'hash_assinatura', 'arquivo_pdf', 'digest_pdf', 'digest_pdf_verificado_em', 'observacoes',
+    ).iterator(chunk_size=tamanho_lote * 10)
+    while True:
+        lote = [
+            (*linha[:6], armazenamento.path(linha[6]) if linha[6] else None, linha[7],
+             linha[8].timestamp() if linha[8] else None, ip_das_observacoes(linha[9]))
+            for linha in islice(linhas, tamanho_lote)
+        ]
+        if not lote:
+            return
+        yield lote
+
+
+def _gravar(lote, resultados, resultado, agora):
+    """Acumula os resultados de um lote e grava digests e datas de verificação."""
+    uuids = {termo[0]: termo[1] for termo in lote}
+    digests = {termo[0]: termo[7] for termo in lote}
+    registrar = []
+    verificados = []
+    for pk, digest, status, problemas, hash_legado in resultados:
+        resultado.verificados += 1
+        if hash_legado:
+            resultado.hashes_legados.append(uuids[pk])
+        if status == 'sem_pdf':
+            resultado.sem_pdf += 1
+        elif status == 'inalterado':
+            resultado.pdfs_inalterados += 1
+        else:
+            resultado.pdfs_lidos += 1
+        for problema in problemas:
+            resultado.problemas.append((uuids[pk], problema))
+        if problemas or digest is None or status == 'inalterado':
+            continue
+        if digest != digests[pk]:
+            registrar.append(TermoResponsabilidade(pk=pk, digest_pdf=digest))
+        verificados.append(pk)
+
+    if registrar:
+        TermoResponsabilidade.objects.bulk_update(registrar, ['digest_pdf'])
+        resultado.digests_registrados += len(registrar)
+    if verificados:
+        TermoResponsabilidade.objects.filter(pk__in=verificados).update(digest_pdf_verificado_em=agora)
+
+
+def auditar_termos(processos=1, incremental=False, assinatura_digital=False,
+                   tamanho_lote=TAMANHO_LOTE, queryset=None):
+    """
+    Audita os termos assinados e retorna um ``ResultadoAuditoria``.
+
+    Com ``processos`` maior que 1 os lotes são verificados por um
+    ``ProcessPoolExecutor``; no máximo dois lotes por processo ficam em
+    andamento, então a memória não cresce com o número de termos.
+    """
+    inicio = time.perf_counter()
+    if queryset is None:
+        queryset = TermoResponsabilidade.objects.filter(status=TermoResponsabilidade.Status.ASSINADO)
+    resultado = ResultadoAuditoria()
+    agora = timezone.now()
+    lotes = _lotes(queryset, tamanho_lote)
+
+    if processos <= 1:
+        for lote in lotes:
+            _gravar(lote, _verificar_lote(lote, incremental, assinatura_digital), resultado, agora)
+    else:
+        # spawn: os workers não herdam conexões com o banco nem threads do
+        # servidor; django.setup roda antes de a primeira tarefa ser desserializada
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(processos, mp_context=contexto, initializer=django.setup) as executor:
+            pendentes = deque()
+            for lote in lotes:
+                pendentes.append((lote, executor.submit(_verificar_lote, lote, incremental, assinatura_digital)))
+                if len(pendentes) >= processos * 2:
+                    lote_concluido, futuro = pendentes.popleft()
+                    _gravar(lote_concluido, futuro.result(), resultado, agora)
+            while pendentes:
+                lote_concluido, futuro = pendentes.popleft()
+                _gravar(lote_concluido, futuro.result(), resultado, agora)
+
+    resultado.duracao = time.perf_counter() - inicio
+    logger.info(
+        f"Auditoria de termos: {resultado.verificados} verificado(s), {resultado.pdfs_lidos} PDF(s) lido(s), "
+        f"{resultado.termos_com_problema} com problema, em {resultado.duracao:.1f}s"
+    )
+    return resultado
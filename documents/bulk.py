@@ -0,0 +1,174 @@
+"""
+Criação de termos em lote (ondas de admissão).
+
+Cada linha informa o colaborador (username ou e-mail), o modelo (id ou
+título) e os números de série dos equipamentos. Colaboradores, modelos e
+equipamentos de todas as linhas são carregados com uma consulta cada, e os
+termos e itens são gravados com ``bulk_create`` em uma única transação, então
+o custo não depende de quantas linhas o arquivo tem.
+"""
+import csv
+import io
+import json
+import re
+from dataclasses import dataclass, field
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core import busca
+from core.estatisticas import invalidar_estatisticas
+
+from .models import DocumentoModelo, Equipamento, ItemTermo, TermoResponsabilidade
+
+SEPARADOR_EQUIPAMENTOS = re.compile(r'[;,|\s]+')
+
+
+class LoteInvalido(Exception):
+    pass
+
+
+@dataclass
+class ResultadoLote:
+    termos: list = field(default_factory=list)
+    erros: list = field(default_factory=list)  # (número da linha, mensagem)
+
+    @property
+    def total_itens(self):
+        return sum(len(itens) for _, itens in self.termos)
+
+
+def ler_linhas(conteudo, formato=None, nome_arquivo=''):
+    """Converte o conteúdo de um arquivo CSV ou JSON em uma lista de dicionários."""
+    if isinstance(conteudo, bytes):
+        conteudo = conteudo.decode('utf-8-sig')
+    formato = formato or ('json' if nome_arquivo.lower().endswith('.json') or conteudo.lstrip().startswith('[') else 'csv')
+
+    if formato == 'json':
+        try:
+            linhas = json.loads(conteudo)
+        except json.JSONDecodeError as e:
+            raise LoteInvalido(f"JSON inválido: {e}")
+        if not isinstance(linhas, list) or not all(isinstance(linha, dict) for linha in linhas):
+            raise LoteInvalido("O JSON deve ser uma lista de objetos.")
+        return linhas
+
+    try:
+        dialeto = csv.Sniffer().sniff(conteudo[:4096], delimiters=',;\t')
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.DictReader(io.StringIO(conteudo), dialect=dialeto)
+    faltando = {'colaborador', 'modelo', 'equipamentos'} - set(leitor.fieldnames or [])
+    if faltando:
+        raise LoteInvalido(f"Colunas obrigatórias ausentes: {', '.join(sorted(faltando))}")
+    return list(leitor)
+
+
+def _series(valor):
+    if isinstance(valor, (list, tuple)):
+        return [str(serie).strip() for serie in valor if str(serie).strip()]
+    return [serie for serie in SEPARADOR_EQUIPAMENTOS.split(str(valor or '').strip()) if serie]
+
+
+def _texto(valor):
+    return str(valor).strip() if valor is not None else ''
+
+
+def criar_termos_em_lote(linhas, parcial=False, simular=False):
+    """
+    Cria os termos descritos em ``linhas``.
+
+    Com erros em alguma linha, nada é gravado, a menos que ``parcial`` seja
+    verdadeiro; nesse caso as linhas válidas são gravadas. ``simular`` apenas
+    valida.
+    """
+    User = get_user_model()
+    resultado = ResultadoLote()
+
+    identificadores = {_texto(linha.get('colaborador')) for linha in linhas} - {''}
+    usuarios = {}
+    for usuario in User.objects.filter(Q(username__in=identificadores) | Q(email__in=identificadores)):
+        usuarios.setdefault(usuario.username, usuario)
+        if usuario.email:
+            usuarios.setdefault(usuario.email, usuario)
+
+    referencias = {_texto(linha.get('modelo')) for linha in linhas} - {''}
+    ids = [int(ref) for ref in referencias if ref.isdigit()]
+    modelos = {}
+    for modelo in DocumentoModelo.objects.filter(Q(pk__in=ids) | Q(titulo__in=referencias)).order_by('pk'):
+        modelos[str(modelo.pk)] = modelo
+        # Com títulos repetidos, vale o modelo ativo mais recente
+        if modelo.ativo or modelo.titulo not in modelos:
+            modelos[modelo.titulo] = modelo
+
+    series = {serie for linha in linhas for serie in _series(linha.get('equipamentos'))}
+    equipamentos = Equipamento.objects.in_bulk(series, field_name='numero_serie')
+
+    validas = []
+    usados = {}
+    for numero, linha in enumerate(linhas, start=1):
+        erros = []
+        colaborador = usuarios.get(_texto(linha.get('colaborador')))
+        if colaborador is None:
+            erros.append(f"colaborador '{_texto(linha.get('colaborador'))}' não encontrado")
+        modelo = modelos.get(_texto(linha.get('modelo')))
+        if modelo is None:
+            erros.append(f"modelo '{_texto(linha.get('modelo'))}' não encontrado")
+
+        itens = []
+        series_linha = _series(linha.get('equipamentos'))
+        if not series_linha:
+            erros.append("nenhum equipamento informado")
+        for serie in series_linha:
+            equipamento = equipamentos.get(serie)
+            if equipamento is None:
+                erros.append(f"equipamento '{serie}' não encontrado")
+            elif serie in usados:
+                erros.append(f"equipamento '{serie}' já incluído na linha {usados[serie]}")
+            else:
+                usados[serie] = numero
+                itens.append(equipamento)
+
+        if erros:
+            resultado.erros.append((numero, '; '.join(erros)))
+        else:
+            validas.append((colaborador, modelo, itens, linha))
+
+    if simular or (resultado.erros and not parcial) or not validas:
+        return resultado
+
+    data_entrega = timezone.localdate()
+    with transaction.atomic():
+        termos = TermoResponsabilidade.objects.bulk_create([
+            TermoResponsabilidade(
+                colaborador=colaborador, modelo=modelo,
+                status=TermoResponsabilidade.Status.PENDENTE,
+                observacoes=_texto(linha.get('observacoes')),
+            )
+            for colaborador, modelo, _, linha in validas
+        ])
+        if any(termo.pk is None for termo in termos):
+            # Bancos sem RETURNING: recupera as chaves pelo uuid gerado no Python
+            pks = dict(TermoResponsabilidade.objects.filter(
+                uuid__in=[termo.uuid for termo in termos]
+            ).values_list('uuid', 'pk'))
+            for termo in termos:
+                termo.pk = pks[termo.uuid]
+
+        ItemTermo.objects.bulk_create([
+            ItemTermo(
+                termo=termo, equipamento=equipamento, data_entrega=data_entrega,
+                estado_entrega=_texto(linha.get('estado_entrega')) or 'Novo',
+            )
+            for termo, (_, _, itens, linha) in zip(termos, validas)
+            for equipamento in itens
+        ])
+        busca.indexar_queryset(TermoResponsabilidade.objects.filter(pk__in=[termo.pk for termo in termos]))
+
+    # bulk_create não dispara post_save; as estatísticas do dashboard são invalidadas aqui
+    invalidar_estatisticas()
+
+    resultado.termos = [(termo, itens) for termo, (_, _, itens, _) in zip(termos, validas)]
+    return resultado
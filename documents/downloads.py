@@ -0,0 +1,148 @@
+"""
+Entrega de arquivos PDF com streaming, requisições condicionais e Range.
+
+Com ``DOCUMENTS_FILE_OFFLOAD`` configurado, o Django continua fazendo a
+verificação de permissão e as respostas condicionais, mas a transferência dos
+bytes é delegada ao proxy reverso:
+
+* ``'x-accel-redirect'`` (nginx): o arquivo é servido pela location interna
+  ``DOCUMENTS_OFFLOAD_PREFIX``, por exemplo::
+
+      location /protected-media/ {
+          internal;
+          alias /caminho/para/media/;
+      }
+
+* ``'x-sendfile'`` (Apache mod_xsendfile, lighttpd): o proxy lê o caminho
+  absoluto do arquivo.
+"""
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^\s*bytes=(\d*)-(\d*)\s*$')
+TAMANHO_BLOCO = 64 * 1024
+
+
+def _ler_intervalo(caminho, inicio, fim):
+    with open(caminho, 'rb') as arquivo:
+        arquivo.seek(inicio)
+        restante = fim - inicio + 1
+        while restante > 0:
+            bloco = arquivo.read(min(TAMANHO_BLOCO, restante))
+            if not bloco:
+                break
+            restante -= len(bloco)
+            yield bloco
+
+
+def _intervalo_solicitado(request, tamanho, etag, ultima_modificacao):
+    """
+    Interpreta o cabeçalho Range (um único intervalo de bytes).
+
+    Retorna ``None`` para servir o arquivo inteiro, ``(inicio, fim)`` para uma
+    resposta parcial ou ``False`` se o intervalo não puder ser atendido.
+    """
+    cabecalho = request.META.get('HTTP_RANGE')
+    if not cabecalho:
+        return None
+
+    # If-Range: só atende o intervalo se o cliente ainda tiver a mesma versão
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range:
+        if if_range.startswith(('"', 'W/')):
+            if if_range != etag:
+                return None
+        elif parse_http_date_safe(if_range) != ultima_modificacao:
+            return None
+
+    match = RANGE_RE.match(cabecalho)
+    if not match:
+        return None
+    inicio, fim = match.groups()
+    if not inicio and not fim:
+        return None
+    if not inicio:
+        # Sufixo: os últimos N bytes
+        quantidade = int(fim)
+        if quantidade == 0:
+            return False
+        return max(0, tamanho - quantidade), tamanho - 1
+    inicio = int(inicio)
+    fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or inicio > fim:
+        return False
+    return inicio, fim
+
+
+def _resposta_offload(caminho, content_type):
+    """Resposta vazia que instrui o proxy a enviar o arquivo, ou None sem offload."""
+    modo = getattr(settings, 'DOCUMENTS_FILE_OFFLOAD', None)
+    if not modo:
+        return None
+
+    response = HttpResponse(content_type=content_type)
+    if modo == 'x-accel-redirect':
+        relativo = os.path.relpath(os.path.abspath(caminho), os.path.abspath(settings.MEDIA_ROOT))
+        if relativo.startswith(os.pardir):
+            raise ValueError(f"Arquivo fora de MEDIA_ROOT não pode ser delegado ao proxy: {caminho}")
+        prefixo = getattr(settings, 'DOCUMENTS_OFFLOAD_PREFIX', '/protected-media/').rstrip('/')
+        response['X-Accel-Redirect'] = quote(f"{prefixo}/{relativo.replace(os.sep, '/')}")
+    elif modo == 'x-sendfile':
+        response['X-Sendfile'] = os.path.abspath(caminho)
+    else:
+        raise ValueError(f"DOCUMENTS_FILE_OFFLOAD inválido: {modo}")
+    return response
+
+
+def servir_arquivo(request, caminho, nome_arquivo, etag, anexo=False, content_type='application/pdf'):
+    """
+    Responde com o arquivo em ``caminho`` sem carregá-lo na memória.
+
+    Trata If-None-Match/If-Modified-Since (304) e Range/If-Range (206), para
+    que o visualizador embutido possa buscar apenas os trechos que exibe. Com
+    offload habilitado, o Range fica a cargo do proxy.
+    """
+    stat = os.stat(caminho)
+    tamanho = stat.st_size
+    ultima_modificacao = int(stat.st_mtime)
+
+    condicional = get_conditional_response(request, etag=etag, last_modified=ultima_modificacao)
+    if condicional is not None:
+        condicional['ETag'] = etag
+        return condicional
+
+    offload = _resposta_offload(caminho, content_type)
+    intervalo = None
+    if offload is None:
+        intervalo = _intervalo_solicitado(request, tamanho, etag, ultima_modificacao)
+
+    if offload is not None:
+        response = offload
+    elif intervalo is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{tamanho}'
+    elif intervalo:
+        inicio, fim = intervalo
+        response = StreamingHttpResponse(
+            _ler_intervalo(caminho, inicio, fim), status=206, content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {inicio}-{fim}/{tamanho}'
+        response['Content-Length'] = str(fim - inicio + 1)
+    else:
+        response = FileResponse(open(caminho, 'rb'), content_type=content_type)
+
+    disposicao = 'attachment' if anexo else 'inline'
+    response['Content-Disposition'] = f'{disposicao}; filename="{nome_arquivo}"'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(ultima_modificacao)
+    # O documento só muda se for regenerado, o que altera o ETag; o navegador
+    # pode guardá-lo, mas revalida a cada acesso (resposta 304 barata).
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -18,4 +18,34 @@ class ModeloDocumentoForm(forms.ModelForm):
         
         # Tornar o campo conteúdo não obrigatório se arquivo_word for enviado
         self.fields['conteudo'].required = False
-        self.fields['arquivo_word'].help_text = "Se preferir, faça upload de um arquivo Word (.docx) em vez de usar o editor de texto."
\ No newline at end of file
+        self.fields['arquivo_word'].help_text = "Se preferir, faça upload de um arquivo Word (.docx) em vez de usar o editor de texto."
+
+class TermosLoteForm(forms.Form):
+    arquivo = forms.FileField(
+        label='Arquivo CSV ou JSON',
+        help_text='Colunas: colaborador (username ou e-mail), modelo (id ou título), '
+                  'equipamentos (números de série separados por ";"), observacoes e estado_entrega (opcionais).'
+    )
+    parcial = forms.BooleanField(
+        label='Criar os termos das linhas válidas mesmo que outras linhas tenham erros',
+        required=False
+    )
+
+
+class ImportacaoEquipamentosForm(forms.Form):
+    arquivo = forms.FileField(
+        label='Arquivo CSV ou XLSX',
+        help_text='Colunas: numero_serie, tipo, marca, modelo, valor, data_aquisicao (obrigatórias), '
+                  'descricao, status, observacoes e usuario (opcionais). Equipamentos já cadastrados '
+                  'são atualizados pelo número de série.'
+    )
+    simular = forms.BooleanField(label='Apenas validar, sem gravar', required=False)
+
+
+class AuditoriaTermosForm(forms.Form):
+    incremental = forms.BooleanField(
+        label='Incremental: não reler PDFs inalterados desde a última verificação',
+        required=False,
+        initial=True
+    )
+    assinatura_digital = forms.BooleanField(label='Validar também a assinatura digital dos PDFs', required=False)
@@ -0,0 +1,185 @@
+"""
+Geração do PDF dos termos a partir do conteúdo HTML do modelo (editor TinyMCE).
+
+Usada para os modelos sem arquivo Word: dispensa o LibreOffice/Word e gera o
+PDF direto no processo com o xhtml2pdf, na casa dos milissegundos. O conteúdo
+é inserido no layout ``documents/termo_pdf_template.html``, que já traz os
+dados do colaborador, a tabela de equipamentos e as informações da assinatura.
+
+Assim como os modelos Word (``template_cache``), o HTML de cada modelo é
+compilado uma única vez por processo: o texto é dividido em trechos fixos e
+nas linhas de tabela com campos de lista (``${EQUIP_DESCRICAO}``...), e
+renderizar um termo passa a ser apenas substituir os placeholders
+(``documents.templating``) e repetir essas linhas por equipamento.
+"""
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.template.loader import get_template
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from . import templating
+from .rendering import RenderizacaoError
+
+logger = logging.getLogger(__name__)
+
+LAYOUT = 'documents/termo_pdf_template.html'
+
+_LINHA_RE = re.compile(r'<tr\b.*?</tr\s*>', re.IGNORECASE | re.DOTALL)
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _escapar_contexto(contexto):
+    """Cópia do contexto com os valores escapados para inserção no HTML."""
+    escapado = {}
+    for chave, valor in contexto.items():
+        if isinstance(valor, list):
+            escapado[chave] = [
+                {campo: escape(templating.formatar_valor(v)) for campo, v in item.items()}
+                for item in valor
+            ]
+        else:
+            escapado[chave] = escape(templating.formatar_valor(valor))
+    return escapado
+
+
+class ModeloHTMLCompilado:
+    """Conteúdo HTML do modelo dividido em trechos fixos e linhas repetidas por item."""
+
+    def __init__(self, conteudo):
+        # (texto, prefixo da lista ou None)
+        self.trechos = []
+        posicao = 0
+        for match in _LINHA_RE.finditer(conteudo):
+            prefixo = templating.lista_do_texto(match.group(0))
+            if prefixo:
+                self.trechos.append((conteudo[posicao:match.start()], None))
+                self.trechos.append((match.group(0), prefixo))
+                posicao = match.end()
+        self.trechos.append((conteudo[posicao:], None))
+        self.trechos = [(texto, prefixo) for texto, prefixo in self.trechos if texto]
+        self.tem_listas = any(prefixo for _, prefixo in self.trechos)
+
+    def renderizar(self, contexto):
+        """Retorna o HTML com os placeholders substituídos pelo contexto (já escapado)."""
+        partes = []
+        for texto, prefixo in self.trechos:
+            if prefixo is None:
+                partes.append(templating.substituir(texto, contexto))
+                continue
+            for item in templating.itens_da_lista(contexto, prefixo):
+                partes.append(templating.substituir(texto, templating.contexto_do_item(contexto, prefixo, item)))
+        return ''.join(partes)
+
+
+def chave_modelo(modelo):
+    return (modelo.pk, modelo.versao, modelo.data_modificacao)
+
+
+def obter_modelo_html_compilado(modelo):
+    """Retorna o conteúdo HTML compilado do cache, compilando-o se a versão mudou."""
+    chave = chave_modelo(modelo)
+    with _cache_lock:
+        item = _cache.get(modelo.pk)
+        if item is not None and item[0] == chave:
+            _cache.move_to_end(modelo.pk)
+            return item[1]
+
+    logger.info(f"Compilando modelo HTML {modelo.pk} (versão {modelo.versao})")
+    compilado = ModeloHTMLCompilado(modelo.conteudo or '')
+
+    limite = getattr(settings, 'DOCUMENTS_TEMPLATE_CACHE_SIZE', 32)
+    with _cache_lock:
+        _cache[modelo.pk] = (chave, compilado)
+        _cache.move_to_end(modelo.pk)
+        while len(_cache) > limite:
+            _cache.popitem(last=False)
+    return compilado
+
+
+def invalidar_modelo_html_compilado(pk):
+    with _cache_lock:
+        _cache.pop(pk, None)
+
+
+def montar_html(modelo, contexto):
+    """HTML completo do termo: o conteúdo do modelo preenchido dentro do layout."""
+    compilado = obter_modelo_html_compilado(modelo)
+    conteudo = compilado.renderizar(_escapar_contexto(contexto))
+    equipamentos = [
+        {
+            'numero': item.get('ITEM'),
+            'descricao': item.get('DESCRICAO'),
+            'numero_serie': item.get('NUMERO_SERIE'),
+            'estado': item.get('ESTADO'),
+            'valor_formatado': item.get('VALOR'),
+        }
+        for item in contexto.get('EQUIPAMENTOS') or []
+    ]
+    return get_template(LAYOUT).render({
+        'titulo': modelo.titulo,
+        'nome_colaborador': contexto.get('NOME', ''),
+        'cpf': contexto.get('CPF', ''),
+        'rg': contexto.get('RG', ''),
+        'endereco': contexto.get('ENDERECO', ''),
+        'numero': contexto.get('NUMERO', ''),
+        'complemento': contexto.get('COMPLEMENTO', ''),
+        'bairro': contexto.get('BAIRRO', ''),
+        'cidade': contexto.get('CIDADE', ''),
+        'estado': contexto.get('ESTADO', ''),
+        'cep': contexto.get('CEP', ''),
+        # O próprio modelo já lista os equipamentos; não repete a tabela do layout
+        'equipamentos': [] if compilado.tem_listas else equipamentos,
+        'total_valor_formatado': contexto.get('VALOR_TOTAL', ''),
+        'conteudo_termo': mark_safe(conteudo),
+        'data_assinatura': contexto.get('DATA_ASSINATURA', ''),
+        'ip_assinatura': contexto.get('IP_ASSINATURA', ''),
+        'dispositivo_assinatura': contexto.get('DISPOSITIVO_ASSINATURA', ''),
+        'hash_assinatura': contexto.get('HASH_ASSINATURA', ''),
+    })
+
+
+def resolver_recurso(uri, rel):
+    """
+    Resolve imagens e folhas de estilo do HTML para arquivos locais.
+
+    Só arquivos de mídia e estáticos são carregados: endereços externos são
+    ignorados, para que a geração nunca fique esperando a rede.
+    """
+    if uri.startswith('data:'):
+        return uri
+    caminho = ''
+    if settings.MEDIA_URL and uri.startswith(settings.MEDIA_URL):
+        raiz = os.path.realpath(settings.MEDIA_ROOT)
+        caminho = os.path.realpath(os.path.join(raiz, uri[len(settings.MEDIA_URL):]))
+        if not caminho.startswith(raiz + os.sep):
+            caminho = ''
+    elif settings.STATIC_URL and uri.startswith(settings.STATIC_URL):
+        caminho = finders.find(uri[len(settings.STATIC_URL):]) or ''
+    if not caminho or not os.path.isfile(caminho):
+        logger.warning(f"Recurso ignorado na geração do PDF: {uri}")
+        return ''
+    return caminho
+
+
+def renderizar_pdf_html(modelo, contexto, pdf_path):
+    """Preenche o conteúdo HTML do modelo com o contexto e grava o PDF em ``pdf_path``."""
+    from xhtml2pdf import pisa
+
+    html = montar_html(modelo, contexto)
+    buffer = BytesIO()
+    status = pisa.CreatePDF(html, dest=buffer, encoding='utf-8', link_callback=resolver_recurso)
+    if status.err:
+        raise RenderizacaoError(f"Erro ao gerar o PDF a partir do conteúdo HTML ({status.err} erro(s))")
+    with open(pdf_path, 'wb') as arquivo:
+        arquivo.write(buffer.getvalue())
+    return pdf_path
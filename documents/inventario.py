@@ -0,0 +1,264 @@
+"""
+Importação e exportação do inventário de equipamentos (CSV/XLSX).
+
+A importação lê o arquivo linha a linha e grava em lotes com
+``bulk_create(update_conflicts=True)``: equipamentos novos são inseridos e os
+já cadastrados (mesmo ``numero_serie``) são atualizados, apenas nas colunas
+presentes no arquivo. A unicidade dos números de série é verificada contra um
+conjunto carregado uma única vez, sem consulta por linha.
+
+A exportação percorre o banco com ``iterator(chunk_size=...)`` e envia o CSV
+conforme é gerado, sem materializar o queryset. Textos que o Excel
+interpretaria como fórmula (``=``, ``+``, ``-``, ``@``...) são exportados com
+um apóstrofo na frente, que a importação remove.
+"""
+import csv
+import importlib.util
+import io
+import itertools
+import logging
+from dataclasses import dataclass, field
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from core import busca
+from core.estatisticas import invalidar_estatisticas
+
+from .models import Equipamento
+
+logger = logging.getLogger(__name__)
+
+# O openpyxl só é importado quando uma planilha é lida ou gerada
+XLSX_AVAILABLE = importlib.util.find_spec('openpyxl') is not None
+
+CAMPOS = [
+    'numero_serie', 'tipo', 'marca', 'modelo', 'descricao', 'valor',
+    'data_aquisicao', 'status', 'observacoes', 'usuario',
+]
+CAMPOS_OBRIGATORIOS = {'numero_serie', 'tipo', 'marca', 'modelo', 'valor', 'data_aquisicao'}
+TAMANHO_LOTE = 1000
+MAX_ERROS = 1000
+# Primeiros caracteres que fazem o Excel/LibreOffice tratar a célula como fórmula
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+class ArquivoInvalido(Exception):
+    pass
+
+
+@dataclass
+class ResultadoImportacao:
+    criados: int = 0
+    atualizados: int = 0
+    total_erros: int = 0
+    erros: list = field(default_factory=list)  # (número da linha, mensagem), limitado a MAX_ERROS
+
+    def registrar_erro(self, numero, mensagem):
+        self.total_erros += 1
+        if len(self.erros) < MAX_ERROS:
+            self.erros.append((numero, mensagem))
+
+
+def ler_csv(arquivo):
+    """Gera as linhas (dicionários) de um CSV binário sem carregá-lo inteiro."""
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    primeira = texto.readline()
+    delimitador = ';' if primeira.count(';') > primeira.count(',') else ','
+    leitor = csv.DictReader(itertools.chain([primeira], texto), delimiter=delimitador)
+    leitor.fieldnames = [nome.strip() for nome in leitor.fieldnames or []]
+    return leitor
+
+
+def ler_xlsx(arquivo):
+    """Gera as linhas da primeira planilha de um XLSX, em modo somente leitura."""
+    if not XLSX_AVAILABLE:
+        raise ArquivoInvalido("Importação de XLSX requer a biblioteca openpyxl.")
+    import openpyxl
+
+    planilha = openpyxl.load_workbook(arquivo, read_only=True, data_only=True).active
+    linhas = planilha.iter_rows(values_only=True)
+    cabecalho = [str(celula or '').strip() for celula in next(linhas, ())]
+    for valores in linhas:
+        if any(valor not in (None, '') for valor in valores):
+            yield dict(zip(cabecalho, valores))
+
+
+def ler_arquivo(arquivo, nome_arquivo):
+    if nome_arquivo.lower().endswith('.xlsx'):
+        return ler_xlsx(arquivo)
+    return ler_csv(arquivo)
+
+
+def _texto(valor):
+    return '' if valor is None else _remover_neutralizacao(str(valor).strip())
+
+
+def _neutralizar_formula(valor):
+    """Prefixa com apóstrofo os textos que a planilha executaria como fórmula."""
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return f"'{valor}"
+    return valor
+
+
+def _remover_neutralizacao(valor):
+    """Desfaz ``_neutralizar_formula`` nos arquivos exportados pelo portal."""
+    if valor.startswith("'") and valor[1:].startswith(INICIO_FORMULA):
+        return valor[1:]
+    return valor
+
+
+class _Importador:
+    def __init__(self, colunas, simular):
+        faltando = CAMPOS_OBRIGATORIOS - set(colunas)
+        if faltando:
+            raise ArquivoInvalido(f"Colunas obrigatórias ausentes: {', '.join(sorted(faltando))}")
+        self.colunas = [coluna for coluna in CAMPOS if coluna in colunas]
+        self.simular = simular
+        self.resultado = ResultadoImportacao()
+        self.existentes = set(Equipamento.objects.values_list('numero_serie', flat=True))
+        self.vistos = {}
+        self.usuarios = {}
+        self.campos_modelo = {nome: Equipamento._meta.get_field(nome) for nome in CAMPOS if nome != 'usuario'}
+
+    def converter(self, linha):
+        """Valida a linha e retorna o equipamento, ou a lista de erros."""
+        dados, erros = {}, []
+        for nome, campo in self.campos_modelo.items():
+            if nome not in self.colunas:
+                dados[nome] = campo.get_default()
+                continue
+            valor = linha.get(nome)
+            if isinstance(valor, str):
+                valor = _remover_neutralizacao(valor.strip())
+            if valor in (None, ''):
+                if nome in CAMPOS_OBRIGATORIOS:
+                    erros.append(f"{nome}: obrigatório")
+                    continue
+                valor = campo.get_default()
+            elif nome == 'valor' and isinstance(valor, str) and ',' in valor:
+                # Formato brasileiro: 1.234,56
+                valor = valor.replace('.', '').replace(',', '.')
+            try:
+                dados[nome] = campo.clean(valor, None)
+            except ValidationError as e:
+                erros.append(f"{nome}: {' '.join(e.messages)}")
+        if 'usuario' in self.colunas:
+            username = _texto(linha.get('usuario'))
+            dados['usuario_id'] = self.usuarios.get(username) if username else None
+            if username and dados['usuario_id'] is None:
+                erros.append(f"usuario: '{username}' não encontrado")
+        return erros or Equipamento(**dados)
+
+    def carregar_usuarios(self, linhas):
+        if 'usuario' not in self.colunas:
+            return
+        usernames = {_texto(linha.get('usuario')) for _, linha in linhas} - {''} - set(self.usuarios)
+        if usernames:
+            self.usuarios.update(
+                get_user_model().objects.filter(username__in=usernames).values_list('username', 'pk')
+            )
+
+    def processar_lote(self, linhas):
+        self.carregar_usuarios(linhas)
+        equipamentos = []
+        for numero, linha in linhas:
+            resultado = self.converter(linha)
+            if isinstance(resultado, list):
+                self.resultado.registrar_erro(numero, '; '.join(resultado))
+                continue
+            serie = resultado.numero_serie
+            if serie in self.vistos:
+                self.resultado.registrar_erro(numero, f"numero_serie '{serie}' repetido (linha {self.vistos[serie]})")
+                continue
+            self.vistos[serie] = numero
+            equipamentos.append(resultado)
+
+        novos = sum(1 for e in equipamentos if e.numero_serie not in self.existentes)
+        self.resultado.criados += novos
+        self.resultado.atualizados += len(equipamentos) - novos
+        if self.simular or not equipamentos:
+            return
+
+        with transaction.atomic():
+            Equipamento.objects.bulk_create(
+                equipamentos,
+                update_conflicts=True,
+                unique_fields=['numero_serie'],
+                # Só as colunas presentes no arquivo são sobrescritas
+                update_fields=[coluna for coluna in self.colunas if coluna != 'numero_serie'] + ['data_modificacao'],
+            )
+            # bulk_create não dispara post_save: o índice de busca é atualizado pelo lote
+            busca.indexar_queryset(
+                Equipamento.objects.filter(numero_serie__in=[e.numero_serie for e in equipamentos])
+            )
+        self.existentes.update(e.numero_serie for e in equipamentos)
+
+
+def importar_equipamentos(linhas, tamanho_lote=TAMANHO_LOTE, simular=False):
+    """
+    Importa os equipamentos de ``linhas`` (iterável de dicionários) em lotes.
+
+    Cada lote é gravado em sua própria transação; linhas inválidas são
+    ignoradas e relatadas no resultado.
+    """
+    linhas = iter(linhas)
+    primeira = next(linhas, None)
+    if primeira is None:
+        return ResultadoImportacao()
+    importador = _Importador(set(primeira), simular)
+
+    numeradas = enumerate(itertools.chain([primeira], linhas), start=2)  # linha 1: cabeçalho
+    while True:
+        lote = list(itertools.islice(numeradas, tamanho_lote))
+        if not lote:
+            break
+        importador.processar_lote(lote)
+
+    resultado = importador.resultado
+    logger.info(
+        f"Importação de equipamentos: {resultado.criados} criado(s), {resultado.atualizados} atualizado(s), "
+        f"{resultado.total_erros} linha(s) com erro"
+    )
+    if not simular and (resultado.criados or resultado.atualizados):
+        # bulk_create não dispara post_save
+        invalidar_estatisticas()
+    return resultado
+
+
+def _linhas_exportacao(queryset, chunk_size):
+    colunas = [campo if campo != 'usuario' else 'usuario__username' for campo in CAMPOS]
+    yield CAMPOS
+    for valores in queryset.values_list(*colunas).iterator(chunk_size=chunk_size):
+        yield ['' if valor is None else _neutralizar_formula(valor) for valor in valores]
+
+
+class _Eco:
+    """Arquivo falso: ``csv.writer`` devolve a linha formatada em vez de acumulá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def exportar_csv(queryset=None, chunk_size=2000):
+    """Gera o CSV do inventário linha a linha."""
+    queryset = Equipamento.objects.order_by('pk') if queryset is None else queryset
+    escritor = csv.writer(_Eco())
+    yield '\ufeff'  # BOM: o Excel reconhece o arquivo como UTF-8
+    for linha in _linhas_exportacao(queryset, chunk_size):
+        yield escritor.writerow(linha)
+
+
+def exportar_xlsx(destino, queryset=None, chunk_size=2000):
+    """Grava o inventário em ``destino`` com o modo write-only do openpyxl."""
+    if not XLSX_AVAILABLE:
+        raise ArquivoInvalido("Exportação para XLSX requer a biblioteca openpyxl.")
+    import openpyxl
+
+    queryset = Equipamento.objects.order_by('pk') if queryset is None else queryset
+    livro = openpyxl.Workbook(write_only=True)
+    planilha = livro.create_sheet('Equipamentos')
+    for linha in _linhas_exportacao(queryset, chunk_size):
+        planilha.append(linha)
+    livro.save(destino)
@@ -0,0 +1,61 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.auditoria import TAMANHO_LOTE, auditar_termos
+
+HASH_LEGADO = 'hash da assinatura calculado com o IP sem normalização (assinatura anterior, não é falha de integridade)'
+
+
+class Command(BaseCommand):
+    help = ('Verifica a integridade dos termos assinados: recalcula o hash da assinatura e confere '
+            'o PDF armazenado com o digest registrado')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processos', type=int, default=0,
+                            help='Processos verificando em paralelo; 0 usa um por núcleo (padrão: 0)')
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE,
+                            help=f'Termos enviados a cada processo por vez (padrão: {TAMANHO_LOTE})')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Não relê PDFs que não foram modificados desde a última verificação')
+        parser.add_argument('--assinatura-digital', action='store_true',
+                            help='Valida também a assinatura digital (PAdES) embutida nos PDFs')
+        parser.add_argument('--relatorio', help='Grava os problemas encontrados neste arquivo CSV')
+        parser.add_argument('--verificar', action='store_true',
+                            help='Falha se algum termo tiver problema de integridade')
+
+    def handle(self, *args, **options):
+        resultado = auditar_termos(
+            processos=options['processos'] or os.cpu_count() or 1,
+            incremental=options['incremental'],
+            assinatura_digital=options['assinatura_digital'],
+            tamanho_lote=max(1, options['lote']),
+        )
+
+        for uuid, mensagem in resultado.problemas:
+            self.stderr.write(f'{uuid}: {mensagem}')
+        if options['relatorio']:
+            with open(options['relatorio'], 'w', newline='', encoding='utf-8') as arquivo:
+                escritor = csv.writer(arquivo)
+                escritor.writerow(['termo', 'problema'])
+                escritor.writerows(resultado.problemas)
+                escritor.writerows((uuid, HASH_LEGADO) for uuid in resultado.hashes_legados)
+        if resultado.hashes_legados:
+            self.stdout.write(self.style.WARNING(
+                f'{len(resultado.hashes_legados)} termo(s) com {HASH_LEGADO}.'
+            ))
+
+        taxa = resultado.verificados / resultado.duracao if resultado.duracao else 0
+        resumo = (
+            f'{resultado.verificados} termo(s) verificado(s) em {resultado.duracao:.1f}s ({taxa:.0f}/s): '
+            f'{resultado.pdfs_lidos} PDF(s) lido(s), {resultado.pdfs_inalterados} inalterado(s), '
+            f'{resultado.digests_registrados} digest(s) registrado(s), {resultado.sem_pdf} sem PDF, '
+            f'{resultado.termos_com_problema} com problema.'
+        )
+        if resultado.problemas:
+            self.stdout.write(self.style.ERROR(resumo))
+            if options['verificar']:
+                raise CommandError(f'{resultado.termos_com_problema} termo(s) com problema de integridade.')
+        else:
+            self.stdout.write(self.style.SUCCESS(resumo))
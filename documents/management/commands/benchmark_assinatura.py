@@ -0,0 +1,113 @@
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from documents import signing
+
+
+def _pdf_exemplo():
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    for pagina in range(2):
+        for linha in range(40):
+            pdf.drawString(60, 800 - linha * 18, f'Termo de responsabilidade - página {pagina + 1}, linha {linha + 1}')
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+_conteudo_pdf = None
+
+
+def _inicializar_worker(config, conteudo_pdf):
+    import django
+    django.setup()
+    global _conteudo_pdf
+    settings.DOCUMENTS_PDF_SIGNING = config
+    signing.obter_assinante.cache_clear()
+    signing.obter_contexto_validacao.cache_clear()
+    _conteudo_pdf = conteudo_pdf
+    # O assinante é carregado fora da medição, como num worker já aquecido
+    signing.obter_assinante()
+
+
+def _medir(quantidade):
+    diretorio = tempfile.mkdtemp(prefix='benchmark_assinatura_')
+    try:
+        caminho = os.path.join(diretorio, 'termo.pdf')
+        decorrido = 0.0
+        for i in range(quantidade):
+            with open(caminho, 'wb') as arquivo:
+                arquivo.write(_conteudo_pdf)
+            inicio = time.perf_counter()
+            signing.assinar_pdf(caminho, motivo=f'Benchmark {i}', nome='Benchmark')
+            decorrido += time.perf_counter() - inicio
+        return decorrido
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+class Command(BaseCommand):
+    help = 'Mede quantas assinaturas PAdES por segundo (e por núcleo) o servidor consegue fazer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assinaturas', type=int, default=50,
+                            help='Assinaturas feitas por processo (padrão: 50)')
+        parser.add_argument('--processos', type=int, default=1,
+                            help='Processos em paralelo; 0 usa um por núcleo (padrão: 1)')
+        parser.add_argument('--pdf', help='PDF usado no teste (padrão: um PDF de duas páginas gerado na hora)')
+        parser.add_argument('--certificado-teste', action='store_true',
+                            help='Usa uma chave e um certificado autoassinados temporários '
+                                 'em vez de DOCUMENTS_PDF_SIGNING')
+
+    def handle(self, *args, **options):
+        processos = options['processos'] or os.cpu_count() or 1
+        quantidade = max(1, options['assinaturas'])
+
+        if options['pdf']:
+            with open(options['pdf'], 'rb') as arquivo:
+                conteudo_pdf = arquivo.read()
+        else:
+            conteudo_pdf = _pdf_exemplo()
+
+        diretorio_certificado = None
+        config = dict(getattr(settings, 'DOCUMENTS_PDF_SIGNING', {}))
+        if options['certificado_teste']:
+            diretorio_certificado = tempfile.mkdtemp(prefix='benchmark_certificado_')
+            chave, certificado = signing.criar_certificado_autoassinado(diretorio_certificado)
+            config.update(KEY=chave, CERT=certificado, CHAIN=[], PASSPHRASE=None)
+        elif not signing.assinatura_habilitada():
+            raise CommandError('DOCUMENTS_PDF_SIGNING não está configurado; use --certificado-teste.')
+
+        try:
+            inicio = time.perf_counter()
+            _inicializar_worker(config, conteudo_pdf)
+            self.stdout.write(f'Assinante carregado em {(time.perf_counter() - inicio) * 1000:.1f} ms')
+
+            if processos == 1:
+                tempos = [_medir(quantidade)]
+            else:
+                contexto = multiprocessing.get_context()
+                with contexto.Pool(processos, initializer=_inicializar_worker, initargs=(config, conteudo_pdf)) as pool:
+                    tempos = pool.map(_medir, [quantidade] * processos)
+        finally:
+            if diretorio_certificado:
+                shutil.rmtree(diretorio_certificado, ignore_errors=True)
+
+        taxas = [quantidade / tempo for tempo in tempos]
+        self.stdout.write(
+            f'PDF de {len(conteudo_pdf) / 1024:.1f} KiB, {quantidade} assinatura(s) por processo, {processos} processo(s)'
+        )
+        self.stdout.write(f'Tempo médio por assinatura: {sum(tempos) / (quantidade * processos) * 1000:.1f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(taxas):.1f} assinaturas/s no total, {sum(taxas) / processos:.1f} assinaturas/s por núcleo'
+        ))
@@ -0,0 +1,91 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Dependências pesadas ou opcionais que não devem ser carregadas na subida do
+# processo, só quando a funcionalidade que as usa é chamada
+MODULOS_PESADOS = ('reportlab', 'xhtml2pdf', 'bs4', 'pyhanko', 'openpyxl', 'docx', 'docx2pdf', 'requests')
+
+
+def _ler_importtime(saida):
+    """Converte a saída de ``-X importtime`` em uma lista de (módulo, próprio_us, acumulado_us, nível)."""
+    modulos = []
+    for linha in saida.splitlines():
+        if not linha.startswith('import time:') or 'self [us]' in linha:
+            continue
+        proprio, acumulado, nome = linha[len('import time:'):].split('|')
+        nivel = (len(nome) - len(nome.lstrip())) // 2
+        modulos.append((nome.strip(), int(proprio), int(acumulado), nivel))
+    return modulos
+
+
+class Command(BaseCommand):
+    help = ('Mede o tempo de importação na subida de um processo novo (como um worker recém-criado) '
+            'e aponta os pacotes que mais pesam')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modulo', default=settings.WSGI_APPLICATION.rsplit('.', 1)[0],
+                            help='Módulo importado (padrão: o módulo WSGI do projeto)')
+        parser.add_argument('--sem-urls', action='store_true',
+                            help='Não carrega as URLs (e as views) após a importação')
+        parser.add_argument('--repeticoes', type=int, default=5,
+                            help='Processos iniciados para a medição (padrão: 5)')
+        parser.add_argument('--top', type=int, default=15,
+                            help='Quantidade de pacotes listados (padrão: 15)')
+        parser.add_argument('--limite', type=float,
+                            help='Falha se a mediana do tempo de importação passar deste valor (ms)')
+        parser.add_argument('--verificar', action='store_true',
+                            help='Falha se alguma dependência pesada for importada na subida')
+
+    def handle(self, *args, **options):
+        codigo = f'import {options["modulo"]}'
+        if not options['sem_urls']:
+            # As URLs (e com elas todas as views) são carregadas na primeira requisição
+            codigo += '; from django.urls import get_resolver; get_resolver().url_patterns'
+        ambiente = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)}
+
+        totais, tempos_processo = [], []
+        por_pacote = defaultdict(list)
+        carregados = set()
+        for _ in range(max(1, options['repeticoes'])):
+            inicio = time.perf_counter()
+            processo = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', codigo],
+                capture_output=True, text=True, cwd=settings.BASE_DIR, env=ambiente,
+            )
+            tempos_processo.append((time.perf_counter() - inicio) * 1000)
+            if processo.returncode != 0:
+                raise CommandError(f'Falha ao importar {options["modulo"]}:\n{processo.stderr[-2000:]}')
+
+            modulos = _ler_importtime(processo.stderr)
+            totais.append(sum(acumulado for _, _, acumulado, nivel in modulos if nivel == 0) / 1000)
+            proprio_por_pacote = defaultdict(int)
+            for nome, proprio, _, _ in modulos:
+                proprio_por_pacote[nome.split('.')[0]] += proprio
+                carregados.add(nome.split('.')[0])
+            for pacote, proprio in proprio_por_pacote.items():
+                por_pacote[pacote].append(proprio / 1000)
+
+        mediana = statistics.median(totais)
+        self.stdout.write(
+            f'{codigo}\nImportação: mediana {mediana:.1f} ms (mín. {min(totais):.1f}, máx. {max(totais):.1f}); '
+            f'processo completo: mediana {statistics.median(tempos_processo):.1f} ms'
+        )
+        self.stdout.write(f'Pacotes que mais pesam (tempo próprio, mediana de {len(totais)} execução(ões)):')
+        ranking = sorted(((statistics.median(t), p) for p, t in por_pacote.items()), reverse=True)
+        for tempo, pacote in ranking[:options['top']]:
+            self.stdout.write(f'  {pacote:<30} {tempo:8.1f} ms')
+
+        pesados = sorted(carregados & set(MODULOS_PESADOS))
+        if pesados:
+            self.stdout.write(self.style.WARNING(f'Dependências pesadas importadas na subida: {", ".join(pesados)}'))
+            if options['verificar']:
+                raise CommandError(f'Dependências pesadas importadas na subida: {", ".join(pesados)}')
+        if options['limite'] and mediana > options['limite']:
+            raise CommandError(f'Tempo de importação ({mediana:.1f} ms) acima do limite de {options["limite"]:.1f} ms')
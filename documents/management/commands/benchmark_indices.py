@@ -0,0 +1,140 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from documents.models import DocumentoModelo, Equipamento, ItemTermo, TermoResponsabilidade
+
+# Trechos do EXPLAIN que indicam acesso por índice em cada banco
+MARCADORES_INDICE = ('USING INDEX', 'USING COVERING INDEX', 'USING INTEGER PRIMARY KEY', 'Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+MARCADORES_VARREDURA = ('SCAN documents_', 'Seq Scan')
+
+
+def _usa_indice(plano):
+    """Considera que a consulta usa índice se nenhuma tabela do app é varrida por completo."""
+    linhas = plano.splitlines()
+    varreduras = [linha for linha in linhas if any(m in linha for m in MARCADORES_VARREDURA)
+                  and not any(m in linha for m in MARCADORES_INDICE)]
+    return not varreduras
+
+
+class Command(BaseCommand):
+    help = ('Popula o banco com um volume grande de termos e equipamentos e verifica, pelo EXPLAIN, '
+            'se as consultas do dashboard e das listagens usam índices')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--equipamentos', type=int, default=50000,
+                            help='Quantidade de equipamentos gerados (padrão: 50000)')
+        parser.add_argument('--colaboradores', type=int, default=2000,
+                            help='Quantidade de colaboradores gerados (padrão: 2000)')
+        parser.add_argument('--repeticoes', type=int, default=20,
+                            help='Execuções de cada consulta para a medição de tempo')
+        parser.add_argument('--manter', action='store_true',
+                            help='Mantém os dados gerados em vez de desfazer a transação')
+        parser.add_argument('--verificar', action='store_true',
+                            help='Falha se alguma consulta não usar índice')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        with transaction.atomic():
+            inicio = time.perf_counter()
+            colaborador, termo = self.popular(options['equipamentos'], options['colaboradores'])
+            self.stdout.write(f'Dados gerados em {time.perf_counter() - inicio:.1f}s')
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            sem_indice = self.medir(colaborador, termo, options['repeticoes'])
+
+            if not options['manter']:
+                transaction.set_rollback(True)
+
+        if sem_indice and options['verificar']:
+            raise CommandError(f"Consultas sem índice: {', '.join(sem_indice)}")
+
+    def popular(self, total_equipamentos, total_colaboradores):
+        User = get_user_model()
+        total_colaboradores = max(1, total_colaboradores)
+        User.objects.bulk_create(
+            [User(username=f'benchmark-{i}', first_name='Colaborador', last_name=str(i))
+             for i in range(total_colaboradores)],
+            batch_size=1000,
+        )
+        colaboradores = list(User.objects.filter(username__startswith='benchmark-').values_list('pk', flat=True))
+        modelo = DocumentoModelo.objects.create(titulo='Benchmark', conteudo='<p>${NOME}</p>', versao='1')
+
+        status_equipamento = [valor for valor, _ in Equipamento.STATUS_CHOICES]
+        tipos = [valor for valor, _ in Equipamento.TIPO_CHOICES]
+        Equipamento.objects.bulk_create(
+            [Equipamento(
+                tipo=tipos[i % len(tipos)], marca='Marca', modelo='Modelo', numero_serie=f'BENCH-{i:08d}',
+                descricao='Equipamento de benchmark', valor=Decimal(100 + i % 5000),
+                data_aquisicao=date(2020, 1, 1) + timedelta(days=i % 1500),
+                status=status_equipamento[i % len(status_equipamento)],
+                usuario_id=colaboradores[i % len(colaboradores)],
+            ) for i in range(total_equipamentos)],
+            batch_size=1000,
+        )
+        equipamentos = list(Equipamento.objects.filter(numero_serie__startswith='BENCH-').values_list('pk', flat=True))
+
+        # Um termo para cada dois equipamentos
+        status_termo = [valor for valor, _ in TermoResponsabilidade.Status.choices]
+        TermoResponsabilidade.objects.bulk_create(
+            [TermoResponsabilidade(
+                colaborador_id=colaboradores[i % len(colaboradores)], modelo=modelo,
+                status=status_termo[i % len(status_termo)],
+            ) for i in range(len(equipamentos) // 2)],
+            batch_size=1000,
+        )
+        termos = list(TermoResponsabilidade.objects.filter(modelo=modelo).values_list('pk', flat=True))
+        ItemTermo.objects.bulk_create(
+            [ItemTermo(termo_id=termos[i // 2], equipamento_id=equipamento, data_entrega=date(2024, 1, 1), estado_entrega='Novo')
+             for i, equipamento in enumerate(equipamentos[:len(termos) * 2])],
+            batch_size=1000,
+        )
+        self.stdout.write(
+            f'{len(colaboradores)} colaboradores, {len(equipamentos)} equipamentos, {len(termos)} termos'
+        )
+        return colaboradores[0], termos[0] if termos else None
+
+    def consultas(self, colaborador, termo):
+        Status = TermoResponsabilidade.Status
+        return [
+            ('Dashboard: termos do colaborador por status',
+             TermoResponsabilidade.objects.filter(colaborador_id=colaborador, status=Status.ASSINADO)),
+            ('Dashboard: termos pendentes do colaborador',
+             TermoResponsabilidade.objects.filter(colaborador_id=colaborador, status=Status.PENDENTE).order_by('-id')),
+            ('Dashboard: últimos termos enviados',
+             TermoResponsabilidade.objects.order_by('-data_envio')[:5]),
+            ('Listagem de termos por status',
+             TermoResponsabilidade.objects.filter(status=Status.ASSINADO).order_by('status', '-id')[:25]),
+            ('Equipamentos do colaborador',
+             Equipamento.objects.filter(usuario_id=colaborador, status='EM_USO')),
+            ('Listagem de equipamentos (mais recentes)',
+             Equipamento.objects.order_by('-data_aquisicao', '-id')[:25]),
+            ('Listagem de equipamentos por status',
+             Equipamento.objects.filter(status='DISPONIVEL').order_by('-data_aquisicao', '-id')[:25]),
+            ('Itens do termo',
+             ItemTermo.objects.filter(termo_id=termo).select_related('equipamento')),
+        ]
+
+    def medir(self, colaborador, termo, repeticoes):
+        sem_indice = []
+        for nome, queryset in self.consultas(colaborador, termo):
+            plano = queryset.explain()
+            inicio = time.perf_counter()
+            for _ in range(repeticoes):
+                list(queryset.all())
+            media_ms = (time.perf_counter() - inicio) / max(1, repeticoes) * 1000
+
+            usa_indice = _usa_indice(plano)
+            if not usa_indice:
+                sem_indice.append(nome)
+            situacao = self.style.SUCCESS('índice') if usa_indice else self.style.ERROR('varredura')
+            self.stdout.write(f'{nome}: {media_ms:.2f} ms [{situacao}]')
+            if self.verbosity > 1:
+                for linha in plano.splitlines():
+                    self.stdout.write(f'    {linha}')
+        return sem_indice
@@ -0,0 +1,371 @@
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+from io import BytesIO
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from documents import html_pdf, template_cache, templating
+from documents.models import DocumentoModelo, Equipamento, ItemTermo, TermoResponsabilidade
+from documents.pdf import DOCX_AVAILABLE, montar_contexto
+
+PREFIXO = 'benchmark-portal'
+
+# Versão do formato do JSON de resultados (para comparar execuções entre releases)
+VERSAO_FORMATO = 1
+
+CONTEUDO_MODELO = (
+    '<p>Eu, <strong>${NOME}</strong>, CPF ${CPF}, RG ${RG}, residente em ${ENDERECO_COMPLETO}, '
+    'declaro ter recebido os equipamentos abaixo, em perfeito estado de conservação.</p>'
+    '<table><tr><th>Item</th><th>Descrição</th><th>Nº de série</th><th>Estado</th><th>Valor</th></tr>'
+    '<tr><td>${EQUIP_ITEM}</td><td>${EQUIP_DESCRICAO}</td><td>${EQUIP_NUMERO_SERIE}</td>'
+    '<td>${EQUIP_ESTADO}</td><td>${EQUIP_VALOR}</td></tr></table>'
+    '<p>Valor total: ${VALOR_TOTAL}.</p>'
+    '<p>Comprometo-me a zelar pelos equipamentos e a devolvê-los ao fim do vínculo.</p>'
+    '<p>Assinado em ${DATA_ASSINATURA} a partir do IP ${IP_ASSINATURA}.</p>'
+)
+
+DADOS_ASSINATURA = {
+    'rg': '1234567', 'endereco': 'Rua do Benchmark', 'numero': '100', 'bairro': 'Centro',
+    'cidade': 'Recife', 'estado': 'PE', 'cep': '50000-000',
+}
+
+
+def _cpf(indice):
+    # Faixa 999.* para não colidir com os CPFs (únicos) dos usuários reais
+    digitos = f'{indice:08d}'
+    return f'999.{digitos[:3]}.{digitos[3:6]}-{digitos[6:8]}'
+
+
+def _estatisticas(tempos):
+    """Resumo de uma lista de durações (s), em milissegundos."""
+    ordenados = sorted(tempos)
+    media = statistics.fmean(ordenados)
+    return {
+        'amostras': len(ordenados),
+        'media_ms': round(media * 1000, 3),
+        'mediana_ms': round(statistics.median(ordenados) * 1000, 3),
+        'p95_ms': round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))] * 1000, 3),
+        'min_ms': round(ordenados[0] * 1000, 3),
+        'max_ms': round(ordenados[-1] * 1000, 3),
+        'por_segundo': round(1 / media, 1) if media else None,
+    }
+
+
+def _medir(funcao, repeticoes, aquecimento=1):
+    for _ in range(aquecimento):
+        funcao()
+    tempos = []
+    for _ in range(max(1, repeticoes)):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def _docx_modelo():
+    """Modelo Word equivalente a ``CONTEUDO_MODELO``, com a linha de equipamentos repetida por item."""
+    from docx import Document
+
+    documento = Document()
+    documento.add_paragraph('Eu, ${NOME}, CPF ${CPF}, RG ${RG}, residente em ${ENDERECO_COMPLETO}, '
+                            'declaro ter recebido os equipamentos abaixo.')
+    tabela = documento.add_table(rows=2, cols=5)
+    for celula, texto in zip(tabela.rows[0].cells, ('Item', 'Descrição', 'Nº de série', 'Estado', 'Valor')):
+        celula.text = texto
+    campos = ('${EQUIP_ITEM}', '${EQUIP_DESCRICAO}', '${EQUIP_NUMERO_SERIE}', '${EQUIP_ESTADO}', '${EQUIP_VALOR}')
+    for celula, texto in zip(tabela.rows[1].cells, campos):
+        celula.text = texto
+    documento.add_paragraph('Valor total: ${VALOR_TOTAL}. Assinado em ${DATA_ASSINATURA} (${IP_ASSINATURA}).')
+    buffer = BytesIO()
+    documento.save(buffer)
+    return buffer.getvalue()
+
+
+def _consumir(response):
+    # O Client fecha a resposta ao fim do conteúdo, sem disparar o fechamento
+    # das conexões com o banco (que encerraria a transação do benchmark)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+def comparar(atual, anterior, tolerancia):
+    """
+    Compara as medianas de duas execuções.
+
+    Retorna ``(nome, mediana_anterior, mediana_atual, variacao_percentual)`` para
+    os cenários presentes nas duas e a lista dos que pioraram mais que ``tolerancia`` (%).
+    """
+    comparacoes, regressoes = [], []
+    for nome, resultado in atual['resultados'].items():
+        referencia = anterior.get('resultados', {}).get(nome)
+        if not referencia or not referencia.get('mediana_ms'):
+            continue
+        variacao = (resultado['mediana_ms'] - referencia['mediana_ms']) / referencia['mediana_ms'] * 100
+        comparacoes.append((nome, referencia['mediana_ms'], resultado['mediana_ms'], variacao))
+        if variacao > tolerancia:
+            regressoes.append(nome)
+    return comparacoes, regressoes
+
+
+class Command(BaseCommand):
+    help = ('Gera colaboradores, equipamentos e termos de teste e mede a substituição de placeholders, '
+            'o preenchimento dos modelos, a geração de PDF e as principais páginas (assinatura, download, '
+            'listagem e dashboard); os resultados podem ser gravados em JSON e comparados entre releases')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--colaboradores', type=int, default=100,
+                            help='Quantidade de colaboradores gerados (padrão: 100)')
+        parser.add_argument('--termos', type=int, default=1000,
+                            help='Termos gerados além dos usados nas requisições (padrão: 1000)')
+        parser.add_argument('--equipamentos-por-termo', type=int, default=3,
+                            help='Equipamentos em cada termo (padrão: 3)')
+        parser.add_argument('--repeticoes', type=int, default=200,
+                            help='Execuções de cada micro-benchmark (padrão: 200)')
+        parser.add_argument('--requisicoes', type=int, default=50,
+                            help='Requisições de cada cenário ponta a ponta (padrão: 50)')
+        parser.add_argument('--saida', help='Grava os resultados neste arquivo JSON')
+        parser.add_argument('--comparar', help='JSON de uma execução anterior, usado como referência')
+        parser.add_argument('--tolerancia', type=float, default=20.0,
+                            help='Aumento da mediana (%%) considerado regressão na comparação (padrão: 20)')
+        parser.add_argument('--verificar', action='store_true',
+                            help='Falha se algum cenário regredir em relação a --comparar')
+
+    def handle(self, *args, **options):
+        anterior = None
+        if options['comparar']:
+            try:
+                with open(options['comparar'], encoding='utf-8') as arquivo:
+                    anterior = json.load(arquivo)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Não foi possível ler {options['comparar']}: {e}")
+
+        diretorio = tempfile.mkdtemp(prefix='benchmark-portal-')
+        # PDFs gerados em um diretório temporário, cache próprio (as estatísticas e os
+        # fragmentos dos dados gerados não podem ficar no cache compartilhado) e
+        # DEBUG desligado, como em produção
+        configuracao = override_settings(
+            MEDIA_ROOT=diretorio, DEBUG=False, ALLOWED_HOSTS=['testserver'],
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                'LOCATION': 'benchmark-portal'}},
+        )
+        dados = None
+        try:
+            with configuracao, transaction.atomic():
+                inicio = time.perf_counter()
+                dados = self.popular(
+                    options['colaboradores'], options['termos'],
+                    options['equipamentos_por_termo'], options['requisicoes'],
+                )
+                self.stdout.write(f'Dados gerados em {time.perf_counter() - inicio:.1f}s')
+
+                resultados = {}
+                resultados.update(self.micro_benchmarks(dados, options['repeticoes']))
+                resultados.update(self.ponta_a_ponta(dados, options['requisicoes']))
+
+                # Nada do que foi gerado permanece no banco
+                transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+            if dados is not None:
+                template_cache.invalidar_modelo_compilado(dados['modelo'].pk)
+                html_pdf.invalidar_modelo_html_compilado(dados['modelo'].pk)
+
+        relatorio = {
+            'versao_formato': VERSAO_FORMATO,
+            'data': timezone.now().isoformat(),
+            'ambiente': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'banco': connection.vendor,
+                'plataforma': platform.platform(),
+                'processadores': os.cpu_count(),
+            },
+            'parametros': {chave: options[chave] for chave in (
+                'colaboradores', 'termos', 'equipamentos_por_termo', 'repeticoes', 'requisicoes',
+            )},
+            'resultados': resultados,
+        }
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultados gravados em {options['saida']}")
+
+        if anterior is not None:
+            comparacoes, regressoes = comparar(relatorio, anterior, options['tolerancia'])
+            self.stdout.write(f"Comparação com {options['comparar']} (mediana):")
+            for nome, antes, depois, variacao in comparacoes:
+                linha = f'  {nome}: {antes:.3f} ms -> {depois:.3f} ms ({variacao:+.1f}%)'
+                self.stdout.write(self.style.ERROR(linha) if nome in regressoes else linha)
+            if regressoes and options['verificar']:
+                raise CommandError(f"Cenários com regressão acima de {options['tolerancia']:.0f}%: {', '.join(regressoes)}")
+
+    def popular(self, total_colaboradores, total_termos, equipamentos_por_termo, requisicoes):
+        """
+        Gera os dados do benchmark. Os ``requisicoes`` primeiros termos ficam pendentes
+        (para a assinatura) e os seguintes assinados e sem PDF (para o download); os
+        demais, com status variados, dão volume às listagens e ao dashboard.
+        """
+        User = get_user_model()
+        total_colaboradores = max(1, total_colaboradores)
+        User.objects.bulk_create(
+            [User(username=f'{PREFIXO}-{i}', first_name='Colaborador', last_name=str(i),
+                  email=f'{PREFIXO}-{i}@example.com', cpf=_cpf(i), **DADOS_ASSINATURA)
+             for i in range(total_colaboradores)],
+            batch_size=1000,
+        )
+        colaboradores = list(User.objects.filter(username__startswith=f'{PREFIXO}-').order_by('pk'))
+        admin = User.objects.create(username=f'{PREFIXO}-admin', first_name='Administrador', is_staff=True)
+        modelo = DocumentoModelo.objects.create(titulo='Benchmark', conteudo=CONTEUDO_MODELO, versao='1')
+
+        agora = timezone.now()
+        status_termo = [valor for valor, _ in TermoResponsabilidade.Status.choices]
+        novos = []
+        for i in range(2 * requisicoes + total_termos):
+            if i < requisicoes:
+                status = TermoResponsabilidade.Status.PENDENTE
+            elif i < 2 * requisicoes:
+                status = TermoResponsabilidade.Status.ASSINADO
+            else:
+                status = status_termo[i % len(status_termo)]
+            assinado = status == TermoResponsabilidade.Status.ASSINADO
+            novos.append(TermoResponsabilidade(
+                colaborador=colaboradores[i % len(colaboradores)], modelo=modelo, status=status,
+                data_assinatura=agora if assinado else None,
+                ip_assinatura='127.0.0.1' if assinado else None,
+            ))
+        TermoResponsabilidade.objects.bulk_create(novos, batch_size=1000)
+        termos = list(TermoResponsabilidade.objects.filter(modelo=modelo).select_related('colaborador').order_by('pk'))
+
+        Equipamento.objects.bulk_create(
+            [Equipamento(
+                tipo='NOTEBOOK', marca='Dell', modelo='Latitude', numero_serie=f'{PREFIXO}-{i:08d}',
+                descricao='Equipamento de benchmark', valor=Decimal(1000 + i % 5000),
+                data_aquisicao=date(2024, 1, 1), status='EM_USO',
+            ) for i in range(len(termos) * equipamentos_por_termo)],
+            batch_size=1000,
+        )
+        equipamentos = list(
+            Equipamento.objects.filter(numero_serie__startswith=f'{PREFIXO}-').order_by('pk').values_list('pk', flat=True)
+        )
+        ItemTermo.objects.bulk_create(
+            [ItemTermo(termo=termos[i // equipamentos_por_termo], equipamento_id=equipamento,
+                       data_entrega=date(2024, 1, 2), estado_entrega='Novo')
+             for i, equipamento in enumerate(equipamentos)],
+            batch_size=1000,
+        )
+        self.stdout.write(
+            f'{len(colaboradores)} colaboradores, {len(equipamentos)} equipamentos, {len(termos)} termos'
+        )
+        return {
+            'modelo': modelo,
+            'admin': admin,
+            'colaborador': colaboradores[0],
+            'pendentes': termos[:requisicoes],
+            'assinados': termos[requisicoes:2 * requisicoes],
+        }
+
+    def registrar(self, resultados, nome, tempos, **extras):
+        resultados[nome] = {**_estatisticas(tempos), **extras}
+        resumo = resultados[nome]
+        linha = (f"{nome}: mediana {resumo['mediana_ms']:.3f} ms, p95 {resumo['p95_ms']:.3f} ms, "
+                 f"{resumo['por_segundo']}/s")
+        if extras.get('erros'):
+            linha += f" [{extras['erros']} erro(s)]"
+        self.stdout.write(self.style.ERROR(linha) if extras.get('erros') else linha)
+
+    def micro_benchmarks(self, dados, repeticoes):
+        modelo = dados['modelo']
+        termo = dados['assinados'][0] if dados['assinados'] else dados['pendentes'][0]
+        contexto = montar_contexto(termo)
+        resultados = {}
+
+        self.registrar(resultados, 'substituicao_placeholders',
+                       _medir(lambda: templating.substituir(modelo.conteudo, contexto), repeticoes))
+        self.registrar(resultados, 'preenchimento_html',
+                       _medir(lambda: html_pdf.montar_html(modelo, contexto), repeticoes))
+
+        if DOCX_AVAILABLE:
+            compilado = template_cache.ModeloCompilado(_docx_modelo())
+            self.registrar(resultados, 'preenchimento_docx',
+                           _medir(lambda: compilado.renderizar(contexto), repeticoes))
+        else:
+            self.stdout.write('preenchimento_docx: python-docx não instalado, ignorado')
+
+        # A geração de PDF é ordens de grandeza mais lenta que as demais etapas
+        caminho = os.path.join(tempfile.gettempdir(), f'{PREFIXO}-{os.getpid()}.pdf')
+        try:
+            self.registrar(resultados, 'renderizacao_pdf_html',
+                           _medir(lambda: html_pdf.renderizar_pdf_html(modelo, contexto, caminho),
+                                  max(1, repeticoes // 10)))
+        finally:
+            if os.path.exists(caminho):
+                os.unlink(caminho)
+        return resultados
+
+    def ponta_a_ponta(self, dados, requisicoes):
+        clientes = {}
+
+        def cliente(usuario):
+            if usuario.pk not in clientes:
+                clientes[usuario.pk] = Client()
+                clientes[usuario.pk].force_login(usuario)
+            return clientes[usuario.pk]
+
+        def executar(requisicoes_cenario, status_esperado):
+            """Executa as requisições ``(cliente, metodo, url, dados)`` e retorna (tempos, erros)."""
+            tempos, erros = [], 0
+            for c, metodo, url, corpo in requisicoes_cenario:
+                inicio = time.perf_counter()
+                response = getattr(c, metodo)(url, corpo)
+                _consumir(response)
+                tempos.append(time.perf_counter() - inicio)
+                if response.status_code != status_esperado:
+                    erros += 1
+            return tempos, erros
+
+        resultados = {}
+        if dados['pendentes']:
+            tempos, erros = executar([
+                (cliente(termo.colaborador), 'post', reverse('documents:termo_sign', args=[termo.uuid]),
+                 {**DADOS_ASSINATURA, 'cpf': termo.colaborador.cpf})
+                for termo in dados['pendentes']
+            ], 302)
+            self.registrar(resultados, 'assinatura', tempos, erros=erros)
+
+        if dados['assinados']:
+            downloads = [
+                (cliente(termo.colaborador), 'get', reverse('documents:termo_download', args=[termo.uuid]), {})
+                for termo in dados['assinados']
+            ]
+            # Primeiro acesso: o PDF é gerado na requisição; depois, apenas servido
+            tempos, erros = executar(downloads, 200)
+            self.registrar(resultados, 'download_com_geracao', tempos, erros=erros)
+            tempos, erros = executar(downloads, 200)
+            self.registrar(resultados, 'download', tempos, erros=erros)
+
+        paginas = [
+            ('lista_termos', dados['admin'], reverse('documents:termo_list')),
+            ('dashboard_admin', dados['admin'], reverse('core:dashboard')),
+            ('dashboard_colaborador', dados['colaborador'], reverse('core:dashboard')),
+        ]
+        for nome, usuario, url in paginas:
+            c = cliente(usuario)
+            _consumir(c.get(url))  # aquecimento (templates, cache das estatísticas)
+            tempos, erros = executar([(c, 'get', url, {})] * max(1, requisicoes), 200)
+            self.registrar(resultados, nome, tempos, erros=erros)
+        return resultados
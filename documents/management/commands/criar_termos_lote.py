@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.bulk import LoteInvalido, criar_termos_em_lote, ler_linhas
+
+
+class Command(BaseCommand):
+    help = ('Cria termos de responsabilidade em lote a partir de um arquivo CSV ou JSON '
+            'com as colunas colaborador, modelo e equipamentos')
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo CSV ou JSON')
+        parser.add_argument('--formato', choices=['csv', 'json'],
+                            help='Formato do arquivo (padrão: detectado pela extensão/conteúdo)')
+        parser.add_argument('--parcial', action='store_true',
+                            help='Grava as linhas válidas mesmo que outras tenham erros')
+        parser.add_argument('--simular', action='store_true',
+                            help='Apenas valida o arquivo, sem gravar')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                linhas = ler_linhas(arquivo.read(), options['formato'], options['arquivo'])
+        except OSError as e:
+            raise CommandError(f"Não foi possível ler o arquivo: {e}")
+        except LoteInvalido as e:
+            raise CommandError(str(e))
+
+        inicio = time.perf_counter()
+        resultado = criar_termos_em_lote(linhas, parcial=options['parcial'], simular=options['simular'])
+        duracao = time.perf_counter() - inicio
+
+        for numero, mensagem in resultado.erros:
+            self.stderr.write(f'Linha {numero}: {mensagem}')
+
+        if options['simular']:
+            self.stdout.write(f'{len(linhas) - len(resultado.erros)} de {len(linhas)} linha(s) válida(s).')
+        elif resultado.termos:
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(resultado.termos)} termo(s) e {resultado.total_itens} item(ns) criados em {duracao:.2f}s.'
+            ))
+        if resultado.erros and not (options['parcial'] or options['simular']):
+            raise CommandError(f'{len(resultado.erros)} linha(s) com erro; nenhum termo foi criado.')
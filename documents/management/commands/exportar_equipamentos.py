@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.inventario import ArquivoInvalido, exportar_csv, exportar_xlsx
+
+
+class Command(BaseCommand):
+    help = 'Exporta o inventário de equipamentos para CSV ou XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--saida', help='Arquivo de destino (padrão: saída padrão, apenas CSV)')
+        parser.add_argument('--formato', choices=['csv', 'xlsx'],
+                            help='Formato (padrão: pela extensão do arquivo de saída, ou CSV)')
+
+    def handle(self, *args, **options):
+        saida = options['saida']
+        formato = options['formato'] or ('xlsx' if saida and saida.lower().endswith('.xlsx') else 'csv')
+
+        if formato == 'xlsx':
+            if not saida:
+                raise CommandError('Informe --saida para exportar em XLSX.')
+            try:
+                exportar_xlsx(saida)
+            except ArquivoInvalido as e:
+                raise CommandError(str(e))
+            return
+
+        if saida:
+            with open(saida, 'w', encoding='utf-8', newline='') as arquivo:
+                arquivo.writelines(exportar_csv())
+        else:
+            for linha in exportar_csv():
+                self.stdout.write(linha, ending='')
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from documents.inventario import TAMANHO_LOTE, ArquivoInvalido, importar_equipamentos, ler_arquivo
+
+
+class Command(BaseCommand):
+    help = 'Importa (cria ou atualiza pelo número de série) equipamentos de um arquivo CSV ou XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo CSV ou XLSX')
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE,
+                            help=f'Linhas gravadas por transação (padrão: {TAMANHO_LOTE})')
+        parser.add_argument('--simular', action='store_true',
+                            help='Apenas valida o arquivo, sem gravar')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                resultado = importar_equipamentos(
+                    ler_arquivo(arquivo, options['arquivo']),
+                    tamanho_lote=max(1, options['lote']),
+                    simular=options['simular'],
+                )
+        except OSError as e:
+            raise CommandError(f"Não foi possível ler o arquivo: {e}")
+        except (ArquivoInvalido, UnicodeDecodeError) as e:
+            raise CommandError(str(e))
+        duracao = time.perf_counter() - inicio
+
+        for numero, mensagem in resultado.erros:
+            self.stderr.write(f'Linha {numero}: {mensagem}')
+        if resultado.total_erros > len(resultado.erros):
+            self.stderr.write(f'... e mais {resultado.total_erros - len(resultado.erros)} linha(s) com erro')
+
+        total = resultado.criados + resultado.atualizados
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.criados} criado(s), {resultado.atualizados} atualizado(s), '
+            f'{resultado.total_erros} com erro em {duracao:.2f}s ({total / duracao if duracao else 0:.0f} linhas/s).'
+        ))
@@ -0,0 +1,57 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from documents.tasks import processar_fila
+
+
+def _executar_worker(continuo, intervalo, varredura):
+    import django
+    django.setup()
+    processar_fila(continuo=continuo, intervalo=intervalo, varredura=varredura)
+
+
+class Command(BaseCommand):
+    help = 'Processa a fila de geração de PDF dos termos assinados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Número de processos worker (padrão: 1)')
+        parser.add_argument('--continuo', action='store_true',
+                            help='Continua aguardando novas tarefas em vez de sair com a fila vazia')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos entre consultas quando a fila está vazia')
+        parser.add_argument('--varrer', action='store_true',
+                            help='Enfileira também os termos assinados que estão sem PDF')
+        parser.add_argument('--intervalo-varredura', type=float, default=300.0,
+                            help='Segundos entre varreduras no modo contínuo (padrão: 300)')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        continuo = options['continuo']
+        intervalo = options['intervalo']
+        varredura = options['intervalo_varredura'] if options['varrer'] else None
+
+        if workers == 1:
+            total = processar_fila(continuo=continuo, intervalo=intervalo, varredura=varredura)
+            self.stdout.write(self.style.SUCCESS(f'{total} tarefa(s) processada(s).'))
+            return
+
+        # Conexões abertas não podem ser compartilhadas entre processos
+        connections.close_all()
+        # Só o primeiro worker faz a varredura, para não enfileirar o mesmo termo duas vezes
+        processos = [
+            multiprocessing.Process(target=_executar_worker, args=(continuo, intervalo, varredura if i == 0 else None))
+            for i in range(workers)
+        ]
+        for processo in processos:
+            processo.start()
+        self.stdout.write(f'{workers} workers iniciados.')
+        try:
+            for processo in processos:
+                processo.join()
+        except KeyboardInterrupt:
+            for processo in processos:
+                processo.terminate()
+        self.stdout.write(self.style.SUCCESS('Fila processada.'))
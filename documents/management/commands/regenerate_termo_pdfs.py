@@ -0,0 +1,84 @@
+import argparse
+import os
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from documents.models import TermoResponsabilidade
+from documents.regeneracao import TAMANHO_LOTE, regenerar_pdfs
+
+
+def _data(valor):
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida: '{valor}' (use AAAA-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = ('Regenera em paralelo os PDFs dos termos assinados selecionados pelos filtros '
+            '(por exemplo, após corrigir o texto de um modelo)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modelo', type=int, action='append',
+                            help='Só termos deste modelo (id); pode ser repetido')
+        parser.add_argument('--uuid', action='append', help='Só este termo; pode ser repetido')
+        parser.add_argument('--colaborador', help='Só termos deste colaborador (username)')
+        parser.add_argument('--desde', type=_data, help='Assinados a partir desta data (AAAA-MM-DD)')
+        parser.add_argument('--ate', type=_data, help='Assinados até esta data (AAAA-MM-DD)')
+        parser.add_argument('--sem-pdf', action='store_true',
+                            help='Só termos sem PDF gerado (arquivo ausente ou geração com erro), '
+                                 'exceto os que estão na fila de geração')
+        parser.add_argument('--processos', type=int, default=0,
+                            help='Processos gerando em paralelo; 0 usa um por núcleo (padrão: 0)')
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE,
+                            help=f'Termos enviados a cada processo por vez (padrão: {TAMANHO_LOTE})')
+        parser.add_argument('--simular', action='store_true',
+                            help='Apenas informa quantos termos seriam regenerados')
+
+    def handle(self, *args, **options):
+        termos = TermoResponsabilidade.objects.filter(status=TermoResponsabilidade.Status.ASSINADO)
+        if options['modelo']:
+            termos = termos.filter(modelo_id__in=options['modelo'])
+        if options['uuid']:
+            termos = termos.filter(uuid__in=options['uuid'])
+        if options['colaborador']:
+            termos = termos.filter(colaborador__username=options['colaborador'])
+        if options['desde']:
+            termos = termos.filter(data_assinatura__date__gte=options['desde'])
+        if options['ate']:
+            termos = termos.filter(data_assinatura__date__lte=options['ate'])
+        if options['sem_pdf']:
+            # Termos na fila ou em geração ficam com os workers da fila
+            termos = termos.filter(
+                Q(arquivo_pdf='') | Q(arquivo_pdf__isnull=True) | ~Q(status_pdf=TermoResponsabilidade.StatusPDF.GERADO)
+            ).exclude(
+                status_pdf__in=[TermoResponsabilidade.StatusPDF.NA_FILA, TermoResponsabilidade.StatusPDF.PROCESSANDO]
+            )
+
+        total = termos.count()
+        if options['simular'] or not total:
+            self.stdout.write(f'{total} termo(s) seriam regenerado(s).' if options['simular'] else 'Nenhum termo selecionado.')
+            return
+
+        processos = options['processos'] or os.cpu_count() or 1
+        self.stdout.write(f'Regenerando {total} PDF(s) com {processos} processo(s)...')
+
+        def progresso(resultado):
+            concluidos = resultado.gerados + len(resultado.erros)
+            self.stdout.write(f'  {concluidos}/{total} ({resultado.taxa:.1f}/s)')
+
+        resultado = regenerar_pdfs(
+            termos, processos=processos, tamanho_lote=max(1, options['lote']), progresso=progresso,
+        )
+
+        for uuid, erro in resultado.erros:
+            self.stderr.write(f'{uuid}: {erro}')
+        for uuid in resultado.ocupados:
+            self.stderr.write(f'{uuid}: PDF em geração por outro processo; não regenerado')
+        resumo = (
+            f'{resultado.gerados} PDF(s) gerado(s) em {resultado.duracao:.1f}s ({resultado.taxa:.1f}/s), '
+            f'{len(resultado.erros)} erro(s), {len(resultado.ocupados)} em geração por outro processo.'
+        )
+        self.stdout.write(self.style.ERROR(resumo) if resultado.erros else self.style.SUCCESS(resumo))
@@ -2,6 +2,48 @@
 
 from django.db import migrations
 
+# Recria a tabela de equipamentos sem a restrição NOT NULL em usuario_id, que o
+# AlterField da 0008 não removia nos bancos SQLite criados até então. Nos demais
+# bancos a 0008 já altera a coluna, e o SQL abaixo (específico do SQLite) não roda
+SQL_SQLITE = """
+-- Recriando a tabela sem a restrição NOT NULL
+CREATE TABLE "new_documents_equipamento" (
+    "id" integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+    "tipo" varchar(20) NOT NULL,
+    "marca" varchar(100) NOT NULL,
+    "modelo" varchar(100) NOT NULL,
+    "numero_serie" varchar(100) NOT NULL UNIQUE,
+    "descricao" text NOT NULL,
+    "valor" decimal NOT NULL,
+    "data_aquisicao" date NOT NULL,
+    "status" varchar(20) NOT NULL,
+    "observacoes" text NOT NULL,
+    "usuario_id" integer NULL REFERENCES "users_user" ("id") ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED
+);
+
+-- Copiando os dados
+INSERT INTO "new_documents_equipamento"
+SELECT "id", "tipo", "marca", "modelo", "numero_serie", "descricao", "valor", "data_aquisicao", "status", "observacoes", "usuario_id"
+FROM "documents_equipamento";
+
+-- Removendo a tabela antiga
+DROP TABLE "documents_equipamento";
+
+-- Renomeando a nova tabela
+ALTER TABLE "new_documents_equipamento" RENAME TO "documents_equipamento";
+
+-- Recriando outros índices necessários
+CREATE INDEX "documents_equipamento_usuario_id_idx" ON "documents_equipamento" ("usuario_id");
+"""
+
+
+def recriar_tabela_sqlite(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for comando in SQL_SQLITE.split(';'):
+        if comando.strip():
+            schema_editor.execute(comando)
+
 
 class Migration(migrations.Migration):
 
@@ -10,39 +52,6 @@ class Migration(migrations.Migration):
     ]
 
     operations = [
-        migrations.RunSQL(
-            """
-            -- Recriando a tabela sem a restrição NOT NULL
-            CREATE TABLE "new_documents_equipamento" (
-                "id" integer NOT NULL PRIMARY KEY AUTOINCREMENT,
-                "tipo" varchar(20) NOT NULL,
-                "marca" varchar(100) NOT NULL,
-                "modelo" varchar(100) NOT NULL,
-                "numero_serie" varchar(100) NOT NULL UNIQUE,
-                "descricao" text NOT NULL,
-                "valor" decimal NOT NULL,
-                "data_aquisicao" date NOT NULL,
-                "status" varchar(20) NOT NULL,
-                "observacoes" text NOT NULL,
-                "usuario_id" integer NULL REFERENCES "users_user" ("id") ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED
-            );
-            
-            -- Copiando os dados
-            INSERT INTO "new_documents_equipamento" 
-            SELECT "id", "tipo", "marca", "modelo", "numero_serie", "descricao", "valor", "data_aquisicao", "status", "observacoes", "usuario_id"
-            FROM "documents_equipamento";
-            
-            -- Removendo a tabela antiga
-            DROP TABLE "documents_equipamento";
-            
-            -- Renomeando a nova tabela
-            ALTER TABLE "new_documents_equipamento" RENAME TO "documents_equipamento";
-            
-            -- Recriando outros índices necessários
-            CREATE INDEX "documents_equipamento_usuario_id_idx" ON "documents_equipamento" ("usuario_id");
-            """,
-            reverse_sql="""
-            -- Se precisar reverter, recriaremos a tabela original (não ideal pois perderia dados)
-            """,
-        )
+        # Se precisar reverter, não há o que desfazer (a coluna continua aceitando NULL)
+        migrations.RunPython(recriar_tabela_sqlite, migrations.RunPython.noop),
     ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.10 on 2026-10-18 15:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def marcar_pdfs_existentes(apps, schema_editor):
+    TermoResponsabilidade = apps.get_model('documents', 'TermoResponsabilidade')
+    TermoResponsabilidade.objects.exclude(arquivo_pdf='').exclude(arquivo_pdf__isnull=True).update(
+        status_pdf='GERADO'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_fix_usuario_null'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='termoresponsabilidade',
+            name='status_pdf',
+            field=models.CharField(choices=[('NAO_GERADO', 'Não gerado'), ('NA_FILA', 'Na fila'), ('PROCESSANDO', 'Processando'), ('GERADO', 'Gerado'), ('ERRO', 'Erro')], default='NAO_GERADO', max_length=20, verbose_name='Status do PDF'),
+        ),
+        migrations.CreateModel(
+            name='TarefaPDF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('PROCESSANDO', 'Processando'), ('CONCLUIDA', 'Concluída'), ('ERRO', 'Erro')], default='PENDENTE', max_length=20, verbose_name='Status')),
+                ('tentativas', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('max_tentativas', models.PositiveIntegerField(default=3, verbose_name='Máximo de Tentativas')),
+                ('agendada_para', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Agendada para')),
+                ('erro', models.TextField(blank=True, verbose_name='Último Erro')),
+                ('data_criacao', models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')),
+                ('data_conclusao', models.DateTimeField(blank=True, null=True, verbose_name='Data de Conclusão')),
+                ('termo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tarefas_pdf', to='documents.termoresponsabilidade')),
+            ],
+            options={
+                'verbose_name': 'Tarefa de PDF',
+                'verbose_name_plural': 'Tarefas de PDF',
+                'indexes': [models.Index(fields=['status', 'agendada_para'], name='tarefa_pdf_fila_idx')],
+            },
+        ),
+        migrations.RunPython(marcar_pdfs_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.10 on 2026-10-18 15:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0010_fila_geracao_pdf'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipamento',
+            index=models.Index(fields=['usuario', 'status'], name='equip_usuario_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipamento',
+            index=models.Index(fields=['-data_aquisicao', '-id'], name='equip_aquisicao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipamento',
+            index=models.Index(fields=['status', '-data_aquisicao'], name='equip_status_aquisicao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipamento',
+            index=models.Index(fields=['tipo', '-data_aquisicao'], name='equip_tipo_aquisicao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itemtermo',
+            index=models.Index(fields=['termo', 'equipamento'], name='item_termo_equip_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='termoresponsabilidade',
+            index=models.Index(fields=['colaborador', 'status'], name='termo_colab_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='termoresponsabilidade',
+            index=models.Index(condition=models.Q(('status', 'PENDENTE')), fields=['colaborador', '-id'], name='termo_pendente_colab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='termoresponsabilidade',
+            index=models.Index(fields=['-data_envio'], name='termo_data_envio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='termoresponsabilidade',
+            index=models.Index(fields=['status', '-id'], name='termo_status_id_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0011_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='termoresponsabilidade',
+            name='digest_pdf',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Digest do PDF'),
+        ),
+        migrations.AddField(
+            model_name='termoresponsabilidade',
+            name='digest_pdf_verificado_em',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='PDF verificado em'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-18 15:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0012_digest_pdf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipamento',
+            name='data_modificacao',
+            field=models.DateTimeField(auto_now=True, verbose_name='Última Modificação'),
+        ),
+        migrations.AddField(
+            model_name='termoresponsabilidade',
+            name='data_modificacao',
+            field=models.DateTimeField(auto_now=True, verbose_name='Última Modificação'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0013_data_modificacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='termoresponsabilidade',
+            name='geracao_pdf_iniciada_em',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Geração do PDF iniciada em'),
+        ),
+    ]
@@ -5,6 +5,9 @@ import uuid
 from tinymce.models import HTMLField
 import os
 
+from .html_pdf import invalidar_modelo_html_compilado
+from .template_cache import invalidar_modelo_compilado
+
 class Equipamento(models.Model):
     TIPO_CHOICES = [
         ('NOTEBOOK', 'Notebook'),
@@ -38,10 +41,20 @@ class Equipamento(models.Model):
         on_delete=models.CASCADE,
         related_name='equipamentos'
     )
+    # Entra na chave do cache dos fragmentos da página do equipamento
+    data_modificacao = models.DateTimeField('Última Modificação', auto_now=True)
     
     class Meta:
         verbose_name = 'Equipamento'
         verbose_name_plural = 'Equipamentos'
+        indexes = [
+            # Dashboard do colaborador e filtro por colaborador na listagem
+            models.Index(fields=['usuario', 'status'], name='equip_usuario_status_idx'),
+            # Ordenação padrão da listagem, com e sem filtros de status/tipo
+            models.Index(fields=['-data_aquisicao', '-id'], name='equip_aquisicao_idx'),
+            models.Index(fields=['status', '-data_aquisicao'], name='equip_status_aquisicao_idx'),
+            models.Index(fields=['tipo', '-data_aquisicao'], name='equip_tipo_aquisicao_idx'),
+        ]
         
     def __str__(self):
         return f"{self.tipo} - {self.marca} {self.modelo} ({self.numero_serie})"
@@ -72,6 +85,9 @@ class DocumentoModelo(models.Model):
         except DocumentoModelo.DoesNotExist:
             pass
         super().save(*args, **kwargs)
+        # O arquivo ou a versão podem ter mudado; descarta o modelo compilado
+        invalidar_modelo_compilado(self.pk)
+        invalidar_modelo_html_compilado(self.pk)
 
 class TermoResponsabilidade(models.Model):
     class Status(models.TextChoices):
@@ -81,6 +97,13 @@ class TermoResponsabilidade(models.Model):
         RECUSADO = 'RECUSADO', 'Recusado'
         CANCELADO = 'CANCELADO', 'Cancelado'
     
+    class StatusPDF(models.TextChoices):
+        NAO_GERADO = 'NAO_GERADO', 'Não gerado'
+        NA_FILA = 'NA_FILA', 'Na fila'
+        PROCESSANDO = 'PROCESSANDO', 'Processando'
+        GERADO = 'GERADO', 'Gerado'
+        ERRO = 'ERRO', 'Erro'
+    
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     colaborador = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -108,11 +131,38 @@ class TermoResponsabilidade(models.Model):
         null=True,
         blank=True
     )
+    status_pdf = models.CharField(
+        'Status do PDF',
+        max_length=20,
+        choices=StatusPDF.choices,
+        default=StatusPDF.NAO_GERADO
+    )
+    # Preenchido enquanto algum processo gera o PDF (trava de geração, ver documents.tasks)
+    geracao_pdf_iniciada_em = models.DateTimeField('Geração do PDF iniciada em', null=True, blank=True)
+    # SHA-256 do arquivo_pdf registrado na geração (ou na primeira auditoria)
+    digest_pdf = models.CharField('Digest do PDF', max_length=64, blank=True)
+    digest_pdf_verificado_em = models.DateTimeField('PDF verificado em', null=True, blank=True)
     observacoes = models.TextField('Observações', blank=True)
+    # Entra na chave do cache dos fragmentos da página do termo; UPDATEs em
+    # lote que alteram o que a página exibe precisam atualizá-la também
+    data_modificacao = models.DateTimeField('Última Modificação', auto_now=True)
     
     class Meta:
         verbose_name = 'Termo de Responsabilidade'
         verbose_name_plural = 'Termos de Responsabilidade'
+        indexes = [
+            # Contagens por status do colaborador (dashboard)
+            models.Index(fields=['colaborador', 'status'], name='termo_colab_status_idx'),
+            # Termos pendentes do colaborador: índice parcial, pequeno
+            models.Index(
+                fields=['colaborador', '-id'],
+                condition=models.Q(status='PENDENTE'),
+                name='termo_pendente_colab_idx',
+            ),
+            # Últimos termos enviados (dashboard) e listagem ordenada por status
+            models.Index(fields=['-data_envio'], name='termo_data_envio_idx'),
+            models.Index(fields=['status', '-id'], name='termo_status_id_idx'),
+        ]
         
     def __str__(self):
         return f"Termo {self.uuid} - {self.colaborador.get_full_name()}"
@@ -140,6 +190,42 @@ class ItemTermo(models.Model):
     class Meta:
         verbose_name = 'Item do Termo'
         verbose_name_plural = 'Itens do Termo'
+        indexes = [
+            # Itens de um termo já com o equipamento, sem consultar a tabela
+            models.Index(fields=['termo', 'equipamento'], name='item_termo_equip_idx'),
+        ]
         
     def __str__(self):
         return f"{self.equipamento} - {self.termo.colaborador.get_full_name()}"
+
+class TarefaPDF(models.Model):
+    """Tarefa da fila de geração de PDF processada pelo comando processar_fila_pdf."""
+
+    class Status(models.TextChoices):
+        PENDENTE = 'PENDENTE', 'Pendente'
+        PROCESSANDO = 'PROCESSANDO', 'Processando'
+        CONCLUIDA = 'CONCLUIDA', 'Concluída'
+        ERRO = 'ERRO', 'Erro'
+
+    termo = models.ForeignKey(
+        TermoResponsabilidade,
+        on_delete=models.CASCADE,
+        related_name='tarefas_pdf'
+    )
+    status = models.CharField('Status', max_length=20, choices=Status.choices, default=Status.PENDENTE)
+    tentativas = models.PositiveIntegerField('Tentativas', default=0)
+    max_tentativas = models.PositiveIntegerField('Máximo de Tentativas', default=3)
+    agendada_para = models.DateTimeField('Agendada para', default=timezone.now)
+    erro = models.TextField('Último Erro', blank=True)
+    data_criacao = models.DateTimeField('Data de Criação', auto_now_add=True)
+    data_conclusao = models.DateTimeField('Data de Conclusão', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Tarefa de PDF'
+        verbose_name_plural = 'Tarefas de PDF'
+        indexes = [
+            models.Index(fields=['status', 'agendada_para'], name='tarefa_pdf_fila_idx'),
+        ]
+
+    def __str__(self):
+        return f"PDF do termo {self.termo.uuid} ({self.get_status_display()})"
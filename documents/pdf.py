@@ -0,0 +1,217 @@
+"""
+Geração do PDF dos termos de responsabilidade a partir do modelo Word ou,
+para os modelos sem arquivo Word, do conteúdo HTML (``documents.html_pdf``).
+"""
+import importlib.util
+import logging
+import os
+import tempfile
+
+from django.utils import timezone
+
+from core.metricas import medir
+
+from .auditoria import IP_NAO_IDENTIFICADO, digest_arquivo
+from .html_pdf import renderizar_pdf_html
+from .models import ItemTermo
+from .rendering import RenderizacaoError, converter_docx_para_pdf
+from .signing import assinar_pdf_termo, assinatura_habilitada
+from .template_cache import obter_modelo_compilado
+
+logger = logging.getLogger(__name__)
+
+# O python-docx só é importado ao compilar um modelo (template_cache)
+DOCX_AVAILABLE = importlib.util.find_spec('docx') is not None
+if not DOCX_AVAILABLE:
+    logger.warning("Biblioteca python-docx não disponível. Conversão de Word para PDF não será suportada.")
+
+
+def extrair_user_agent(termo):
+    """Extrai o dispositivo da assinatura gravado nas observações do termo."""
+    if not termo.observacoes or 'Dispositivo:' not in termo.observacoes:
+        return None
+    for linha in termo.observacoes.split('\n'):
+        if linha.strip().startswith('Dispositivo:'):
+            return linha.replace('Dispositivo:', '').strip()
+    return None
+
+
+def formatar_moeda(valor):
+    return f"R$ {valor:.2f}".replace('.', ',')
+
+
+def montar_contexto(termo, user_agent=None, itens=None):
+    """
+    Monta o contexto de substituição dos placeholders a partir do termo.
+
+    As chaves são os nomes dos placeholders sem ``${}``. ``EQUIPAMENTOS`` é a
+    lista usada pelas linhas repetidas (``${EQUIP_DESCRICAO}``...); as chaves
+    numeradas ``EQUIP_n_*`` continuam disponíveis para modelos antigos.
+    ``itens`` evita a consulta dos itens quando já foram carregados (em lote).
+    """
+    user = termo.colaborador
+    nome_completo = f"{user.first_name} {user.last_name}"
+
+    # Obter o endereço completo
+    endereco_completo = f"{user.endereco}, {user.numero}"
+    if user.complemento:
+        endereco_completo += f", {user.complemento}"
+    endereco_completo += f", {user.bairro}, {user.cidade}/{user.estado}, CEP: {user.cep}"
+
+    contexto = {
+        "NOME": nome_completo,
+        "CPF": user.cpf or "",
+        "RG": user.rg or "",
+        "ENDERECO": user.endereco or "",
+        "NUMERO": user.numero or "",
+        "COMPLEMENTO": user.complemento or "",
+        "BAIRRO": user.bairro or "",
+        "CIDADE": user.cidade or "",
+        "ESTADO": user.estado or "",
+        "CEP": user.cep or "",
+        "ENDERECO_COMPLETO": endereco_completo,
+        "DATA_ASSINATURA": termo.data_assinatura.strftime("%d/%m/%Y") if termo.data_assinatura else "",
+        "IP_ASSINATURA": termo.ip_assinatura or (IP_NAO_IDENTIFICADO if termo.data_assinatura else ""),
+        "DISPOSITIVO_ASSINATURA": user_agent or "",
+        "HASH_ASSINATURA": termo.hash_assinatura or "",
+    }
+
+    # Informações dos equipamentos para a tabela
+    itens_termo = itens if itens is not None else (
+        ItemTermo.objects.filter(termo=termo).select_related('equipamento').order_by('pk')
+    )
+    equipamentos = []
+    total_valor = 0
+    for i, item in enumerate(itens_termo, start=1):
+        equip = item.equipamento
+        dados = {
+            "ITEM": i,
+            "DESCRICAO": f"{equip.tipo} {equip.marca} {equip.modelo} - {equip.numero_serie}",
+            "VALOR": formatar_moeda(equip.valor),
+            "TIPO": equip.get_tipo_display(),
+            "MARCA": equip.marca,
+            "MODELO": equip.modelo,
+            "NUMERO_SERIE": equip.numero_serie,
+            "ESTADO": item.estado_entrega,
+        }
+        equipamentos.append(dados)
+        contexto[f"EQUIP_{i}_DESCRICAO"] = dados["DESCRICAO"]
+        contexto[f"EQUIP_{i}_VALOR"] = dados["VALOR"]
+        total_valor += equip.valor
+
+    contexto["EQUIPAMENTOS"] = equipamentos
+    contexto["VALOR_TOTAL"] = formatar_moeda(total_valor)
+    return contexto
+
+
+def renderizar_pdf(modelo, contexto, pdf_path):
+    """Preenche o modelo (Word ou, na falta dele, o conteúdo HTML) com o contexto e gera o PDF em ``pdf_path``."""
+    # Verificar se existe um arquivo Word associado ao modelo e se as bibliotecas necessárias estão disponíveis
+    if not (DOCX_AVAILABLE and modelo.arquivo_word):
+        if (modelo.conteudo or '').strip():
+            logger.info(f"Gerando PDF a partir do conteúdo HTML do modelo {modelo.pk}")
+            with medir('pdf_html'):
+                return renderizar_pdf_html(modelo, contexto, pdf_path)
+        # Sem arquivo Word nem conteúdo, não há o que gerar
+        logger.error("O modelo de documento não possui um arquivo Word associado nem conteúdo. Não é possível gerar o termo.")
+        raise Exception("O modelo de documento não possui um arquivo Word associado nem conteúdo. Não é possível gerar o termo.")
+
+    logger.info(f"Gerando PDF a partir do arquivo Word: {modelo.arquivo_word.path}")
+
+    # Verificar se o arquivo Word existe
+    if not os.path.exists(modelo.arquivo_word.path):
+        logger.error(f"Arquivo Word não encontrado: {modelo.arquivo_word.path}")
+        raise Exception(f"Arquivo do modelo não encontrado: {modelo.arquivo_word.path}")
+
+    temp_docx_path = None
+    try:
+        # Substituir placeholders no modelo Word já compilado (parseado uma vez por versão)
+        with medir('pdf_preenchimento_docx'):
+            compilado = obter_modelo_compilado(modelo)
+            conteudo_docx = compilado.renderizar(contexto)
+
+        with tempfile.NamedTemporaryFile(suffix='.docx', delete=False) as temp_docx:
+            temp_docx_path = temp_docx.name
+            temp_docx.write(conteudo_docx)
+
+        # Converter o arquivo docx para PDF com o backend configurado
+        with medir('pdf_conversao'):
+            converter_docx_para_pdf(temp_docx_path, pdf_path)
+        return pdf_path
+
+    except Exception as e:
+        logger.error(f"Erro ao converter Word para PDF: {str(e)}")
+        raise RenderizacaoError(f"Erro ao converter Word para PDF: {e}") from e
+
+    finally:
+        # Limpar o arquivo temporário
+        if temp_docx_path and os.path.exists(temp_docx_path):
+            os.unlink(temp_docx_path)
+
+
+def caminho_pdf_termo(termo):
+    """Nome no storage e caminho absoluto do PDF final do termo."""
+    campo = termo._meta.get_field('arquivo_pdf')
+    nome = campo.generate_filename(termo, f"termo_{termo.uuid}.pdf")
+    return nome, campo.storage.path(nome)
+
+
+def gravar_pdf_termo(termo, contexto):
+    """
+    Renderiza, assina e grava o PDF do termo no seu caminho final.
+
+    O PDF é gerado em um arquivo temporário no mesmo diretório e só então
+    substitui o anterior com ``os.replace``, então quem lê o arquivo nunca vê
+    um PDF pela metade. Não grava nada no banco (pode rodar em processos
+    worker); retorna ``(nome, digest)`` para ``registrar_pdf_termo``.
+    """
+    nome, pdf_path = caminho_pdf_termo(termo)
+    os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+    descritor, temp_path = tempfile.mkstemp(suffix='.pdf.tmp', dir=os.path.dirname(pdf_path))
+    os.close(descritor)
+    try:
+        renderizar_pdf(termo.modelo, contexto, temp_path)
+        if assinatura_habilitada():
+            with medir('pdf_assinatura'):
+                assinar_pdf_termo(termo, temp_path)
+        # Referência para as auditorias de integridade (auditar_termos)
+        digest = digest_arquivo(temp_path)
+        os.replace(temp_path, pdf_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return nome, digest
+
+
+def registrar_pdf_termo(termo, nome, digest):
+    termo.arquivo_pdf.name = nome
+    termo.digest_pdf = digest
+    termo.digest_pdf_verificado_em = timezone.now()
+    termo.save(update_fields=['arquivo_pdf', 'digest_pdf', 'digest_pdf_verificado_em'])
+
+
+def gerar_pdf_termo(termo, custom_path=None):
+    """
+    Gera o PDF do termo de responsabilidade assinado
+
+    Args:
+        termo: Objeto TermoResponsabilidade
+        custom_path: Caminho personalizado para o arquivo PDF (opcional)
+    """
+    logger.info(f"Iniciando geração de PDF para termo {termo.uuid}")
+
+    # Verificar o modelo
+    if not termo.modelo:
+        logger.error(f"Termo {termo.uuid} não possui modelo associado")
+        raise Exception("O termo não possui um modelo de documento associado.")
+
+    contexto = montar_contexto(termo, extrair_user_agent(termo))
+
+    # Prévias (custom_path) não são assinadas nem registradas no termo
+    if custom_path:
+        return renderizar_pdf(termo.modelo, contexto, custom_path)
+
+    nome, digest = gravar_pdf_termo(termo, contexto)
+    registrar_pdf_termo(termo, nome, digest)
+    return termo.arquivo_pdf.path
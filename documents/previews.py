@@ -0,0 +1,100 @@
+"""
+Cache em disco das prévias em PDF dos termos.
+
+Cada prévia é gravada com o hash das entradas que a determinam (versão do
+modelo, dados do colaborador, itens do termo e a data exibida), então reabrir
+a prévia com as mesmas entradas serve o arquivo já gerado. O diretório é
+limitado por tamanho, descartando primeiro as prévias usadas há mais tempo.
+"""
+import hashlib
+import json
+import logging
+import os
+
+from django.conf import settings
+from django.utils import timezone
+
+from .pdf import montar_contexto, renderizar_pdf
+
+logger = logging.getLogger(__name__)
+
+IP_PREVIA = "Prévia - Não assinado"
+HASH_PREVIA = "Prévia - Este documento ainda não foi assinado"
+
+
+def diretorio_previas():
+    return os.path.join(settings.MEDIA_ROOT, 'documentos', 'previews')
+
+
+def montar_contexto_previa(termo):
+    """Contexto do termo como se fosse assinado agora, sem alterar o objeto."""
+    contexto = montar_contexto(termo)
+    contexto.update({
+        "DATA_ASSINATURA": timezone.localdate().strftime("%d/%m/%Y"),
+        "IP_ASSINATURA": IP_PREVIA,
+        "HASH_ASSINATURA": HASH_PREVIA,
+    })
+    return contexto
+
+
+def chave_previa(modelo, contexto):
+    """Hash das entradas que determinam o conteúdo da prévia."""
+    entradas = {
+        'modelo': [modelo.pk, modelo.versao, modelo.data_modificacao.isoformat(), modelo.arquivo_word.name],
+        'contexto': contexto,
+    }
+    serializado = json.dumps(entradas, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(serializado.encode()).hexdigest()
+
+
+def caminho_previa(chave):
+    return os.path.join(diretorio_previas(), f"preview_{chave}.pdf")
+
+
+def obter_previa(termo, contexto, chave):
+    """Retorna o caminho da prévia, gerando-a apenas se ainda não estiver em cache."""
+    caminho = caminho_previa(chave)
+    if os.path.exists(caminho):
+        # Atualiza o mtime, usado como "último acesso" na remoção das prévias antigas
+        os.utime(caminho)
+        return caminho
+
+    os.makedirs(diretorio_previas(), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        renderizar_pdf(termo.modelo, contexto, temporario)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.unlink(temporario)
+
+    logger.info(f"Prévia do termo {termo.uuid} gerada: {caminho}")
+    limpar_previas()
+    return caminho
+
+
+def limpar_previas(limite_bytes=None):
+    """Remove as prévias menos usadas até o diretório caber no limite configurado."""
+    if limite_bytes is None:
+        limite_bytes = getattr(settings, 'DOCUMENTS_PREVIEW_CACHE_MAX_BYTES', 200 * 1024 * 1024)
+
+    try:
+        entradas = [e for e in os.scandir(diretorio_previas()) if e.is_file() and e.name.endswith('.pdf')]
+    except FileNotFoundError:
+        return 0
+
+    arquivos = sorted((e.stat().st_mtime, e.stat().st_size, e.path) for e in entradas)
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    removidos = 0
+    for _, tamanho, caminho in arquivos:
+        if total <= limite_bytes:
+            break
+        try:
+            os.unlink(caminho)
+        except FileNotFoundError:
+            pass
+        total -= tamanho
+        removidos += 1
+    if removidos:
+        logger.info(f"{removidos} prévia(s) antiga(s) removida(s) do cache")
+    return removidos
@@ -0,0 +1,171 @@
+"""
+Regeneração em lote dos PDFs dos termos assinados.
+
+Usada depois de uma correção no texto de um modelo ou para gerar os PDFs que
+estão faltando, sem passar termo a termo pela fila ou pelas views. Os termos
+são lidos em ordem de modelo e divididos em lotes de um único modelo: cada
+processo worker compila o modelo Word uma vez (``template_cache``) e o
+reaproveita em todos os termos que o usam.
+
+O processo principal monta os contextos (uma consulta por lote, com os itens
+pré-carregados) e grava os resultados no banco; os workers só renderizam,
+assinam e gravam os arquivos, sempre de forma atômica (``gravar_pdf_termo``):
+se a geração falhar, o PDF anterior continua intacto.
+
+Cada lote só é enviado aos workers depois que o processo principal obtém a
+trava de geração dos seus termos (``tasks.reservar_geracao_em_lote``), a mesma
+usada pela fila e pelos downloads sob demanda: termos que já estão sendo
+gerados por outro processo ficam de fora e são informados em ``ocupados``.
+"""
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import django
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import ItemTermo, TarefaPDF, TermoResponsabilidade
+from .pdf import extrair_user_agent, gravar_pdf_termo, montar_contexto
+from .tasks import liberar_geracao, reservar_geracao_em_lote
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE = 20
+
+
+@dataclass
+class ResultadoRegeneracao:
+    gerados: int = 0
+    erros: list = field(default_factory=list)  # (uuid, mensagem)
+    ocupados: list = field(default_factory=list)  # uuids em geração por outro processo
+    duracao: float = 0.0
+
+    @property
+    def taxa(self):
+        return self.gerados / self.duracao if self.duracao else 0.0
+
+
+def _gerar_lote(lote):
+    """Gera os PDFs de um lote de ``(termo, contexto)`` sem acessar o banco de dados."""
+    resultados = []
+    for termo, contexto in lote:
+        try:
+            nome, digest = gravar_pdf_termo(termo, contexto)
+        except Exception as e:
+            resultados.append((termo.pk, None, None, str(e)))
+        else:
+            resultados.append((termo.pk, nome, digest, None))
+    return resultados
+
+
+def _lotes(queryset, tamanho_lote):
+    """Lotes de ``(termo, contexto)`` com termos de um único modelo cada."""
+    termos = queryset.select_related('colaborador', 'modelo').prefetch_related(
+        Prefetch('itemtermo_set', queryset=ItemTermo.objects.select_related('equipamento').order_by('pk'))
+    ).order_by('modelo_id', 'pk').iterator(chunk_size=tamanho_lote * 10)
+
+    lote = []
+    for termo in termos:
+        if lote and (len(lote) >= tamanho_lote or lote[0][0].modelo_id != termo.modelo_id):
+            yield lote
+            lote = []
+        contexto = montar_contexto(termo, extrair_user_agent(termo), itens=termo.itemtermo_set.all())
+        # Os itens já estão no contexto; não precisam ir para o worker
+        termo._prefetched_objects_cache = {}
+        lote.append((termo, contexto))
+    if lote:
+        yield lote
+
+
+def _reservar(lote, resultado):
+    """Retorna ``(lote, reserva)`` só com os termos cuja trava de geração foi obtida."""
+    reservados, reserva = reservar_geracao_em_lote([termo.pk for termo, _ in lote])
+    for termo, _ in lote:
+        if termo.pk not in reservados:
+            logger.warning(f"PDF do termo {termo.uuid} já está sendo gerado por outro processo; ignorado")
+            resultado.ocupados.append(termo.uuid)
+    return [item for item in lote if item[0].pk in reservados], reserva
+
+
+def _gravar(lote, resultados, resultado, reserva):
+    uuids = {termo.pk: termo.uuid for termo, _ in lote}
+    agora = timezone.now()
+    gerados = []
+    for pk, nome, digest, erro in resultados:
+        if erro is not None:
+            logger.error(f"Erro ao regenerar o PDF do termo {uuids[pk]}: {erro}")
+            resultado.erros.append((uuids[pk], erro))
+            continue
+        gerados.append(TermoResponsabilidade(
+            pk=pk, arquivo_pdf=nome, digest_pdf=digest, digest_pdf_verificado_em=agora,
+            status_pdf=TermoResponsabilidade.StatusPDF.GERADO,
+        ))
+    # As tarefas pendentes desses termos na fila ficam concluídas junto com
+    # o PDF, para que um worker não gere o mesmo arquivo de novo; as travas
+    # são liberadas na mesma transação
+    with transaction.atomic():
+        if gerados:
+            TermoResponsabilidade.objects.bulk_update(
+                gerados, ['arquivo_pdf', 'digest_pdf', 'digest_pdf_verificado_em', 'status_pdf']
+            )
+            TarefaPDF.objects.filter(
+                termo_id__in=[termo.pk for termo in gerados], status=TarefaPDF.Status.PENDENTE,
+            ).update(status=TarefaPDF.Status.CONCLUIDA, data_conclusao=agora)
+        liberar_geracao(list(uuids), reserva)
+    resultado.gerados += len(gerados)
+
+
+def regenerar_pdfs(queryset, processos=1, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    """
+    Regenera os PDFs dos termos do queryset e retorna um ``ResultadoRegeneracao``.
+
+    Com ``processos`` maior que 1 os lotes são gerados por um
+    ``ProcessPoolExecutor``, com no máximo dois lotes por processo em
+    andamento. ``progresso`` é chamado com o resultado parcial a cada lote.
+    """
+    inicio = time.perf_counter()
+    resultado = ResultadoRegeneracao()
+
+    def concluir(lote, reserva, resultados):
+        _gravar(lote, resultados, resultado, reserva)
+        resultado.duracao = time.perf_counter() - inicio
+        if progresso:
+            progresso(resultado)
+
+    lotes = (_reservar(lote, resultado) for lote in _lotes(queryset, tamanho_lote))
+    if processos <= 1:
+        for lote, reserva in lotes:
+            if lote:
+                concluir(lote, reserva, _gerar_lote(lote))
+    else:
+        # spawn: os workers não herdam conexões com o banco nem o LibreOffice
+        # do processo principal; cada um inicia o seu na primeira conversão
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(processos, mp_context=contexto, initializer=django.setup) as executor:
+            pendentes = deque()
+            for lote, reserva in lotes:
+                if not lote:
+                    continue
+                pendentes.append((lote, reserva, executor.submit(_gerar_lote, lote)))
+                if len(pendentes) >= processos * 2:
+                    concluir(*_aguardar(pendentes.popleft()))
+            while pendentes:
+                concluir(*_aguardar(pendentes.popleft()))
+
+    resultado.duracao = time.perf_counter() - inicio
+    logger.info(
+        f"Regeneração de PDFs: {resultado.gerados} gerado(s), {len(resultado.erros)} erro(s), "
+        f"{len(resultado.ocupados)} em geração por outro processo, "
+        f"em {resultado.duracao:.1f}s ({resultado.taxa:.1f}/s)"
+    )
+    return resultado
+
+
+def _aguardar(pendente):
+    lote, reserva, futuro = pendente
+    return lote, reserva, futuro.result()
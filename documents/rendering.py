@@ -0,0 +1,270 @@
+"""
+Backends de renderização de documentos Word (.docx) para PDF.
+
+O backend é escolhido por ``settings.DOCUMENTS_PDF_BACKEND`` (nome registrado
+em ``BACKENDS`` ou caminho pontuado para uma classe) e instanciado uma única
+vez por processo, na primeira conversão.
+"""
+import atexit
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def _porta_livre(host):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class RenderizacaoError(Exception):
+    """Falha ao converter um documento para PDF."""
+
+
+class BaseBackend:
+    """Interface comum dos backends de conversão DOCX -> PDF."""
+
+    nome = None
+
+    def converter(self, docx_path, pdf_path):
+        raise NotImplementedError
+
+    def encerrar(self):
+        """Libera recursos mantidos pelo backend (processos, conexões)."""
+
+
+class LibreOfficeBackend(BaseBackend):
+    """
+    Converte com um LibreOffice headless de longa duração.
+
+    Um único processo ``soffice`` é iniciado na primeira conversão e mantido
+    vivo para as seguintes. Quando o módulo ``uno`` está disponível, os
+    documentos são convertidos pela conexão UNO com esse processo; caso
+    contrário, usa ``soffice --convert-to`` reaproveitando o mesmo perfil de
+    usuário, o que evita recriar o perfil a cada termo.
+    """
+
+    nome = 'libreoffice'
+
+    def __init__(self, binario=None, host=None, porta=None, timeout=None, perfil_dir=None):
+        config = getattr(settings, 'DOCUMENTS_LIBREOFFICE', {})
+        self.binario = binario or config.get('BINARY') or shutil.which('soffice') or 'soffice'
+        self.host = host or config.get('HOST', '127.0.0.1')
+        # Porta 0 escolhe uma porta livre, para que cada processo worker
+        # tenha seu próprio LibreOffice sem conflito.
+        self.porta = int(porta or config.get('PORT', 0)) or _porta_livre(self.host)
+        self.timeout = int(timeout or config.get('TIMEOUT', 120))
+        self.perfil_dir = perfil_dir or config.get('PROFILE_DIR') or os.path.join(
+            tempfile.gettempdir(), f'portal_assinatura_lo_{os.getpid()}'
+        )
+        self._lock = threading.Lock()
+        self._processo = None
+        self._desktop = None
+
+    @property
+    def _perfil_url(self):
+        return Path(self.perfil_dir).resolve().as_uri()
+
+    def converter(self, docx_path, pdf_path):
+        # O LibreOffice não é seguro para conversões simultâneas no mesmo
+        # processo/perfil, então as chamadas são serializadas por backend.
+        with self._lock:
+            try:
+                import uno  # noqa: F401
+            except ImportError:
+                return self._converter_cli(docx_path, pdf_path)
+            try:
+                return self._converter_uno(docx_path, pdf_path)
+            except Exception as e:
+                # A conexão pode ter caído (processo reiniciado ou morto);
+                # tenta uma vez com um processo novo antes de desistir.
+                logger.warning(f"Falha na conversão via UNO, reiniciando LibreOffice: {e}")
+                self._encerrar_processo()
+                return self._converter_uno(docx_path, pdf_path)
+
+    def _converter_cli(self, docx_path, pdf_path):
+        saida_dir = tempfile.mkdtemp(prefix='lo_out_')
+        try:
+            comando = [
+                self.binario,
+                f'-env:UserInstallation={self._perfil_url}',
+                '--headless', '--invisible', '--nologo', '--norestore', '--nodefault',
+                '--convert-to', 'pdf',
+                '--outdir', saida_dir,
+                str(docx_path),
+            ]
+            try:
+                subprocess.run(comando, check=True, capture_output=True, timeout=self.timeout)
+            except (OSError, subprocess.SubprocessError) as e:
+                raise RenderizacaoError(f"Erro ao executar o LibreOffice: {e}") from e
+
+            gerado = os.path.join(saida_dir, Path(docx_path).stem + '.pdf')
+            if not os.path.exists(gerado):
+                raise RenderizacaoError("O LibreOffice não gerou o arquivo PDF.")
+            shutil.move(gerado, pdf_path)
+            return pdf_path
+        finally:
+            shutil.rmtree(saida_dir, ignore_errors=True)
+
+    def _iniciar_processo(self):
+        if self._processo is not None and self._processo.poll() is None:
+            return
+        comando = [
+            self.binario,
+            f'-env:UserInstallation={self._perfil_url}',
+            '--headless', '--invisible', '--nologo', '--norestore', '--nodefault',
+            f'--accept=socket,host={self.host},port={self.porta};urp;StarOffice.ComponentContext',
+        ]
+        logger.info(f"Iniciando LibreOffice headless em {self.host}:{self.porta}")
+        try:
+            self._processo = subprocess.Popen(
+                comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        except OSError as e:
+            raise RenderizacaoError(f"Não foi possível iniciar o LibreOffice: {e}") from e
+        self._desktop = None
+
+    def _obter_desktop(self):
+        if self._desktop is not None:
+            return self._desktop
+
+        import uno
+
+        self._iniciar_processo()
+        contexto_local = uno.getComponentContext()
+        resolver = contexto_local.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', contexto_local
+        )
+        url = f'uno:socket,host={self.host},port={self.porta};urp;StarOffice.ComponentContext'
+        limite = time.monotonic() + self.timeout
+        while True:
+            try:
+                contexto = resolver.resolve(url)
+                break
+            except Exception:
+                if time.monotonic() > limite:
+                    raise RenderizacaoError("Tempo esgotado aguardando o LibreOffice.")
+                time.sleep(0.25)
+        self._desktop = contexto.ServiceManager.createInstanceWithContext(
+            'com.sun.star.frame.Desktop', contexto
+        )
+        return self._desktop
+
+    def _converter_uno(self, docx_path, pdf_path):
+        import uno
+        from com.sun.star.beans import PropertyValue
+
+        def propriedade(nome, valor):
+            prop = PropertyValue()
+            prop.Name = nome
+            prop.Value = valor
+            return prop
+
+        desktop = self._obter_desktop()
+        documento = desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(docx_path)), '_blank', 0,
+            (propriedade('Hidden', True), propriedade('ReadOnly', True)),
+        )
+        if documento is None:
+            raise RenderizacaoError(f"O LibreOffice não conseguiu abrir {docx_path}")
+        try:
+            documento.storeToURL(
+                uno.systemPathToFileUrl(os.path.abspath(pdf_path)),
+                (propriedade('FilterName', 'writer_pdf_Export'),),
+            )
+        finally:
+            documento.close(True)
+        return pdf_path
+
+    def _encerrar_processo(self):
+        self._desktop = None
+        if self._processo is not None and self._processo.poll() is None:
+            self._processo.terminate()
+            try:
+                self._processo.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._processo.kill()
+        self._processo = None
+
+    def encerrar(self):
+        with self._lock:
+            self._encerrar_processo()
+
+
+class Docx2PdfBackend(BaseBackend):
+    """
+    Converte usando o Microsoft Word via docx2pdf (somente Windows/macOS).
+
+    Mantido para instalações antigas em Windows; não é usado em Linux.
+    """
+
+    nome = 'docx2pdf'
+
+    def converter(self, docx_path, pdf_path):
+        try:
+            from docx2pdf import convert as docx2pdf_convert
+        except ImportError as e:
+            raise RenderizacaoError("A biblioteca docx2pdf não está disponível.") from e
+
+        try:
+            import pythoncom
+        except ImportError:
+            pythoncom = None
+
+        if pythoncom is not None:
+            pythoncom.CoInitialize()
+        try:
+            docx2pdf_convert(str(docx_path), str(pdf_path))
+        finally:
+            if pythoncom is not None:
+                pythoncom.CoUninitialize()
+        return pdf_path
+
+
+BACKENDS = {
+    LibreOfficeBackend.nome: LibreOfficeBackend,
+    Docx2PdfBackend.nome: Docx2PdfBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend_padrao():
+    return Docx2PdfBackend.nome if sys.platform == 'win32' else LibreOfficeBackend.nome
+
+
+def obter_backend():
+    """Retorna a instância do backend configurado, criando-a no primeiro uso."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                nome = getattr(settings, 'DOCUMENTS_PDF_BACKEND', None) or backend_padrao()
+                classe = BACKENDS.get(nome) or import_string(nome)
+                _backend = classe()
+                logger.info(f"Backend de renderização de PDF: {nome}")
+    return _backend
+
+
+def converter_docx_para_pdf(docx_path, pdf_path):
+    """Converte ``docx_path`` em ``pdf_path`` com o backend configurado."""
+    return obter_backend().converter(docx_path, pdf_path)
+
+
+@atexit.register
+def _encerrar_backend():
+    if _backend is not None:
+        _backend.encerrar()
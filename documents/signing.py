@@ -0,0 +1,242 @@
+"""
+Assinatura digital (PAdES) dos PDFs dos termos com pyHanko.
+
+A chave, o certificado e a cadeia configurados em ``DOCUMENTS_PDF_SIGNING``
+são carregados uma única vez por processo, na primeira assinatura, assim como
+o contexto de validação usado na verificação. Cada assinatura só gasta o
+hash do documento e a operação com a chave privada.
+
+Sem ``KEY`` e ``CERT`` configurados, os PDFs continuam sendo gerados sem
+assinatura embutida.
+"""
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+CAMPO_ASSINATURA = 'AssinaturaTermo'
+
+
+class AssinaturaPDFError(Exception):
+    """Falha ao assinar ou verificar um PDF."""
+
+
+def _config(chave, padrao=None):
+    return getattr(settings, 'DOCUMENTS_PDF_SIGNING', {}).get(chave) or padrao
+
+
+def assinatura_habilitada():
+    return bool(_config('KEY') and _config('CERT'))
+
+
+@lru_cache(maxsize=None)
+def _classe_assinante():
+    """Subclasse do ``SimpleSigner`` que mantém a chave privada desserializada."""
+    from cryptography.hazmat.primitives.asymmetric.ec import ECDSA
+    from cryptography.hazmat.primitives.asymmetric.padding import PKCS1v15
+    from cryptography.hazmat.primitives.serialization import load_der_private_key
+    from pyhanko.sign import signers
+    from pyhanko.sign.general import get_pyca_cryptography_hash
+
+    class AssinanteReutilizavel(signers.SimpleSigner):
+        # O SimpleSigner desserializa a chave a cada assinatura (e de novo na
+        # estimativa de tamanho), o que custa mais que a própria operação RSA.
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.chave = load_der_private_key(self.signing_key.dump(), password=None)
+            self.bytes_reservados = None
+
+        def sign_raw(self, data, digest_algorithm):
+            mecanismo = self.get_signature_mechanism_for_digest(digest_algorithm).signature_algo
+            algoritmo = get_pyca_cryptography_hash(digest_algorithm)
+            if mecanismo == 'rsassa_pkcs1v15':
+                return self.chave.sign(data, PKCS1v15(), algoritmo)
+            if mecanismo == 'ecdsa':
+                return self.chave.sign(data, ECDSA(algoritmo))
+            return super().sign_raw(data, digest_algorithm)
+
+    return AssinanteReutilizavel
+
+
+def _estimar_bytes_reservados(assinante):
+    """
+    Espaço reservado no PDF para a assinatura CMS.
+
+    O tamanho só depende da chave e dos certificados, então a assinatura de
+    teste que o pyHanko faria a cada documento é feita uma vez aqui, com a
+    mesma margem de 50% que ele aplica.
+    """
+    import asyncio
+    import hashlib
+
+    teste = asyncio.run(assinante.async_sign(
+        hashlib.sha256().digest(), 'sha256', dry_run=True, use_pades=True,
+    ))
+    tamanho = len(teste.dump()) * 2  # gravado em hexadecimal
+    return tamanho + 2 * (tamanho // 4)
+
+
+@lru_cache(maxsize=1)
+def obter_assinante():
+    """Carrega a chave, o certificado e a cadeia configurados (uma vez por processo)."""
+    from pyhanko.sign import signers
+
+    if not assinatura_habilitada():
+        raise AssinaturaPDFError("DOCUMENTS_PDF_SIGNING não define KEY e CERT.")
+    senha = _config('PASSPHRASE')
+    carregado = signers.SimpleSigner.load(
+        _config('KEY'), _config('CERT'),
+        ca_chain_files=tuple(_config('CHAIN', ())),
+        key_passphrase=senha.encode() if isinstance(senha, str) else senha,
+    )
+    if carregado is None:
+        raise AssinaturaPDFError("Não foi possível carregar a chave ou o certificado de assinatura.")
+    assinante = _classe_assinante()(
+        signing_cert=carregado.signing_cert,
+        signing_key=carregado.signing_key,
+        cert_registry=carregado.cert_registry,
+    )
+    assinante.bytes_reservados = _estimar_bytes_reservados(assinante)
+    logger.info(f"Assinante de PDF carregado: {assinante.signing_cert.subject.human_friendly}")
+    return assinante
+
+
+@lru_cache(maxsize=1)
+def obter_contexto_validacao():
+    """
+    Contexto de validação com as raízes confiáveis (``TRUST_ROOTS``).
+
+    Sem raízes configuradas, confia no certificado e na cadeia do próprio
+    assinante. Nenhuma busca de revogação é feita pela rede.
+    """
+    from pyhanko.keys import load_certs_from_pemder
+    from pyhanko_certvalidator import ValidationContext
+
+    arquivos = _config('TRUST_ROOTS')
+    if arquivos:
+        raizes = list(load_certs_from_pemder(arquivos))
+    else:
+        assinante = obter_assinante()
+        raizes = [assinante.signing_cert, *assinante.cert_registry]
+    return ValidationContext(trust_roots=raizes, allow_fetching=False)
+
+
+@receiver(setting_changed)
+def _limpar_cache(setting, **kwargs):
+    if setting == 'DOCUMENTS_PDF_SIGNING':
+        obter_assinante.cache_clear()
+        obter_contexto_validacao.cache_clear()
+
+
+def assinar_pdf(caminho, motivo=None, nome=None):
+    """
+    Embute uma assinatura PAdES no PDF em ``caminho``.
+
+    A assinatura é acrescentada em uma atualização incremental gravada em um
+    arquivo temporário no mesmo diretório, que substitui o original só no final.
+    """
+    from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
+    from pyhanko.sign import fields, signers
+
+    metadados = signers.PdfSignatureMetadata(
+        field_name=CAMPO_ASSINATURA,
+        md_algorithm='sha256',
+        subfilter=fields.SigSeedSubFilter.PADES,
+        reason=motivo,
+        name=nome,
+        location=_config('LOCATION'),
+    )
+    assinante = obter_assinante()
+    assinador = signers.PdfSigner(metadados, signer=assinante)
+
+    descritor, temporario = tempfile.mkstemp(suffix='.pdf', dir=os.path.dirname(os.path.abspath(caminho)))
+    try:
+        with open(caminho, 'rb') as entrada, os.fdopen(descritor, 'wb') as saida:
+            assinador.sign_pdf(
+                IncrementalPdfFileWriter(entrada, strict=False),
+                bytes_reserved=assinante.bytes_reservados,
+                output=saida,
+            )
+        os.replace(temporario, caminho)
+    except Exception as e:
+        if os.path.exists(temporario):
+            os.unlink(temporario)
+        raise AssinaturaPDFError(f"Erro ao assinar o PDF {caminho}: {e}") from e
+    return caminho
+
+
+def assinar_pdf_termo(termo, caminho):
+    """Assina o PDF do termo, registrando no motivo o hash da assinatura eletrônica."""
+    nome = termo.colaborador.get_full_name() or termo.colaborador.username
+    motivo = f"Termo de responsabilidade {termo.uuid} assinado por {nome}"
+    if termo.hash_assinatura:
+        motivo += f" (hash {termo.hash_assinatura})"
+    return assinar_pdf(caminho, motivo=motivo, nome=nome)
+
+
+def verificar_pdf(caminho):
+    """
+    Valida as assinaturas embutidas no PDF.
+
+    Retorna a lista de status do pyHanko (vazia se o PDF não tiver assinaturas).
+    """
+    from pyhanko.pdf_utils.reader import PdfFileReader
+    from pyhanko.sign.validation import validate_pdf_signature
+
+    with open(caminho, 'rb') as arquivo:
+        leitor = PdfFileReader(arquivo, strict=False)
+        return [
+            validate_pdf_signature(assinatura, obter_contexto_validacao())
+            for assinatura in leitor.embedded_signatures
+        ]
+
+
+def criar_certificado_autoassinado(diretorio, nome='Portal de Assinaturas', validade_dias=365):
+    """
+    Gera uma chave RSA e um certificado autoassinado em ``diretorio``.
+
+    Para desenvolvimento, testes e benchmark; em produção use um certificado
+    emitido pela AC da empresa. Retorna ``(chave, certificado)``.
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+
+    chave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    titular = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, nome)])
+    agora = datetime.now(dt_timezone.utc)
+    certificado = (
+        x509.CertificateBuilder()
+        .subject_name(titular)
+        .issuer_name(titular)
+        .public_key(chave.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(agora - timedelta(minutes=5))
+        .not_valid_after(agora + timedelta(days=validade_dias))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(x509.KeyUsage(
+            digital_signature=True, content_commitment=True, key_encipherment=False,
+            data_encipherment=False, key_agreement=False, key_cert_sign=True, crl_sign=True,
+            encipher_only=False, decipher_only=False,
+        ), critical=True)
+        .add_extension(x509.ExtendedKeyUsage([ExtendedKeyUsageOID.EMAIL_PROTECTION]), critical=False)
+        .sign(chave, hashes.SHA256())
+    )
+
+    caminho_chave = os.path.join(diretorio, 'assinatura.key.pem')
+    caminho_certificado = os.path.join(diretorio, 'assinatura.cert.pem')
+    with open(caminho_chave, 'wb') as arquivo:
+        arquivo.write(chave.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ))
+    with open(caminho_certificado, 'wb') as arquivo:
+        arquivo.write(certificado.public_bytes(serialization.Encoding.PEM))
+    return caminho_chave, caminho_certificado
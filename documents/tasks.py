@@ -0,0 +1,300 @@
+"""
+Fila de geração de PDF dos termos, persistida no banco de dados.
+
+A view de assinatura apenas enfileira uma ``TarefaPDF``; o comando
+``processar_fila_pdf`` reserva as tarefas pendentes e gera os PDFs fora do
+ciclo da requisição, com novas tentativas e espera exponencial em caso de erro.
+Com ``--varrer`` o comando também enfileira periodicamente os termos assinados
+que ainda estão sem PDF (``enfileirar_pdfs_faltantes``).
+
+Cada geração roda sob uma trava por termo (``trava_geracao``): se o worker e
+um download sob demanda pedirem o mesmo PDF, só um deles renderiza e o outro
+aguarda o resultado. A trava é um UPDATE condicional no próprio termo, então
+vale entre todos os processos e servidores que usam o mesmo banco.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import TarefaPDF, TermoResponsabilidade
+from .pdf import gerar_pdf_termo
+
+logger = logging.getLogger(__name__)
+
+
+def _config(chave, padrao):
+    return getattr(settings, 'DOCUMENTS_PDF_FILA', {}).get(chave, padrao)
+
+
+def _atualizar_status_pdf(termo, status):
+    termo.status_pdf = status
+    TermoResponsabilidade.objects.filter(pk=termo.pk).update(status_pdf=status)
+
+
+def _reservar_geracao(termo):
+    """
+    Marca o termo como em geração e retorna o instante da reserva, ou None se
+    outro processo já a detém.
+
+    Como em ``reservar_tarefa``, a reserva é um UPDATE condicional: de dois
+    processos simultâneos, só um altera a linha. Reservas com mais de
+    ``TEMPO_LIMITE`` segundos são de um processo que morreu e podem ser retomadas.
+    """
+    agora = timezone.now()
+    expirada = agora - timedelta(seconds=_config('TEMPO_LIMITE', 600))
+    reservada = TermoResponsabilidade.objects.filter(pk=termo.pk).filter(
+        Q(geracao_pdf_iniciada_em__isnull=True) | Q(geracao_pdf_iniciada_em__lt=expirada)
+    ).update(geracao_pdf_iniciada_em=agora, status_pdf=TermoResponsabilidade.StatusPDF.PROCESSANDO)
+    if not reservada:
+        return None
+    termo.geracao_pdf_iniciada_em = agora
+    termo.status_pdf = TermoResponsabilidade.StatusPDF.PROCESSANDO
+    return agora
+
+
+def reservar_geracao_em_lote(pks):
+    """
+    Reserva de uma vez a geração dos PDFs dos termos ``pks``.
+
+    Retorna ``(reservados, reserva)``: o conjunto dos pks cuja trava foi obtida
+    e o instante da reserva, que identifica as travas deste processo em
+    ``liberar_geracao``. Termos em geração por outro processo ficam de fora.
+    """
+    reserva = timezone.now()
+    expirada = reserva - timedelta(seconds=_config('TEMPO_LIMITE', 600))
+    TermoResponsabilidade.objects.filter(pk__in=pks).filter(
+        Q(geracao_pdf_iniciada_em__isnull=True) | Q(geracao_pdf_iniciada_em__lt=expirada)
+    ).update(geracao_pdf_iniciada_em=reserva)
+    reservados = set(TermoResponsabilidade.objects.filter(
+        pk__in=pks, geracao_pdf_iniciada_em=reserva,
+    ).values_list('pk', flat=True))
+    return reservados, reserva
+
+
+def liberar_geracao(pks, reserva):
+    """Libera as travas de geração obtidas na ``reserva`` (as retomadas por outro processo ficam)."""
+    TermoResponsabilidade.objects.filter(pk__in=pks, geracao_pdf_iniciada_em=reserva).update(
+        geracao_pdf_iniciada_em=None
+    )
+
+
+@contextmanager
+def trava_geracao(termo):
+    """
+    Tenta obter a trava de geração do PDF do termo; produz True se obteve.
+
+    Quem obtém a trava é responsável por gravar o status final do PDF. A trava
+    expira sozinha após ``TEMPO_LIMITE`` segundos, caso o processo que a obteve
+    morra no meio da geração.
+    """
+    reserva = _reservar_geracao(termo)
+    try:
+        yield reserva is not None
+    finally:
+        if reserva is not None:
+            liberar_geracao([termo.pk], reserva)
+            termo.geracao_pdf_iniciada_em = None
+
+
+def aguardar_geracao(termo, espera, intervalo=0.25):
+    """
+    Aguarda até ``espera`` segundos a geração em andamento do PDF do termo.
+
+    Retorna True se, ao final, o termo tiver um PDF gravado.
+    """
+    limite = time.monotonic() + espera
+    while True:
+        em_geracao, arquivo_pdf = TermoResponsabilidade.objects.values_list(
+            'geracao_pdf_iniciada_em', 'arquivo_pdf'
+        ).get(pk=termo.pk)
+        if em_geracao is None or time.monotonic() >= limite:
+            break
+        time.sleep(intervalo)
+    termo.arquivo_pdf = arquivo_pdf
+    return bool(termo.arquivo_pdf)
+
+
+def gerar_pdf_sob_demanda(termo, espera=None):
+    """
+    Gera o PDF de um termo que ainda não o tem, na própria requisição.
+
+    Só uma geração acontece por vez: se outra requisição ou um worker da fila
+    já estiver gerando o PDF, aguarda até ``espera`` segundos
+    (``DOCUMENTS_PDF_FILA['ESPERA_DOWNLOAD']``) pelo resultado. Retorna True se
+    o termo terminar com o PDF gravado; False indica que a geração continua
+    em andamento. Tarefas pendentes do termo na fila são concluídas.
+    """
+    if espera is None:
+        espera = _config('ESPERA_DOWNLOAD', 10)
+    with trava_geracao(termo) as obtida:
+        if obtida:
+            try:
+                gerar_pdf_termo(termo)
+            except Exception:
+                _atualizar_status_pdf(termo, TermoResponsabilidade.StatusPDF.ERRO)
+                raise
+            _atualizar_status_pdf(termo, TermoResponsabilidade.StatusPDF.GERADO)
+            TarefaPDF.objects.filter(termo=termo, status=TarefaPDF.Status.PENDENTE).update(
+                status=TarefaPDF.Status.CONCLUIDA, data_conclusao=timezone.now(),
+            )
+            logger.info(f"PDF do termo {termo.uuid} gerado sob demanda")
+            return True
+    return aguardar_geracao(termo, espera)
+
+
+def enfileirar_geracao_pdf(termo):
+    """
+    Enfileira a geração do PDF do termo e retorna a tarefa criada.
+
+    Se já houver uma tarefa em aberto para o termo, ela é reaproveitada. Com
+    ``DOCUMENTS_PDF_ASYNC = False`` a tarefa é executada imediatamente, na
+    própria requisição.
+    """
+    tarefa = TarefaPDF.objects.filter(
+        termo=termo,
+        status__in=[TarefaPDF.Status.PENDENTE, TarefaPDF.Status.PROCESSANDO],
+    ).first()
+    if tarefa is not None:
+        return tarefa
+
+    if not getattr(settings, 'DOCUMENTS_PDF_ASYNC', True):
+        tarefa = TarefaPDF.objects.create(
+            termo=termo,
+            status=TarefaPDF.Status.PROCESSANDO,
+            tentativas=1,
+            max_tentativas=_config('MAX_TENTATIVAS', 3),
+        )
+        executar_tarefa(tarefa)
+        return tarefa
+
+    tarefa = TarefaPDF.objects.create(termo=termo, max_tentativas=_config('MAX_TENTATIVAS', 3))
+    _atualizar_status_pdf(termo, TermoResponsabilidade.StatusPDF.NA_FILA)
+    logger.info(f"Geração de PDF do termo {termo.uuid} enfileirada (tarefa {tarefa.pk})")
+    return tarefa
+
+
+def enfileirar_pdfs_faltantes(incluir_erros=False):
+    """
+    Enfileira a geração dos termos assinados que estão sem PDF e sem tarefa em aberto.
+
+    Termos cuja geração já esgotou as tentativas (status ERRO) só entram com
+    ``incluir_erros``. Retorna quantas tarefas foram criadas.
+    """
+    termos = TermoResponsabilidade.objects.filter(
+        Q(arquivo_pdf='') | Q(arquivo_pdf__isnull=True),
+        status=TermoResponsabilidade.Status.ASSINADO,
+    ).exclude(
+        tarefas_pdf__status__in=[TarefaPDF.Status.PENDENTE, TarefaPDF.Status.PROCESSANDO],
+    )
+    if not incluir_erros:
+        termos = termos.exclude(status_pdf=TermoResponsabilidade.StatusPDF.ERRO)
+    pks = list(termos.values_list('pk', flat=True))
+    if not pks:
+        return 0
+    TarefaPDF.objects.bulk_create([
+        TarefaPDF(termo_id=pk, max_tentativas=_config('MAX_TENTATIVAS', 3)) for pk in pks
+    ])
+    TermoResponsabilidade.objects.filter(pk__in=pks).update(status_pdf=TermoResponsabilidade.StatusPDF.NA_FILA)
+    logger.info(f"Varredura: geração de {len(pks)} PDF(s) faltante(s) enfileirada")
+    return len(pks)
+
+
+def liberar_tarefas_travadas():
+    """Devolve à fila tarefas cujo worker morreu no meio do processamento."""
+    limite = timezone.now() - timedelta(seconds=_config('TEMPO_LIMITE', 600))
+    return TarefaPDF.objects.filter(
+        status=TarefaPDF.Status.PROCESSANDO,
+        agendada_para__lt=limite,
+    ).update(status=TarefaPDF.Status.PENDENTE)
+
+
+def reservar_tarefa():
+    """
+    Reserva a próxima tarefa pendente para este worker.
+
+    A reserva é um UPDATE condicional no status, então dois workers nunca
+    processam a mesma tarefa, em qualquer banco suportado.
+    """
+    agora = timezone.now()
+    candidatas = TarefaPDF.objects.filter(
+        status=TarefaPDF.Status.PENDENTE,
+        agendada_para__lte=agora,
+    ).order_by('agendada_para', 'pk').values_list('pk', flat=True)[:10]
+
+    for pk in list(candidatas):
+        reservada = TarefaPDF.objects.filter(pk=pk, status=TarefaPDF.Status.PENDENTE).update(
+            status=TarefaPDF.Status.PROCESSANDO,
+            tentativas=F('tentativas') + 1,
+            agendada_para=agora,
+        )
+        if reservada:
+            return TarefaPDF.objects.select_related(
+                'termo__colaborador', 'termo__modelo'
+            ).get(pk=pk)
+    return None
+
+
+def executar_tarefa(tarefa):
+    """Gera o PDF de uma tarefa já reservada. Retorna True em caso de sucesso."""
+    termo = tarefa.termo
+
+    try:
+        with trava_geracao(termo) as obtida:
+            if obtida:
+                gerar_pdf_termo(termo)
+            # Se um download sob demanda já está gerando este PDF, aproveita o resultado
+            elif not aguardar_geracao(termo, _config('TEMPO_LIMITE', 600)):
+                raise RuntimeError("O PDF está sendo gerado por outro processo e não ficou pronto")
+    except Exception as e:
+        logger.error(f"Erro ao gerar PDF do termo {termo.uuid} (tentativa {tarefa.tentativas}): {e}")
+        tarefa.erro = str(e)
+        if tarefa.tentativas >= tarefa.max_tentativas:
+            tarefa.status = TarefaPDF.Status.ERRO
+            _atualizar_status_pdf(termo, TermoResponsabilidade.StatusPDF.ERRO)
+        else:
+            atraso = _config('ATRASO_BASE', 30) * 2 ** (tarefa.tentativas - 1)
+            tarefa.status = TarefaPDF.Status.PENDENTE
+            tarefa.agendada_para = timezone.now() + timedelta(seconds=atraso)
+            _atualizar_status_pdf(termo, TermoResponsabilidade.StatusPDF.NA_FILA)
+        tarefa.save(update_fields=['status', 'erro', 'agendada_para'])
+        return False
+
+    tarefa.status = TarefaPDF.Status.CONCLUIDA
+    tarefa.erro = ''
+    tarefa.data_conclusao = timezone.now()
+    tarefa.save(update_fields=['status', 'erro', 'data_conclusao'])
+    _atualizar_status_pdf(termo, TermoResponsabilidade.StatusPDF.GERADO)
+    logger.info(f"PDF do termo {termo.uuid} gerado pela tarefa {tarefa.pk}")
+    return True
+
+
+def processar_fila(continuo=False, intervalo=2.0, limite=None, varredura=None):
+    """
+    Processa tarefas até a fila esvaziar (ou indefinidamente, se ``continuo``).
+
+    Com ``varredura`` (segundos), os termos assinados sem PDF são enfileirados
+    no início e, no modo contínuo, novamente a cada ``varredura`` segundos.
+    Retorna o número de tarefas processadas.
+    """
+    processadas = 0
+    liberar_tarefas_travadas()
+    proxima_varredura = time.monotonic()
+    while limite is None or processadas < limite:
+        if varredura is not None and time.monotonic() >= proxima_varredura:
+            enfileirar_pdfs_faltantes()
+            proxima_varredura = time.monotonic() + varredura
+        tarefa = reservar_tarefa()
+        if tarefa is None:
+            if not continuo:
+                break
+            time.sleep(intervalo)
+            liberar_tarefas_travadas()
+            continue
+        executar_tarefa(tarefa)
+        processadas += 1
+    return processadas
@@ -0,0 +1,168 @@
+"""
+Cache de modelos Word (.docx) compilados.
+
+Cada ``DocumentoModelo`` é lido e parseado uma única vez por processo. Na
+compilação, os placeholders ``${...}`` que o Word costuma quebrar em vários
+runs são reunidos em um só, e os nós de texto que os contêm, assim como as
+linhas de tabela com campos de lista, são localizados. Renderizar um termo
+passa a ser apenas preencher esses nós (ver ``documents.templating``),
+serializar o documento e restaurar o estado original.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from copy import deepcopy
+from io import BytesIO
+
+from django.conf import settings
+
+from . import templating
+
+logger = logging.getLogger(__name__)
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _normalizar_paragrafo(paragrafo):
+    """Reúne em um único run cada placeholder que o Word dividiu entre runs."""
+    runs = paragrafo.runs
+    if len(runs) < 2:
+        return
+
+    while True:
+        textos = [run.text for run in runs]
+        inicios = []
+        posicao = 0
+        for texto in textos:
+            inicios.append(posicao)
+            posicao += len(texto)
+
+        def indice_run(offset):
+            for i in range(len(runs) - 1, -1, -1):
+                if inicios[i] <= offset and (textos[i] or i == 0):
+                    return i
+            return 0
+
+        quebrado = None
+        for match in templating.TOKEN_RE.finditer(''.join(textos)):
+            primeiro = indice_run(match.start())
+            ultimo = indice_run(match.end() - 1)
+            if primeiro != ultimo:
+                quebrado = (match, primeiro, ultimo)
+                break
+        if quebrado is None:
+            return
+
+        match, primeiro, ultimo = quebrado
+        runs[primeiro].text = textos[primeiro][:match.start() - inicios[primeiro]] + match.group(0)
+        for i in range(primeiro + 1, ultimo):
+            runs[i].text = ''
+        runs[ultimo].text = textos[ultimo][match.end() - inicios[ultimo]:]
+
+
+class ModeloCompilado:
+    """Documento Word parseado com os nós de texto dos placeholders já localizados."""
+
+    def __init__(self, conteudo_docx):
+        from docx import Document
+        from docx.oxml.ns import qn
+        from docx.text.paragraph import Paragraph
+
+        self.documento = Document(BytesIO(conteudo_docx))
+        self._lock = threading.Lock()
+        self._qn_t = qn('w:t')
+        self._qn_espaco = qn('xml:space')
+
+        corpo = self.documento.element.body
+        for p in corpo.iter(qn('w:p')):
+            paragrafo = Paragraph(p, None)
+            if '${' in paragrafo.text:
+                _normalizar_paragrafo(paragrafo)
+
+        # Linhas de tabela com campos de lista (${EQUIP_DESCRICAO}...), repetidas por item
+        self.linhas_repetidas = []
+        nos_repetidos = set()
+        for tr in corpo.iter(qn('w:tr')):
+            textos = [t for t in tr.iter(self._qn_t) if templating.tem_tokens(t.text)]
+            prefixo = templating.lista_do_texto(''.join(t.text for t in textos))
+            if prefixo and not nos_repetidos.intersection(textos):
+                self.linhas_repetidas.append((tr, prefixo))
+                nos_repetidos.update(tr.iter(self._qn_t))
+
+        # Demais nós <w:t> que contêm ao menos um placeholder, com o texto original
+        self.textos = [
+            (t, t.text) for t in corpo.iter(self._qn_t)
+            if t not in nos_repetidos and templating.tem_tokens(t.text)
+        ]
+
+    def _preencher(self, t, texto, contexto):
+        t.text = templating.substituir(texto, contexto)
+        t.set(self._qn_espaco, 'preserve')
+
+    def _expandir_linha(self, linha, prefixo, contexto):
+        pai = linha.getparent()
+        indice = pai.index(linha)
+        novas = []
+        for item in templating.itens_da_lista(contexto, prefixo):
+            nova = deepcopy(linha)
+            contexto_item = templating.contexto_do_item(contexto, prefixo, item)
+            for t in nova.iter(self._qn_t):
+                if templating.tem_tokens(t.text):
+                    self._preencher(t, t.text, contexto_item)
+            novas.append(nova)
+        pai.remove(linha)
+        for deslocamento, nova in enumerate(novas):
+            pai.insert(indice + deslocamento, nova)
+        return pai, indice, linha, novas
+
+    def renderizar(self, contexto):
+        """Retorna os bytes do .docx com os placeholders substituídos pelo contexto."""
+        with self._lock:
+            expandidas = []
+            try:
+                for t, original in self.textos:
+                    self._preencher(t, original, contexto)
+                for linha, prefixo in self.linhas_repetidas:
+                    expandidas.append(self._expandir_linha(linha, prefixo, contexto))
+                buffer = BytesIO()
+                self.documento.save(buffer)
+                return buffer.getvalue()
+            finally:
+                for pai, indice, linha, novas in reversed(expandidas):
+                    for nova in novas:
+                        pai.remove(nova)
+                    pai.insert(indice, linha)
+                for t, original in self.textos:
+                    t.text = original
+
+
+def chave_modelo(modelo):
+    return (modelo.pk, modelo.versao, modelo.data_modificacao, modelo.arquivo_word.name)
+
+
+def obter_modelo_compilado(modelo):
+    """Retorna o modelo compilado do cache, compilando-o se a versão mudou."""
+    chave = chave_modelo(modelo)
+    with _cache_lock:
+        item = _cache.get(modelo.pk)
+        if item is not None and item[0] == chave:
+            _cache.move_to_end(modelo.pk)
+            return item[1]
+
+    logger.info(f"Compilando modelo Word {modelo.pk} (versão {modelo.versao})")
+    with modelo.arquivo_word.open('rb') as arquivo:
+        compilado = ModeloCompilado(arquivo.read())
+
+    limite = getattr(settings, 'DOCUMENTS_TEMPLATE_CACHE_SIZE', 32)
+    with _cache_lock:
+        _cache[modelo.pk] = (chave, compilado)
+        _cache.move_to_end(modelo.pk)
+        while len(_cache) > limite:
+            _cache.popitem(last=False)
+    return compilado
+
+
+def invalidar_modelo_compilado(pk):
+    with _cache_lock:
+        _cache.pop(pk, None)
@@ -0,0 +1,59 @@
+"""
+Motor de substituição de placeholders ``${...}`` dos modelos de documento.
+
+O texto é percorrido uma única vez por uma expressão regular, e cada token é
+resolvido por consulta direta ao contexto, então o custo é linear no tamanho
+do texto, independente da quantidade de placeholders disponíveis.
+
+Além dos placeholders simples (``${NOME}``, ``${EQUIP_1_VALOR}``), há campos
+de lista: ``${EQUIP_DESCRICAO}``, ``${EQUIP_VALOR}`` etc. referem-se a cada
+item de ``EQUIPAMENTOS`` e fazem o trecho que os contém (a linha da tabela,
+no Word) ser repetido uma vez por equipamento.
+"""
+import re
+from collections import ChainMap
+
+TOKEN_RE = re.compile(r'\$\{([A-Za-z0-9_]+)\}')
+
+# Prefixo dos campos de lista -> chave da lista no contexto
+LISTAS = {
+    'EQUIP': 'EQUIPAMENTOS',
+}
+
+_CAMPO_LISTA_RE = re.compile(r'^(%s)_([A-Za-z][A-Za-z0-9_]*)$' % '|'.join(LISTAS))
+
+
+def formatar_valor(valor):
+    return '' if valor is None else str(valor)
+
+
+def substituir(texto, contexto):
+    """Substitui os tokens conhecidos em uma única passada; os demais são mantidos."""
+    def resolver(match):
+        valor = contexto.get(match.group(1))
+        if valor is None and match.group(1) not in contexto:
+            return match.group(0)
+        return formatar_valor(valor)
+    return TOKEN_RE.sub(resolver, texto)
+
+
+def tem_tokens(texto):
+    return bool(texto) and TOKEN_RE.search(texto) is not None
+
+
+def lista_do_texto(texto):
+    """Retorna o prefixo da lista cujos campos aparecem no texto, se houver."""
+    for match in TOKEN_RE.finditer(texto or ''):
+        campo = _CAMPO_LISTA_RE.match(match.group(1))
+        if campo:
+            return campo.group(1)
+    return None
+
+
+def itens_da_lista(contexto, prefixo):
+    return contexto.get(LISTAS[prefixo]) or []
+
+
+def contexto_do_item(contexto, prefixo, item):
+    """Contexto de um item da lista: ``CAMPO`` do item vira ``PREFIXO_CAMPO``."""
+    return ChainMap({f'{prefixo}_{campo}': valor for campo, valor in item.items()}, contexto)
@@ -1,3 +1,1293 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from docx import Document
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client, TestCase, SimpleTestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import auditoria, bulk, html_pdf, inventario, pdf, previews, regeneracao, rendering, signing, template_cache, templating
+from .models import DocumentoModelo, Equipamento, ItemTermo, TarefaPDF, TermoResponsabilidade
+from .tasks import enfileirar_geracao_pdf, enfileirar_pdfs_faltantes, processar_fila, trava_geracao
+
+User = get_user_model()
+
+
+def criar_termo(colaborador, modelo=None, equipamentos=1, **kwargs):
+    modelo = modelo or DocumentoModelo.objects.create(titulo='Termo', conteudo='<p>${NOME}</p>', versao='1')
+    termo = TermoResponsabilidade.objects.create(colaborador=colaborador, modelo=modelo, **kwargs)
+    for i in range(equipamentos):
+        equipamento = Equipamento.objects.create(
+            tipo='NOTEBOOK', marca='Dell', modelo='Latitude',
+            numero_serie=f'SN-{termo.pk}-{i}', descricao='Notebook',
+            valor=Decimal('3500.00'), data_aquisicao=date(2024, 1, 1),
+        )
+        ItemTermo.objects.create(
+            termo=termo, equipamento=equipamento,
+            data_entrega=date(2024, 1, 2), estado_entrega='Novo',
+        )
+    return termo
+
+
+def criar_docx(*paragrafos, tabela=None):
+    """Cria um .docx em memória; cada parágrafo é uma lista de runs (texto, negrito)."""
+    documento = Document()
+    for runs in paragrafos:
+        paragrafo = documento.add_paragraph()
+        for texto, negrito in runs:
+            paragrafo.add_run(texto).bold = negrito
+    if tabela:
+        table = documento.add_table(rows=len(tabela), cols=len(tabela[0]))
+        for row, valores in zip(table.rows, tabela):
+            for cell, valor in zip(row.cells, valores):
+                cell.text = valor
+    buffer = BytesIO()
+    documento.save(buffer)
+    return buffer.getvalue()
+
+
+def ler_docx(conteudo):
+    documento = Document(BytesIO(conteudo))
+    return documento, [p.text for p in documento.paragraphs]
+
+
+class BackendFalso(rendering.BaseBackend):
+    nome = 'falso'
+
+    def converter(self, docx_path, pdf_path):
+        return pdf_path
+
+
+class RenderingBackendTests(SimpleTestCase):
+    def setUp(self):
+        rendering._backend = None
+        self.addCleanup(setattr, rendering, '_backend', None)
+
+    @override_settings(DOCUMENTS_PDF_BACKEND='documents.tests.BackendFalso')
+    def test_backend_resolvido_por_caminho_e_reutilizado(self):
+        backend = rendering.obter_backend()
+        self.assertIsInstance(backend, BackendFalso)
+        self.assertIs(rendering.obter_backend(), backend)
+
+    @override_settings(DOCUMENTS_PDF_BACKEND='libreoffice')
+    def test_backend_resolvido_por_nome(self):
+        self.assertIsInstance(rendering.obter_backend(), rendering.LibreOfficeBackend)
+
+
+@override_settings(DOCUMENTS_PDF_ASYNC=True)
+class FilaPDFTests(TestCase):
+    def setUp(self):
+        self.colaborador = User.objects.create_user(username='colaborador', password='senha', first_name='Ana')
+        self.termo = criar_termo(self.colaborador)
+
+    def test_assinatura_enfileira_pdf_sem_gerar_na_requisicao(self):
+        self.client.force_login(self.colaborador)
+        dados = {
+            'cpf': '123.456.789-09', 'rg': '123', 'endereco': 'Rua A', 'numero': '1',
+            'bairro': 'Centro', 'cidade': 'São Paulo', 'estado': 'SP', 'cep': '01000-000',
+        }
+        with mock.patch('documents.tasks.gerar_pdf_termo') as gerar:
+            response = self.client.post(reverse('documents:termo_sign', args=[self.termo.uuid]), dados)
+        self.assertRedirects(response, reverse('documents:termo_detail', args=[self.termo.uuid]),
+                             fetch_redirect_response=False)
+        gerar.assert_not_called()
+        self.termo.refresh_from_db()
+        self.assertEqual(self.termo.status, TermoResponsabilidade.Status.ASSINADO)
+        self.assertEqual(self.termo.status_pdf, TermoResponsabilidade.StatusPDF.NA_FILA)
+        self.assertEqual(TarefaPDF.objects.filter(termo=self.termo).count(), 1)
+
+    def test_worker_gera_pdf_e_conclui_tarefa(self):
+        tarefa = enfileirar_geracao_pdf(self.termo)
+        self.assertEqual(enfileirar_geracao_pdf(self.termo), tarefa)
+        with mock.patch('documents.tasks.gerar_pdf_termo') as gerar:
+            self.assertEqual(processar_fila(), 1)
+        gerar.assert_called_once()
+        tarefa.refresh_from_db()
+        self.termo.refresh_from_db()
+        self.assertEqual(tarefa.status, TarefaPDF.Status.CONCLUIDA)
+        self.assertEqual(self.termo.status_pdf, TermoResponsabilidade.StatusPDF.GERADO)
+
+    def test_falha_reagenda_e_marca_erro_apos_ultima_tentativa(self):
+        tarefa = enfileirar_geracao_pdf(self.termo)
+        with mock.patch('documents.tasks.gerar_pdf_termo', side_effect=RuntimeError('falhou')):
+            processar_fila()
+            tarefa.refresh_from_db()
+            self.assertEqual(tarefa.status, TarefaPDF.Status.PENDENTE)
+            self.assertGreater(tarefa.agendada_para, timezone.now())
+
+            for _ in range(tarefa.max_tentativas - 1):
+                TarefaPDF.objects.filter(pk=tarefa.pk).update(agendada_para=timezone.now())
+                processar_fila()
+
+        tarefa.refresh_from_db()
+        self.termo.refresh_from_db()
+        self.assertEqual(tarefa.status, TarefaPDF.Status.ERRO)
+        self.assertEqual(tarefa.tentativas, tarefa.max_tentativas)
+        self.assertEqual(self.termo.status_pdf, TermoResponsabilidade.StatusPDF.ERRO)
+
+    def test_endpoint_de_status(self):
+        enfileirar_geracao_pdf(self.termo)
+        self.client.force_login(self.colaborador)
+        response = self.client.get(reverse('documents:termo_pdf_status', args=[self.termo.uuid]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status_pdf'], 'NA_FILA')
+        self.assertFalse(response.json()['pronto'])
+
+        outro = User.objects.create_user(username='outro', password='senha')
+        self.client.force_login(outro)
+        response = self.client.get(reverse('documents:termo_pdf_status', args=[self.termo.uuid]))
+        self.assertEqual(response.status_code, 403)
+
+
+class ModeloCompiladoTests(SimpleTestCase):
+    def test_placeholder_quebrado_em_runs_e_substituido_mantendo_formatacao(self):
+        conteudo = criar_docx(
+            [('Eu, ', False), ('${NO', True), ('ME}', False), (', CPF ${CPF}.', False)],
+            tabela=[['${EQUIP_1_DESCRICAO}', '${EQUIP_1_VALOR}']],
+        )
+        compilado = template_cache.ModeloCompilado(conteudo)
+        contexto = {
+            'NOME': 'Ana Souza', 'CPF': '123.456.789-09',
+            'EQUIP_1_DESCRICAO': 'Notebook Dell', 'EQUIP_1_VALOR': 'R$ 10,00',
+        }
+
+        documento, paragrafos = ler_docx(compilado.renderizar(contexto))
+        self.assertEqual(paragrafos[0], 'Eu, Ana Souza, CPF 123.456.789-09.')
+        self.assertTrue(documento.paragraphs[0].runs[1].bold)
+        self.assertEqual(documento.paragraphs[0].runs[1].text, 'Ana Souza')
+        self.assertEqual(documento.tables[0].rows[0].cells[0].text, 'Notebook Dell')
+
+        # O modelo compilado volta ao estado original e pode ser reutilizado
+        _, paragrafos = ler_docx(compilado.renderizar({'NOME': 'Bruno', 'CPF': ''}))
+        self.assertEqual(paragrafos[0], 'Eu, Bruno, CPF .')
+
+    def test_linha_com_campos_de_lista_e_repetida_por_equipamento(self):
+        conteudo = criar_docx(
+            [('Total: ${VALOR_TOTAL}', False)],
+            tabela=[['Equipamento', 'Valor'], ['${EQUIP_DESCRICAO}', '${EQUIP_VALOR}'], ['Fim', '']],
+        )
+        compilado = template_cache.ModeloCompilado(conteudo)
+        contexto = {
+            'VALOR_TOTAL': 'R$ 3,00',
+            'EQUIPAMENTOS': [
+                {'DESCRICAO': f'Item {i}', 'VALOR': f'R$ {i},00'} for i in range(1, 4)
+            ],
+        }
+
+        documento, paragrafos = ler_docx(compilado.renderizar(contexto))
+        linhas = [[cell.text for cell in row.cells] for row in documento.tables[0].rows]
+        self.assertEqual(linhas, [
+            ['Equipamento', 'Valor'],
+            ['Item 1', 'R$ 1,00'], ['Item 2', 'R$ 2,00'], ['Item 3', 'R$ 3,00'],
+            ['Fim', ''],
+        ])
+        self.assertEqual(paragrafos[0], 'Total: R$ 3,00')
+
+        documento, _ = ler_docx(compilado.renderizar({'EQUIPAMENTOS': []}))
+        self.assertEqual(len(documento.tables[0].rows), 2)
+
+
+class TemplatingTests(SimpleTestCase):
+    def test_substituicao_em_passada_unica(self):
+        contexto = {'NOME': 'Ana', 'CPF': None, 'X': '${NOME}'}
+        self.assertEqual(
+            templating.substituir('${NOME} ${CPF}|${X}|${DESCONHECIDO}', contexto),
+            'Ana |${NOME}|${DESCONHECIDO}',
+        )
+
+    def test_campos_de_lista(self):
+        self.assertEqual(templating.lista_do_texto('${EQUIP_DESCRICAO}'), 'EQUIP')
+        self.assertIsNone(templating.lista_do_texto('${EQUIP_1_DESCRICAO} ${NOME}'))
+
+
+class CacheModeloCompiladoTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        template_cache._cache.clear()
+
+    def test_cache_reutiliza_e_invalida_ao_salvar_modelo(self):
+        modelo = DocumentoModelo.objects.create(
+            titulo='Termo', conteudo='', versao='1',
+            arquivo_word=SimpleUploadedFile('modelo.docx', criar_docx([('${NOME}', False)])),
+        )
+        compilado = template_cache.obter_modelo_compilado(modelo)
+        self.assertIs(template_cache.obter_modelo_compilado(modelo), compilado)
+
+        modelo.versao = '2'
+        modelo.save()
+        self.assertNotIn(modelo.pk, template_cache._cache)
+        self.assertIsNot(template_cache.obter_modelo_compilado(modelo), compilado)
+
+
+class PDFConteudoHTMLTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        html_pdf._cache.clear()
+        self.colaborador = User.objects.create_user(
+            username='colaborador', password='senha', first_name='Ana', last_name='<Souza>',
+        )
+
+    def test_placeholders_escapados_e_linhas_repetidas(self):
+        modelo = DocumentoModelo.objects.create(titulo='Termo', versao='1', conteudo=(
+            '<p>Eu, ${NOME}, recebi:</p>'
+            '<table><tr><th>Item</th></tr><tr><td>${EQUIP_ITEM}</td><td>${EQUIP_NUMERO_SERIE}</td></tr></table>'
+            '<p>Total: ${VALOR_TOTAL}</p>'
+        ))
+        termo = criar_termo(self.colaborador, modelo=modelo, equipamentos=3)
+
+        html = html_pdf.montar_html(modelo, pdf.montar_contexto(termo))
+        self.assertIn('Eu, Ana &lt;Souza&gt;, recebi:', html)
+        self.assertNotIn('<Souza>', html)
+        for i in range(3):
+            self.assertIn(f'<tr><td>{i + 1}</td><td>SN-{termo.pk}-{i}</td></tr>', html)
+        self.assertIn('Total: R$ 10500,00', html)
+        # A tabela de equipamentos do layout não é repetida
+        self.assertNotIn('Nº Série', html)
+
+    def test_gerar_pdf_de_modelo_sem_arquivo_word(self):
+        termo = criar_termo(self.colaborador, equipamentos=2,
+                            status=TermoResponsabilidade.Status.ASSINADO, data_assinatura=timezone.now())
+        caminho = pdf.gerar_pdf_termo(termo)
+        with open(caminho, 'rb') as arquivo:
+            self.assertTrue(arquivo.read().startswith(b'%PDF'))
+        termo.refresh_from_db()
+        self.assertEqual(termo.digest_pdf, auditoria.digest_arquivo(caminho))
+
+    def test_cache_reutiliza_e_invalida_ao_salvar_modelo(self):
+        modelo = DocumentoModelo.objects.create(titulo='Termo', conteudo='<p>${NOME}</p>', versao='1')
+        compilado = html_pdf.obter_modelo_html_compilado(modelo)
+        self.assertIs(html_pdf.obter_modelo_html_compilado(modelo), compilado)
+
+        modelo.conteudo = '<p>${CPF}</p>'
+        modelo.save()
+        self.assertNotIn(modelo.pk, html_pdf._cache)
+        self.assertEqual(html_pdf.obter_modelo_html_compilado(modelo).renderizar({'CPF': '123'}), '<p>123</p>')
+
+    def test_modelo_sem_arquivo_word_nem_conteudo(self):
+        modelo = DocumentoModelo.objects.create(titulo='Termo', conteudo='', versao='1')
+        termo = criar_termo(self.colaborador, modelo=modelo)
+        with self.assertRaisesMessage(Exception, 'arquivo Word'):
+            pdf.gerar_pdf_termo(termo)
+
+    def test_recursos_externos_sao_ignorados(self):
+        self.assertEqual(html_pdf.resolver_recurso('https://exemplo.com/logo.png', None), '')
+        self.assertEqual(html_pdf.resolver_recurso(f'{settings.MEDIA_URL}../segredo.txt', None), '')
+        caminho = os.path.join(self.media_root, 'logo.png')
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(b'png')
+        self.assertEqual(html_pdf.resolver_recurso(f'{settings.MEDIA_URL}logo.png', None), caminho)
+
+
+def renderizar_pdf_falso(modelo, contexto, pdf_path):
+    with open(pdf_path, 'wb') as arquivo:
+        arquivo.write(b'%PDF-1.4 ' + contexto['NOME'].encode())
+    return pdf_path
+
+
+class PreviaTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.colaborador = User.objects.create_user(username='colaborador', password='senha', first_name='Ana')
+        self.termo = criar_termo(self.colaborador)
+        self.client.force_login(self.colaborador)
+        self.url = reverse('documents:termo_preview', args=[self.termo.uuid])
+
+    def test_previa_reutilizada_enquanto_entradas_nao_mudam(self):
+        with mock.patch('documents.previews.renderizar_pdf', side_effect=renderizar_pdf_falso) as renderizar:
+            primeira = self.client.get(self.url)
+            segunda = self.client.get(self.url)
+            nao_modificada = self.client.get(self.url, HTTP_IF_NONE_MATCH=primeira['ETag'])
+
+            self.colaborador.first_name = 'Bruna'
+            self.colaborador.save()
+            alterada = self.client.get(self.url)
+
+        self.assertEqual(primeira.status_code, 200)
+        self.assertEqual(b''.join(segunda.streaming_content), b'%PDF-1.4 Ana ')
+        self.assertEqual(nao_modificada.status_code, 304)
+        self.assertNotEqual(alterada['ETag'], primeira['ETag'])
+        self.assertEqual(renderizar.call_count, 2)
+        self.assertEqual(len(os.listdir(previews.diretorio_previas())), 2)
+
+    def test_limpeza_remove_previas_menos_usadas(self):
+        os.makedirs(previews.diretorio_previas())
+        for i, nome in enumerate(['antiga', 'media', 'recente']):
+            caminho = previews.caminho_previa(nome)
+            with open(caminho, 'wb') as arquivo:
+                arquivo.write(b'x' * 100)
+            os.utime(caminho, (1000 + i, 1000 + i))
+
+        self.assertEqual(previews.limpar_previas(limite_bytes=200), 1)
+        self.assertFalse(os.path.exists(previews.caminho_previa('antiga')))
+        self.assertTrue(os.path.exists(previews.caminho_previa('recente')))
+
+
+class DownloadTermoTests(TestCase):
+    conteudo = b'%PDF-1.4 ' + bytes(range(256)) * 10
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.colaborador = User.objects.create_user(username='colaborador', password='senha', first_name='Ana')
+        self.termo = criar_termo(
+            self.colaborador, status=TermoResponsabilidade.Status.ASSINADO, hash_assinatura='abc123',
+        )
+        self.termo.arquivo_pdf.save('termo.pdf', ContentFile(self.conteudo))
+        self.client.force_login(self.colaborador)
+        self.url = reverse('documents:termo_download', args=[self.termo.uuid])
+
+    def test_download_em_streaming_com_validadores(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('abc123', response['ETag'])
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_requisicao_parcial(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.conteudo)}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo[-5:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.conteudo)}-')
+        self.assertEqual(response.status_code, 416)
+
+        # If-Range com outra versão: devolve o arquivo inteiro
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"outra-versao"')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(DOCUMENTS_FILE_OFFLOAD='x-accel-redirect', DOCUMENTS_OFFLOAD_PREFIX='/protected-media/')
+    def test_offload_para_o_proxy(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.termo.arquivo_pdf.name}')
+        self.assertIn('abc123', response['ETag'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+    def test_media_protegida(self):
+        url = settings.MEDIA_URL + self.termo.arquivo_pdf.name
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo)
+
+        outro = User.objects.create_user(username='outro', password='senha')
+        self.client.force_login(outro)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(settings.MEDIA_URL + '../settings.py').status_code, 404)
+        # Sem permissão, a resposta não revela se o arquivo existe
+        self.assertEqual(self.client.get(settings.MEDIA_URL + 'documentos/termos/inexistente.pdf').status_code, 403)
+        self.assertEqual(self.client.get(settings.MEDIA_URL + 'modelos/inexistente.docx').status_code, 403)
+
+        self.client.force_login(User.objects.create_user(username='admin', password='senha', is_staff=True))
+        self.assertEqual(self.client.get(settings.MEDIA_URL + 'modelos/inexistente.docx').status_code, 404)
+
+
+class GeracaoSobDemandaTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        renderizar = mock.patch('documents.pdf.renderizar_pdf', side_effect=renderizar_pdf_falso)
+        self.renderizar = renderizar.start()
+        self.addCleanup(renderizar.stop)
+        self.colaborador = User.objects.create_user(username='colaborador', password='senha', first_name='Ana')
+        self.client.force_login(self.colaborador)
+        self.termo = criar_termo(self.colaborador, status=TermoResponsabilidade.Status.ASSINADO)
+        self.url = reverse('documents:termo_download', args=[self.termo.uuid])
+
+    def test_download_gera_uma_vez_e_conclui_tarefa_pendente(self):
+        tarefa = enfileirar_geracao_pdf(self.termo)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 Ana ')
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.renderizar.call_count, 1)
+
+        tarefa.refresh_from_db()
+        self.termo.refresh_from_db()
+        self.assertEqual(tarefa.status, TarefaPDF.Status.CONCLUIDA)
+        self.assertEqual(self.termo.status_pdf, TermoResponsabilidade.StatusPDF.GERADO)
+
+    @override_settings(DOCUMENTS_PDF_FILA={'ESPERA_DOWNLOAD': 0})
+    def test_geracao_em_andamento_nao_renderiza_de_novo(self):
+        with trava_geracao(self.termo) as obtida:
+            self.assertTrue(obtida)
+            response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('documents:termo_detail', args=[self.termo.uuid]),
+                             fetch_redirect_response=False)
+        self.renderizar.assert_not_called()
+
+    def test_worker_aproveita_pdf_gerado_por_um_download(self):
+        tarefa = enfileirar_geracao_pdf(self.termo)
+
+        def download_termina_a_geracao(termo, espera):
+            pdf.gerar_pdf_termo(termo)
+            return True
+
+        with trava_geracao(self.termo), \
+                mock.patch('documents.tasks.aguardar_geracao', side_effect=download_termina_a_geracao):
+            processar_fila()
+        self.assertEqual(self.renderizar.call_count, 1)
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, TarefaPDF.Status.CONCLUIDA)
+
+    def test_trava_no_banco_vale_entre_processos_e_expira(self):
+        # Outra cópia do termo, como a lida por outro processo
+        outra_copia = TermoResponsabilidade.objects.get(pk=self.termo.pk)
+        with trava_geracao(self.termo) as obtida:
+            self.assertTrue(obtida)
+            with trava_geracao(outra_copia) as obtida_por_outro:
+                self.assertFalse(obtida_por_outro)
+        with trava_geracao(outra_copia) as obtida:
+            self.assertTrue(obtida)
+
+        # Trava de um processo que morreu no meio da geração
+        TermoResponsabilidade.objects.filter(pk=self.termo.pk).update(
+            geracao_pdf_iniciada_em=timezone.now() - timedelta(hours=1),
+        )
+        with trava_geracao(outra_copia) as obtida:
+            self.assertTrue(obtida)
+        outra_copia.refresh_from_db()
+        self.assertIsNone(outra_copia.geracao_pdf_iniciada_em)
+
+    def test_varredura_enfileira_termos_assinados_sem_pdf(self):
+        com_tarefa = criar_termo(self.colaborador, status=TermoResponsabilidade.Status.ASSINADO)
+        enfileirar_geracao_pdf(com_tarefa)
+        com_erro = criar_termo(self.colaborador, status=TermoResponsabilidade.Status.ASSINADO,
+                               status_pdf=TermoResponsabilidade.StatusPDF.ERRO)
+        criar_termo(self.colaborador)  # pendente de assinatura
+
+        self.assertEqual(enfileirar_pdfs_faltantes(), 1)
+        self.assertEqual(enfileirar_pdfs_faltantes(), 0)
+        self.assertEqual(enfileirar_pdfs_faltantes(incluir_erros=True), 1)
+        self.assertEqual(TarefaPDF.objects.filter(termo=com_erro).count(), 1)
+
+        TarefaPDF.objects.all().delete()
+        call_command('processar_fila_pdf', varrer=True, stdout=StringIO())
+        self.termo.refresh_from_db()
+        self.assertTrue(self.termo.arquivo_pdf)
+        self.assertEqual(TarefaPDF.objects.filter(status=TarefaPDF.Status.CONCLUIDA).count(), 3)
+
+
+class ConsultasConstantesMixin:
+    """Garante que o número de consultas de uma página não cresce com a quantidade de registros."""
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(consultas)
+
+    def assertConsultasConstantes(self, url, criar_registros):
+        criar_registros(2)
+        inicial = self.contar_consultas(url)
+        criar_registros(10)
+        self.assertEqual(self.contar_consultas(url), inicial)
+
+
+class ConsultasListagemTests(ConsultasConstantesMixin, TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='admin', password='senha', is_staff=True)
+        self.modelo = DocumentoModelo.objects.create(titulo='Termo', conteudo='<p>${NOME}</p>', versao='1')
+        self.total = 0
+
+    def criar_termos(self, quantidade, **kwargs):
+        for _ in range(quantidade):
+            self.total += 1
+            colaborador = User.objects.create_user(username=f'colaborador{self.total}', password='senha')
+            criar_termo(colaborador, modelo=self.modelo, equipamentos=2, **kwargs)
+
+    def test_listagem_de_termos(self):
+        self.client.force_login(self.staff)
+        self.assertConsultasConstantes(reverse('documents:termo_list'), self.criar_termos)
+
+    def test_assinatura_com_varios_equipamentos(self):
+        colaborador = User.objects.create_user(username='colaborador', password='senha')
+        self.client.force_login(colaborador)
+        poucos = criar_termo(colaborador, modelo=self.modelo, equipamentos=2)
+        muitos = criar_termo(colaborador, modelo=self.modelo, equipamentos=10)
+        self.assertEqual(
+            self.contar_consultas(reverse('documents:termo_sign', args=[muitos.uuid])),
+            self.contar_consultas(reverse('documents:termo_sign', args=[poucos.uuid])),
+        )
+
+
+class IndicesConsultasTests(TestCase):
+    def test_consultas_do_dashboard_e_listagens_usam_indices(self):
+        saida = StringIO()
+        call_command('benchmark_indices', equipamentos=400, colaboradores=20, repeticoes=1, verificar=True, stdout=saida)
+        self.assertNotIn('varredura', saida.getvalue())
+        # Os dados gerados são descartados ao final
+        self.assertFalse(Equipamento.objects.exists())
+
+
+class TermosEmLoteTests(TestCase):
+    def setUp(self):
+        self.modelo = DocumentoModelo.objects.create(titulo='Admissão', conteudo='<p>${NOME}</p>', versao='1')
+        self.colaboradores = [
+            User.objects.create_user(username=f'novo{i}', email=f'novo{i}@empresa.com', password='senha')
+            for i in range(3)
+        ]
+        for i in range(6):
+            Equipamento.objects.create(
+                tipo='NOTEBOOK', marca='Dell', modelo='Latitude', numero_serie=f'LOTE-{i}',
+                descricao='Notebook', valor=Decimal('3500.00'), data_aquisicao=date(2024, 1, 1),
+            )
+        self.csv = (
+            'colaborador;modelo;equipamentos;observacoes\n'
+            'novo0;Admissão;LOTE-0,LOTE-1;Onda 1\n'
+            f'novo1@empresa.com;{self.modelo.pk};LOTE-2;\n'
+            'novo2;Admissão;LOTE-3 LOTE-4;\n'
+        )
+
+    def test_cria_termos_e_itens_em_poucas_consultas(self):
+        linhas = bulk.ler_linhas(self.csv.encode('utf-8-sig'))
+        # ... mais a leitura e o upsert do índice de busca dos termos criados
+        with self.assertNumQueries(7 + 2):
+            resultado = bulk.criar_termos_em_lote(linhas)
+        self.assertEqual(resultado.erros, [])
+        self.assertEqual(TermoResponsabilidade.objects.count(), 3)
+        self.assertEqual(ItemTermo.objects.count(), 5)
+        termo = TermoResponsabilidade.objects.get(colaborador__username='novo0')
+        self.assertEqual(termo.observacoes, 'Onda 1')
+        self.assertEqual(sorted(termo.equipamentos.values_list('numero_serie', flat=True)), ['LOTE-0', 'LOTE-1'])
+
+    def test_erros_por_linha(self):
+        linhas = [
+            {'colaborador': 'novo0', 'modelo': 'Admissão', 'equipamentos': ['LOTE-0']},
+            {'colaborador': 'ninguem', 'modelo': 'Inexistente', 'equipamentos': 'LOTE-0;LOTE-9'},
+            {'colaborador': 'novo1', 'modelo': 'Admissão', 'equipamentos': ['LOTE-5']},
+        ]
+        resultado = bulk.criar_termos_em_lote(linhas)
+        self.assertEqual([numero for numero, _ in resultado.erros], [2])
+        mensagem = resultado.erros[0][1]
+        for trecho in ("colaborador 'ninguem'", "modelo 'Inexistente'", "'LOTE-0' já incluído na linha 1", "'LOTE-9' não encontrado"):
+            self.assertIn(trecho, mensagem)
+        self.assertFalse(TermoResponsabilidade.objects.exists())
+
+        resultado = bulk.criar_termos_em_lote(linhas, parcial=True)
+        self.assertEqual(len(resultado.termos), 2)
+        self.assertEqual(TermoResponsabilidade.objects.count(), 2)
+
+    def test_view_e_comando(self):
+        staff = User.objects.create_user(username='admin', password='senha', is_staff=True)
+        self.client.force_login(staff)
+        arquivo = SimpleUploadedFile('lote.csv', self.csv.encode())
+        response = self.client.post(reverse('documents:termo_bulk_create'), {'arquivo': arquivo})
+        self.assertRedirects(response, reverse('documents:termo_list'))
+        self.assertEqual(TermoResponsabilidade.objects.count(), 3)
+
+        caminho = os.path.join(tempfile.mkdtemp(), 'lote.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(caminho))
+        with open(caminho, 'w') as arquivo:
+            arquivo.write('[{"colaborador": "novo0", "modelo": "Admissão", "equipamentos": ["LOTE-5"]}]')
+        saida = StringIO()
+        call_command('criar_termos_lote', caminho, stdout=saida)
+        self.assertIn('1 termo(s) e 1 item(ns) criados', saida.getvalue())
+
+    def test_formulario_individual_cria_cada_item_uma_vez(self):
+        staff = User.objects.create_user(username='admin', password='senha', is_staff=True)
+        self.client.force_login(staff)
+        equipamentos = Equipamento.objects.filter(numero_serie__in=['LOTE-0', 'LOTE-1'])
+        response = self.client.post(reverse('documents:termo_create'), {
+            'colaborador': self.colaboradores[0].pk, 'modelo': self.modelo.pk,
+            'equipamentos': [e.pk for e in equipamentos], 'observacoes': '',
+        })
+        self.assertRedirects(response, reverse('documents:termo_list'))
+        termo = TermoResponsabilidade.objects.get()
+        self.assertEqual(termo.status, TermoResponsabilidade.Status.PENDENTE)
+        self.assertEqual(ItemTermo.objects.filter(termo=termo).count(), 2)
+
+
+class InventarioEquipamentosTests(TestCase):
+    def setUp(self):
+        self.colaborador = User.objects.create_user(username='ana', password='senha')
+        Equipamento.objects.create(
+            tipo='NOTEBOOK', marca='Dell', modelo='Antigo', numero_serie='INV-1', descricao='Notebook',
+            valor=Decimal('1000.00'), data_aquisicao=date(2020, 1, 1), observacoes='manter',
+        )
+
+    def importar(self, conteudo, **kwargs):
+        return inventario.importar_equipamentos(inventario.ler_csv(BytesIO(conteudo.encode('utf-8-sig'))), **kwargs)
+
+    def test_importacao_em_lotes_com_upsert(self):
+        csv_ = (
+            'numero_serie;tipo;marca;modelo;valor;data_aquisicao;usuario\n'
+            'INV-1;NOTEBOOK;Dell;Latitude 5440;4.500,00;2024-03-01;ana\n'
+            'INV-2;MONITOR;LG;27UL;1200.50;2024-03-02;\n'
+            'INV-3;IMPRESSORA;HP;X;10;2024-03-03;\n'
+            'INV-2;MONITOR;LG;27UL;1200.50;2024-03-02;\n'
+            'INV-4;TABLET;Apple;iPad;abc;ontem;fulano\n'
+            'INV-5;CELULAR;Samsung;S23;3000;2024-03-05;ana\n'
+        )
+        # Números de série existentes + (usuários, savepoint, upsert, leitura e upsert
+        # do índice de busca, release) nos lotes com linhas válidas
+        with self.assertNumQueries(1 + 6 + 6):
+            resultado = self.importar(csv_, tamanho_lote=2)
+        self.assertEqual((resultado.criados, resultado.atualizados, resultado.total_erros), (2, 1, 3))
+        self.assertEqual([numero for numero, _ in resultado.erros], [4, 5, 6])
+        self.assertIn('repetido (linha 3)', resultado.erros[1][1])
+        self.assertIn("usuario: 'fulano' não encontrado", resultado.erros[2][1])
+
+        atualizado = Equipamento.objects.get(numero_serie='INV-1')
+        self.assertEqual((atualizado.modelo, atualizado.valor, atualizado.usuario), ('Latitude 5440', Decimal('4500.00'), self.colaborador))
+        # Colunas ausentes no arquivo não são sobrescritas
+        self.assertEqual(atualizado.observacoes, 'manter')
+        self.assertEqual(Equipamento.objects.get(numero_serie='INV-2').status, 'DISPONIVEL')
+        self.assertEqual(Equipamento.objects.count(), 3)
+
+    def test_colunas_obrigatorias_e_simulacao(self):
+        with self.assertRaises(inventario.ArquivoInvalido):
+            self.importar('numero_serie,tipo\nX,NOTEBOOK\n')
+        resultado = self.importar(
+            'numero_serie,tipo,marca,modelo,valor,data_aquisicao\nINV-9,NOTEBOOK,Dell,X,10,2024-01-01\n', simular=True
+        )
+        self.assertEqual(resultado.criados, 1)
+        self.assertFalse(Equipamento.objects.filter(numero_serie='INV-9').exists())
+
+    def test_exportacao_em_streaming_pode_ser_reimportada(self):
+        staff = User.objects.create_user(username='admin', password='senha', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('documents:equipamento_export'))
+        self.assertTrue(response.streaming)
+        conteudo = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+        self.assertIn('INV-1,NOTEBOOK,Dell,Antigo', conteudo)
+
+        resultado = self.importar(conteudo.lstrip('\ufeff'))
+        self.assertEqual((resultado.criados, resultado.atualizados, resultado.total_erros), (0, 1, 0))
+
+    def test_exportacao_neutraliza_formulas(self):
+        Equipamento.objects.filter(numero_serie='INV-1').update(
+            descricao='=HYPERLINK("http://exemplo.com","x")', observacoes='@SUM(1+1)', modelo='-2+3',
+        )
+        conteudo = ''.join(inventario.exportar_csv()).lstrip('\ufeff')
+        linha = next(csv.DictReader(StringIO(conteudo)))
+        self.assertEqual(linha['descricao'], '\'=HYPERLINK("http://exemplo.com","x")')
+        self.assertEqual(linha['observacoes'], "'@SUM(1+1)")
+        self.assertEqual(linha['modelo'], "'-2+3")
+        self.assertEqual(linha['marca'], 'Dell')
+
+        # Reimportado, o apóstrofo sai
+        self.importar(conteudo)
+        equipamento = Equipamento.objects.get(numero_serie='INV-1')
+        self.assertEqual((equipamento.modelo, equipamento.observacoes), ('-2+3', '@SUM(1+1)'))
+
+    @skipUnless(inventario.XLSX_AVAILABLE, 'openpyxl não instalado')
+    def test_xlsx(self):
+        buffer = BytesIO()
+        inventario.exportar_xlsx(buffer)
+        buffer.seek(0)
+        resultado = inventario.importar_equipamentos(inventario.ler_xlsx(buffer))
+        self.assertEqual(resultado.atualizados, 1)
+
+
+DADOS_ASSINATURA = {
+    'cpf': '123.456.789-00', 'rg': '1234567', 'endereco': 'Rua A', 'numero': '10',
+    'bairro': 'Centro', 'cidade': 'Recife', 'estado': 'PE', 'cep': '50000-000',
+}
+
+
+class AssinaturaTermoTests(TestCase):
+    def setUp(self):
+        self.colaborador = User.objects.create_user(username='colaborador', password='senha')
+        self.client.force_login(self.colaborador)
+        self.modelo = DocumentoModelo.objects.create(titulo='Termo', conteudo='<p>${NOME}</p>', versao='1')
+
+    def assinar(self, termo, **extra):
+        return self.client.post(reverse('documents:termo_sign', args=[termo.uuid]), {**DADOS_ASSINATURA, **extra})
+
+    def test_assinatura_atualiza_termo_equipamentos_e_itens(self):
+        termo = criar_termo(self.colaborador, modelo=self.modelo, equipamentos=2)
+        item = ItemTermo.objects.filter(termo=termo).first()
+        response = self.assinar(termo, **{f'estado_{item.equipamento_id}': 'Usado - Bom'})
+        self.assertRedirects(response, reverse('documents:termo_detail', args=[termo.uuid]), fetch_redirect_response=False)
+
+        termo.refresh_from_db()
+        self.assertEqual(termo.status, TermoResponsabilidade.Status.ASSINADO)
+        self.assertEqual(len(termo.hash_assinatura), 64)
+        self.assertEqual(termo.status_pdf, TermoResponsabilidade.StatusPDF.NA_FILA)
+        self.assertEqual(set(termo.equipamentos.values_list('status', 'usuario')), {('EM_USO', self.colaborador.pk)})
+        item.refresh_from_db()
+        self.assertEqual(item.estado_entrega, 'Usado - Bom')
+        self.colaborador.refresh_from_db()
+        self.assertEqual(self.colaborador.cidade, 'Recife')
+
+        # Segundo envio: nada muda
+        hash_original = termo.hash_assinatura
+        self.assinar(termo)
+        termo.refresh_from_db()
+        self.assertEqual(termo.hash_assinatura, hash_original)
+        self.assertEqual(TarefaPDF.objects.filter(termo=termo).count(), 1)
+
+    def test_ip_invalido_nos_cabecalhos_nao_e_gravado(self):
+        termo = criar_termo(self.colaborador, modelo=self.modelo, equipamentos=1)
+        self.client.post(reverse('documents:termo_sign', args=[termo.uuid]), DADOS_ASSINATURA,
+                         HTTP_X_FORWARDED_FOR='unknown, 10.0.0.1')
+        termo.refresh_from_db()
+        self.assertIsNone(termo.ip_assinatura)
+        self.assertIn(f'IP: {auditoria.IP_NAO_IDENTIFICADO}\n', termo.observacoes)
+        self.assertEqual(pdf.montar_contexto(termo)['IP_ASSINATURA'], auditoria.IP_NAO_IDENTIFICADO)
+        self.assertEqual(termo.hash_assinatura, auditoria.calcular_hash_assinatura(
+            termo.uuid, 'colaborador', termo.data_assinatura, None,
+        ))
+
+    def test_ip_nao_canonico_e_gravado_e_assinado_normalizado(self):
+        termo = criar_termo(self.colaborador, modelo=self.modelo, equipamentos=1)
+        self.client.post(reverse('documents:termo_sign', args=[termo.uuid]), DADOS_ASSINATURA,
+                         HTTP_X_FORWARDED_FOR='2001:DB8:0:0::1, 10.0.0.1')
+        termo.refresh_from_db()
+        self.assertEqual(termo.ip_assinatura, '2001:db8::1')
+        self.assertIn('IP: 2001:db8::1\n', termo.observacoes)
+        self.assertEqual(auditoria.auditar_termos().problemas, [])
+
+    def test_consultas_nao_crescem_com_os_itens(self):
+        def consultas(equipamentos):
+            termo = criar_termo(self.colaborador, modelo=self.modelo, equipamentos=equipamentos)
+            estados = {f'estado_{item.equipamento_id}': 'Usado - Bom' for item in termo.itemtermo_set.all()}
+            with CaptureQueriesContext(connection) as capturadas:
+                self.assinar(termo, **estados)
+            return len(capturadas)
+
+        self.assertEqual(consultas(2), consultas(12))
+
+    def test_assinatura_concorrente_entre_verificacao_e_gravacao(self):
+        termo = criar_termo(self.colaborador, modelo=self.modelo, equipamentos=1)
+
+        def outra_requisicao_assina(usuario):
+            # Outra requisição assina o termo depois da verificação inicial
+            TermoResponsabilidade.objects.filter(pk=termo.pk).update(
+                status=TermoResponsabilidade.Status.ASSINADO, observacoes='primeira')
+            return True
+
+        with mock.patch.object(TermoResponsabilidade, 'pode_assinar', side_effect=outra_requisicao_assina):
+            self.assinar(termo)
+
+        termo.refresh_from_db()
+        self.assertEqual(termo.observacoes, 'primeira')
+        self.assertFalse(TarefaPDF.objects.filter(termo=termo).exists())
+
+
+class ConcorrenciaAssinaturaTests(TransactionTestCase):
+    """
+    Assinaturas simultâneas de verdade, cada thread com sua própria conexão.
+
+    No SQLite o banco de testes fica em arquivo e em modo WAL (ver
+    ``DATABASES['default']['TEST']``), então as escritas concorrentes esperam
+    umas pelas outras em vez de falhar.
+    """
+
+    def setUp(self):
+        self.colaborador = User.objects.create_user(username='colaborador', password='senha')
+        self.termo = criar_termo(self.colaborador, equipamentos=3)
+        self.url = reverse('documents:termo_sign', args=[self.termo.uuid])
+
+    def assinar_em_thread(self, barreira=None):
+        respostas = []
+
+        def assinar():
+            client = Client()
+            client.force_login(self.colaborador)
+            if barreira is not None:
+                barreira.wait(timeout=10)
+            try:
+                respostas.append(client.post(self.url, DADOS_ASSINATURA).status_code)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=assinar, daemon=True)
+        thread.start()
+        return thread, respostas
+
+    def test_envios_simultaneos_assinam_uma_unica_vez(self):
+        total = 6
+        barreira = threading.Barrier(total)
+        with mock.patch('documents.views.enfileirar_geracao_pdf', wraps=enfileirar_geracao_pdf) as enfileirar:
+            execucoes = [self.assinar_em_thread(barreira) for _ in range(total)]
+            for thread, _ in execucoes:
+                thread.join(timeout=30)
+
+        self.assertEqual([codigo for _, respostas in execucoes for codigo in respostas], [302] * total)
+        # Só o envio que ganhou o UPDATE condicional segue com a assinatura
+        self.assertEqual(enfileirar.call_count, 1)
+        self.termo.refresh_from_db()
+        self.assertEqual(self.termo.status, TermoResponsabilidade.Status.ASSINADO)
+        self.assertEqual(self.termo.observacoes.count('Informações da assinatura'), 1)
+        self.assertEqual(TarefaPDF.objects.filter(termo=self.termo).count(), 1)
+
+    # No SQLite o FOR UPDATE é ignorado: não há trava de linha a esperar
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_envio_aguarda_a_trava_da_linha_do_termo(self):
+        with mock.patch('documents.views.enfileirar_geracao_pdf') as enfileirar:
+            with transaction.atomic():
+                TermoResponsabilidade.objects.select_for_update().get(pk=self.termo.pk)
+                thread, respostas = self.assinar_em_thread()
+                thread.join(timeout=1)
+                self.assertTrue(thread.is_alive())
+                TermoResponsabilidade.objects.filter(pk=self.termo.pk).update(
+                    status=TermoResponsabilidade.Status.ASSINADO
+                )
+            thread.join(timeout=30)
+
+        self.assertEqual(respostas, [302])
+        enfileirar.assert_not_called()
+        self.termo.refresh_from_db()
+        self.assertNotIn('Informações da assinatura', self.termo.observacoes or '')
+
+
+def renderizar_pdf_real(modelo, contexto, pdf_path):
+    from reportlab.pdfgen import canvas
+
+    pdf = canvas.Canvas(pdf_path)
+    pdf.drawString(72, 720, f"Termo de {contexto['NOME']}")
+    pdf.save()
+    return pdf_path
+
+
+class CacheFragmentosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.colaborador = User.objects.create_user(username='colaborador', password='senha', first_name='Ana')
+        self.client.force_login(self.colaborador)
+        self.termo = criar_termo(self.colaborador, equipamentos=3, status=TermoResponsabilidade.Status.ASSINADO)
+        self.url = reverse('documents:termo_detail', args=[self.termo.uuid])
+
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(capturadas)
+
+    def test_detalhes_do_termo_em_cache_ate_a_modificacao(self):
+        response, frio = self.consultas(self.url)
+        self.assertContains(response, 'SN-')
+        response, quente = self.consultas(self.url)
+        # Sem a consulta dos itens e equipamentos
+        self.assertEqual(quente, frio - 1)
+        self.assertContains(response, f'SN-{self.termo.pk}-2')
+
+        self.termo.observacoes = 'Devolver em 2025'
+        self.termo.save()
+        self.assertContains(self.client.get(self.url), 'Devolver em 2025')
+
+        # Editar um equipamento do termo também renova o fragmento
+        equipamento = self.termo.equipamentos.first()
+        equipamento.numero_serie = 'NOVA-SERIE'
+        equipamento.save()
+        self.assertContains(self.client.get(self.url), 'NOVA-SERIE')
+
+        self.colaborador.first_name = 'Beatriz'
+        self.colaborador.save()
+        self.assertContains(self.client.get(self.url), 'Beatriz')
+
+    def test_assinatura_renova_o_fragmento(self):
+        termo = criar_termo(self.colaborador, equipamentos=1)
+        url = reverse('documents:termo_detail', args=[termo.uuid])
+        self.assertContains(self.client.get(url), 'Pendente')
+        self.assertContains(self.client.get(url), 'id="formAssinatura"')
+        self.client.post(reverse('documents:termo_sign', args=[termo.uuid]), DADOS_ASSINATURA)
+        response = self.client.get(url)
+        self.assertContains(response, 'Hash de Verificação')
+        self.assertNotContains(response, 'id="formAssinatura"')
+
+    def test_detalhes_do_equipamento(self):
+        equipamento = self.termo.equipamentos.first()
+        url = reverse('documents:equipamento_detail', args=[equipamento.pk])
+        self.client.get(url)
+        equipamento.descricao = 'Tela trocada'
+        equipamento.save()
+        self.assertContains(self.client.get(url), 'Tela trocada')
+
+        # UPDATE direto, sem renovar a data de modificação: o fragmento continua valendo
+        Equipamento.objects.filter(pk=equipamento.pk).update(descricao='Ignorada')
+        self.assertContains(self.client.get(url), 'Tela trocada')
+
+
+class AssinaturaDigitalPDFTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.certificados = tempfile.mkdtemp()
+        cls.chave, cls.certificado = signing.criar_certificado_autoassinado(cls.certificados)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.certificados, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            DOCUMENTS_PDF_SIGNING={'KEY': self.chave, 'CERT': self.certificado},
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_pdf_assinado_e_valido(self):
+        caminho = renderizar_pdf_real(None, {'NOME': 'Ana'}, os.path.join(self.media_root, 'termo.pdf'))
+        signing.assinar_pdf(caminho, motivo='Teste', nome='Ana')
+
+        status, = signing.verificar_pdf(caminho)
+        self.assertTrue(status.intact and status.valid and status.trusted)
+        # O arquivo temporário da assinatura não fica para trás
+        self.assertEqual(os.listdir(self.media_root), ['termo.pdf'])
+
+    def test_assinante_carregado_uma_vez_por_configuracao(self):
+        assinante = signing.obter_assinante()
+        self.assertIs(signing.obter_assinante(), assinante)
+        self.assertIsNotNone(assinante.bytes_reservados)
+
+        with override_settings(DOCUMENTS_PDF_SIGNING={}):
+            self.assertFalse(signing.assinatura_habilitada())
+            with self.assertRaises(signing.AssinaturaPDFError):
+                signing.obter_assinante()
+        self.assertIsNot(signing.obter_assinante(), assinante)
+
+    def test_pdf_do_termo_assinado_na_geracao(self):
+        colaborador = User.objects.create_user(username='colaborador', first_name='Ana', last_name='Souza')
+        termo = criar_termo(colaborador, status=TermoResponsabilidade.Status.ASSINADO, hash_assinatura='abc123')
+        with mock.patch('documents.pdf.renderizar_pdf', side_effect=renderizar_pdf_real):
+            caminho = pdf.gerar_pdf_termo(termo)
+
+        status, = signing.verificar_pdf(caminho)
+        self.assertTrue(status.bottom_line)
+        with open(caminho, 'rb') as arquivo:
+            self.assertIn(b'abc123', arquivo.read())
+
+    def test_benchmark(self):
+        saida = StringIO()
+        call_command('benchmark_assinatura', assinaturas=2, certificado_teste=True, stdout=saida)
+        self.assertIn('assinaturas/s por núcleo', saida.getvalue())
+
+
+@override_settings(DOCUMENTS_PDF_SIGNING={})
+class AuditoriaTermosTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.colaborador = User.objects.create_user(username='colaborador', password='senha', first_name='Ana')
+
+    def criar_termo_assinado(self, gerar_pdf=True):
+        data_assinatura = timezone.now()
+        termo = criar_termo(self.colaborador, status=TermoResponsabilidade.Status.ASSINADO)
+        termo.data_assinatura = data_assinatura
+        termo.ip_assinatura = '10.0.0.1'
+        termo.hash_assinatura = auditoria.calcular_hash_assinatura(termo.uuid, 'colaborador', data_assinatura, '10.0.0.1')
+        termo.save()
+        if gerar_pdf:
+            with mock.patch('documents.pdf.renderizar_pdf', side_effect=renderizar_pdf_falso):
+                pdf.gerar_pdf_termo(termo)
+        return termo
+
+    def test_termos_integros_nao_tem_problemas(self):
+        termo = self.criar_termo_assinado()
+        self.criar_termo_assinado(gerar_pdf=False)
+        self.assertEqual(len(termo.digest_pdf), 64)
+
+        resultado = auditoria.auditar_termos()
+        self.assertEqual(resultado.problemas, [])
+        self.assertEqual((resultado.verificados, resultado.pdfs_lidos, resultado.sem_pdf), (2, 1, 1))
+
+    def test_detecta_pdf_alterado_arquivo_ausente_e_hash_divergente(self):
+        alterado = self.criar_termo_assinado()
+        with open(alterado.arquivo_pdf.path, 'ab') as arquivo:
+            arquivo.write(b'%% adulterado')
+        ausente = self.criar_termo_assinado()
+        os.remove(ausente.arquivo_pdf.path)
+        divergente = self.criar_termo_assinado(gerar_pdf=False)
+        TermoResponsabilidade.objects.filter(pk=divergente.pk).update(ip_assinatura='10.0.0.2')
+
+        problemas = dict(auditoria.auditar_termos().problemas)
+        self.assertIn('digest_pdf', problemas[alterado.uuid])
+        self.assertIn('não encontrado', problemas[ausente.uuid])
+        self.assertIn('hash_assinatura', problemas[divergente.uuid])
+
+    def test_hash_com_ip_sem_normalizacao_e_listado_a_parte(self):
+        termo = self.criar_termo_assinado(gerar_pdf=False)
+        self.assertEqual(
+            auditoria.calcular_hash_assinatura(termo.uuid, 'colaborador', termo.data_assinatura, '2001:DB8:0:0::1'),
+            auditoria.calcular_hash_assinatura(termo.uuid, 'colaborador', termo.data_assinatura, '2001:db8::1'),
+        )
+        # Assinado antes da normalização: hash do texto do cabeçalho, IP canônico no banco
+        TermoResponsabilidade.objects.filter(pk=termo.pk).update(
+            ip_assinatura='2001:db8::1',
+            hash_assinatura=auditoria._hash(termo.uuid, 'colaborador', termo.data_assinatura, '2001:DB8:0:0::1'),
+            observacoes='\n\nInformações da assinatura:\nIP: 2001:DB8:0:0::1\nDispositivo: Firefox',
+        )
+        resultado = auditoria.auditar_termos()
+        self.assertEqual((resultado.problemas, resultado.hashes_legados), ([], [termo.uuid]))
+
+        # Com outro IP nas observações continua sendo divergência
+        TermoResponsabilidade.objects.filter(pk=termo.pk).update(
+            observacoes='\n\nInformações da assinatura:\nIP: 2001:db8::2\nDispositivo: Firefox',
+        )
+        resultado = auditoria.auditar_termos()
+        self.assertEqual(resultado.hashes_legados, [])
+        self.assertIn('hash_assinatura', dict(resultado.problemas)[termo.uuid])
+
+    def test_primeira_auditoria_registra_digest_e_incremental_nao_rele(self):
+        termo = self.criar_termo_assinado()
+        TermoResponsabilidade.objects.filter(pk=termo.pk).update(digest_pdf='', digest_pdf_verificado_em=None)
+
+        resultado = auditoria.auditar_termos(incremental=True)
+        self.assertEqual(resultado.digests_registrados, 1)
+        termo.refresh_from_db()
+        self.assertEqual(termo.digest_pdf, auditoria.digest_arquivo(termo.arquivo_pdf.path))
+
+        resultado = auditoria.auditar_termos(incremental=True)
+        self.assertEqual((resultado.pdfs_lidos, resultado.pdfs_inalterados), (0, 1))
+
+        # Arquivo modificado depois da última verificação volta a ser lido
+        with open(termo.arquivo_pdf.path, 'ab') as arquivo:
+            arquivo.write(b'%% adulterado')
+        futuro = termo.digest_pdf_verificado_em.timestamp() + 60
+        os.utime(termo.arquivo_pdf.path, (futuro, futuro))
+        resultado = auditoria.auditar_termos(incremental=True)
+        self.assertEqual(resultado.pdfs_lidos, 1)
+        self.assertEqual(resultado.termos_com_problema, 1)
+
+    def test_pool_de_processos(self):
+        termos = [self.criar_termo_assinado() for _ in range(3)]
+        with open(termos[1].arquivo_pdf.path, 'ab') as arquivo:
+            arquivo.write(b'%% adulterado')
+
+        resultado = auditoria.auditar_termos(processos=2, tamanho_lote=1)
+        self.assertEqual(resultado.verificados, 3)
+        self.assertEqual([uuid for uuid, _ in resultado.problemas], [termos[1].uuid])
+
+    def test_comando_e_tela_de_staff(self):
+        termo = self.criar_termo_assinado()
+        TermoResponsabilidade.objects.filter(pk=termo.pk).update(hash_assinatura='0' * 64)
+
+        relatorio = os.path.join(self.media_root, 'relatorio.csv')
+        with self.assertRaises(CommandError):
+            call_command('auditar_termos', processos=1, verificar=True, relatorio=relatorio,
+                         stdout=StringIO(), stderr=StringIO())
+        with open(relatorio, encoding='utf-8') as arquivo:
+            self.assertIn(str(termo.uuid), arquivo.read())
+
+        url = reverse('documents:termo_auditoria')
+        self.client.force_login(self.colaborador)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(User.objects.create_user(username='admin', password='senha', is_staff=True))
+        response = self.client.post(url, {'incremental': 'on'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'hash_assinatura não confere')
+
+        # A tela audita só os termos mais recentes; o antigo com problema fica para o comando
+        self.criar_termo_assinado()
+        with self.settings(DOCUMENTS_AUDITORIA_LIMITE=1):
+            response = self.client.post(url, {'incremental': 'on'})
+        self.assertEqual(response.context['resultado'].verificados, 1)
+        self.assertEqual(response.context['resultado'].problemas, [])
+        self.assertNotContains(response, str(termo.uuid))
+
+
+class RegeneracaoPDFsTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.colaborador = User.objects.create_user(username='colaborador', password='senha', first_name='Ana')
+        self.modelo = DocumentoModelo.objects.create(titulo='Termo', conteudo='<p>${NOME}</p>', versao='1')
+        renderizar = mock.patch('documents.pdf.renderizar_pdf', side_effect=renderizar_pdf_falso)
+        self.renderizar = renderizar.start()
+        self.addCleanup(renderizar.stop)
+
+    def criar_termo_assinado(self, modelo=None):
+        return criar_termo(self.colaborador, modelo=modelo or self.modelo, equipamentos=2,
+                           status=TermoResponsabilidade.Status.ASSINADO, data_assinatura=timezone.now())
+
+    def arquivos(self):
+        return sorted(os.listdir(os.path.join(self.media_root, 'documentos', 'termos')))
+
+    def test_gerar_pdf_substitui_o_arquivo_sem_duplicar(self):
+        termo = self.criar_termo_assinado()
+        pdf.gerar_pdf_termo(termo)
+        pdf.gerar_pdf_termo(termo)
+        termo.refresh_from_db()
+        self.assertEqual(termo.arquivo_pdf.name, f'documentos/termos/termo_{termo.uuid}.pdf')
+        self.assertEqual(self.arquivos(), [f'termo_{termo.uuid}.pdf'])
+        self.assertEqual(termo.digest_pdf, auditoria.digest_arquivo(termo.arquivo_pdf.path))
+
+    def test_lotes_de_um_unico_modelo_e_gravacao_em_lote(self):
+        outro_modelo = DocumentoModelo.objects.create(titulo='Outro', conteudo='<p>${NOME}</p>', versao='1')
+        termos = [self.criar_termo_assinado(), self.criar_termo_assinado(outro_modelo), self.criar_termo_assinado()]
+        pendente = criar_termo(self.colaborador, modelo=self.modelo)
+
+        lotes = list(regeneracao._lotes(TermoResponsabilidade.objects.all(), tamanho_lote=10))
+        self.assertEqual([[termo.modelo_id for termo, _ in lote] for lote in lotes],
+                         [[self.modelo.pk] * 3, [outro_modelo.pk]])
+        self.assertEqual(len(lotes[0][0][1]['EQUIPAMENTOS']), 2)
+
+        with self.assertNumQueries(16):
+            # Termos, itens e, por modelo, a reserva das travas (UPDATE e
+            # SELECT) e uma transação com o UPDATE em lote dos termos, o das
+            # tarefas pendentes na fila e a liberação das travas
+            resultado = regeneracao.regenerar_pdfs(
+                TermoResponsabilidade.objects.filter(status=TermoResponsabilidade.Status.ASSINADO)
+            )
+        self.assertEqual((resultado.gerados, resultado.erros), (3, []))
+        for termo in termos:
+            termo.refresh_from_db()
+            self.assertEqual(termo.status_pdf, TermoResponsabilidade.StatusPDF.GERADO)
+            self.assertEqual(termo.digest_pdf, auditoria.digest_arquivo(termo.arquivo_pdf.path))
+        pendente.refresh_from_db()
+        self.assertFalse(pendente.arquivo_pdf)
+
+    def test_termo_em_geracao_por_outro_processo_fica_de_fora(self):
+        ocupado, livre = self.criar_termo_assinado(), self.criar_termo_assinado()
+        with trava_geracao(ocupado) as obtida:
+            self.assertTrue(obtida)
+            resultado = regeneracao.regenerar_pdfs(TermoResponsabilidade.objects.all())
+        self.assertEqual((resultado.gerados, resultado.ocupados), (1, [ocupado.uuid]))
+        ocupado.refresh_from_db()
+        livre.refresh_from_db()
+        self.assertFalse(ocupado.arquivo_pdf)
+        self.assertTrue(livre.arquivo_pdf)
+        # As travas obtidas pela regeneração são liberadas
+        self.assertIsNone(livre.geracao_pdf_iniciada_em)
+        self.assertIsNone(ocupado.geracao_pdf_iniciada_em)
+
+    def test_pool_com_falha_preserva_o_pdf_anterior(self):
+        termo = self.criar_termo_assinado()
+        pdf.gerar_pdf_termo(termo)
+        termo.refresh_from_db()
+        with open(termo.arquivo_pdf.path, 'rb') as arquivo:
+            original = arquivo.read()
+
+        # Nos workers não há mock: o modelo sem arquivo Word nem conteúdo faz a geração falhar
+        DocumentoModelo.objects.filter(pk=self.modelo.pk).update(conteudo='')
+        resultado = regeneracao.regenerar_pdfs(TermoResponsabilidade.objects.all(), processos=2, tamanho_lote=1)
+        self.assertEqual(resultado.gerados, 0)
+        self.assertEqual([uuid for uuid, _ in resultado.erros], [termo.uuid])
+        self.assertIn('arquivo Word', resultado.erros[0][1])
+        with open(termo.arquivo_pdf.path, 'rb') as arquivo:
+            self.assertEqual(arquivo.read(), original)
+        self.assertEqual(self.arquivos(), [f'termo_{termo.uuid}.pdf'])
+
+    def test_comando_com_filtros(self):
+        sem_pdf = self.criar_termo_assinado()
+        com_pdf = self.criar_termo_assinado()
+        pdf.gerar_pdf_termo(com_pdf)
+        TermoResponsabilidade.objects.filter(pk=com_pdf.pk).update(status_pdf=TermoResponsabilidade.StatusPDF.GERADO)
+        # Já na fila: fica com os workers
+        na_fila = self.criar_termo_assinado()
+        tarefa = enfileirar_geracao_pdf(na_fila)
+
+        saida = StringIO()
+        call_command('regenerate_termo_pdfs', sem_pdf=True, simular=True, stdout=saida)
+        self.assertIn('1 termo(s) seriam regenerado(s)', saida.getvalue())
+
+        saida = StringIO()
+        call_command('regenerate_termo_pdfs', sem_pdf=True, processos=1, stdout=saida)
+        self.assertRegex(saida.getvalue(), r'1 PDF\(s\) gerado\(s\) em [\d.]+s \([\d.]+/s\), 0 erro\(s\), 0 em geração')
+        sem_pdf.refresh_from_db()
+        self.assertEqual(sem_pdf.status_pdf, TermoResponsabilidade.StatusPDF.GERADO)
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, TarefaPDF.Status.PENDENTE)
+
+        # Regenerado pelo comando, o termo tem a tarefa da fila concluída
+        call_command('regenerate_termo_pdfs', uuid=[str(na_fila.uuid)], processos=1, stdout=StringIO())
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, TarefaPDF.Status.CONCLUIDA)
+        self.assertEqual(processar_fila(), 0)
+
+        with self.assertRaises(CommandError):
+            call_command('regenerate_termo_pdfs', '--desde', 'ontem', stdout=StringIO())
+
+
+class BenchmarkPortalTests(TestCase):
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio, ignore_errors=True)
+
+    def test_resultados_em_json_sem_manter_os_dados(self):
+        saida = os.path.join(self.diretorio, 'resultado.json')
+        call_command('benchmark_portal', colaboradores=2, termos=3, requisicoes=2, repeticoes=2,
+                     saida=saida, stdout=StringIO())
+
+        with open(saida, encoding='utf-8') as arquivo:
+            relatorio = json.load(arquivo)
+        resultados = relatorio['resultados']
+        for nome in ('substituicao_placeholders', 'preenchimento_html', 'renderizacao_pdf_html'):
+            self.assertGreater(resultados[nome]['mediana_ms'], 0)
+        for nome in ('assinatura', 'download_com_geracao', 'download', 'lista_termos',
+                     'dashboard_admin', 'dashboard_colaborador'):
+            self.assertEqual((resultados[nome]['amostras'], resultados[nome]['erros']), (2, 0), nome)
+        self.assertFalse(User.objects.filter(username__startswith='benchmark-portal').exists())
+        self.assertFalse(TermoResponsabilidade.objects.exists())
+
+        # Uma referência muito mais rápida que a execução atual é uma regressão
+        referencia = os.path.join(self.diretorio, 'referencia.json')
+        for resultado in resultados.values():
+            resultado['mediana_ms'] /= 100
+        with open(referencia, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo)
+        with self.assertRaisesMessage(CommandError, 'renderizacao_pdf_html'):
+            call_command('benchmark_portal', colaboradores=2, termos=0, requisicoes=1, repeticoes=1,
+                         comparar=referencia, verificar=True, stdout=StringIO())
+
+
+class ImportacaoPreguicosaTests(SimpleTestCase):
+    def test_dependencias_pesadas_nao_sao_importadas_na_subida(self):
+        saida = StringIO()
+        call_command('benchmark_importacao', repeticoes=1, verificar=True, stdout=saida)
+        self.assertIn('Importação: mediana', saida.getvalue())
@@ -13,16 +13,21 @@ urlpatterns = [
     # Equipamentos
     path('equipamentos/', views.EquipamentoListView.as_view(), name='equipamento_list'),
     path('equipamentos/novo/', views.EquipamentoCreateView.as_view(), name='equipamento_create'),
+    path('equipamentos/importar/', views.EquipamentoImportView.as_view(), name='equipamento_import'),
+    path('equipamentos/exportar/', views.EquipamentoExportView.as_view(), name='equipamento_export'),
     path('equipamentos/<int:pk>/', views.EquipamentoDetailView.as_view(), name='equipamento_detail'),
     path('equipamentos/<int:pk>/editar/', views.EquipamentoUpdateView.as_view(), name='equipamento_update'),
     
     # Termos
     path('termos/', views.TermoListView.as_view(), name='termo_list'),
     path('termos/novo/', views.TermoCreateView.as_view(), name='termo_create'),
+    path('termos/lote/', views.TermoBulkCreateView.as_view(), name='termo_bulk_create'),
+    path('termos/auditoria/', views.AuditoriaTermosView.as_view(), name='termo_auditoria'),
     path('termos/<uuid:uuid>/', views.TermoDetailView.as_view(), name='termo_detail'),
     path('termos/<uuid:uuid>/assinar/', views.TermoSignView.as_view(), name='termo_sign'),
     path('termos/<uuid:uuid>/preview/', views.TermoPreviewView.as_view(), name='termo_preview'),
     path('termos/<uuid:uuid>/download/', views.TermoDownloadView.as_view(), name='termo_download'),
+    path('termos/<uuid:uuid>/pdf-status/', views.TermoPDFStatusView.as_view(), name='termo_pdf_status'),
     path('termos/<uuid:uuid>/editar/', views.TermoUpdateView.as_view(), name='termo_update'),
     
     # Modelos de Documento
@@ -1,63 +1,132 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 from django.utils import timezone
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, FormView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.contrib.auth.decorators import login_required
-from django.utils.decorators import method_decorator
-from django.http import HttpResponse, Http404, FileResponse
+from django.http import (
+    HttpResponse, HttpResponseNotModified, HttpResponseRedirect, Http404, FileResponse, JsonResponse,
+    StreamingHttpResponse,
+)
 from django.conf import settings
 from django.contrib import messages
-from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Max, TextField, Value
+from django.db.models.functions import Concat
 import os
-import hashlib
-import pythoncom
-from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER
-from reportlab.lib import colors
-from bs4 import BeautifulSoup
+import mimetypes
 from .models import Equipamento, DocumentoModelo, TermoResponsabilidade, ItemTermo
 
-from .forms import ModeloDocumentoForm
-from django.urls import reverse_lazy
-from reportlab.pdfgen import canvas
-import io
-from tinymce.widgets import TinyMCE
-from django.core.exceptions import PermissionDenied
-from xhtml2pdf import pisa
-from django.template.loader import get_template
-from django.template import Context
+from .forms import AuditoriaTermosForm, ImportacaoEquipamentosForm, ModeloDocumentoForm, TermosLoteForm
+from .auditoria import IP_NAO_IDENTIFICADO, auditar_termos, calcular_hash_assinatura, normalizar_ip
+from .bulk import LoteInvalido, criar_termos_em_lote, ler_linhas
+from .inventario import (
+    XLSX_AVAILABLE, ArquivoInvalido, exportar_csv, exportar_xlsx, importar_equipamentos, ler_arquivo,
+)
+from .pdf import gerar_pdf_termo
+from .downloads import servir_arquivo
+from .previews import chave_previa, montar_contexto_previa, obter_previa
+from .tasks import enfileirar_geracao_pdf, gerar_pdf_sob_demanda
+from django.urls import reverse, reverse_lazy
+from django.contrib.auth import get_user_model
+from core import busca
+from core.estatisticas import invalidar_estatisticas
+from core.pagination import KeysetPaginationMixin
+from django.core.exceptions import PermissionDenied, SuspiciousFileOperation
+from django.utils._os import safe_join
 import tempfile
-import requests
 import logging
 
 # Configurar logger
 logger = logging.getLogger(__name__)
 
-try:
-    from docx import Document
-    from docx2pdf import convert as docx2pdf_convert
-    DOCX_AVAILABLE = True
-except ImportError:
-    DOCX_AVAILABLE = False
-    logger.warning("Bibliotecas docx e docx2pdf não disponíveis. Conversão de Word para PDF não será suportada.")
-
 # Create your views here.
 
+def colaboradores_para_filtro():
+    return get_user_model().objects.order_by('first_name', 'last_name').only('pk', 'username', 'first_name', 'last_name')
+
 # Views de Equipamento
-class EquipamentoListView(LoginRequiredMixin, ListView):
+class EquipamentoListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Equipamento
     template_name = 'documents/equipamento_list.html'
     context_object_name = 'equipamentos'
+    filtros = {
+        'status': 'status',
+        'tipo': 'tipo',
+        'colaborador': 'usuario',
+        'de': 'data_aquisicao__gte',
+        'ate': 'data_aquisicao__lte',
+    }
+    ordenacoes = {
+        'recentes': ('Aquisição mais recente', ['-data_aquisicao']),
+        'antigos': ('Aquisição mais antiga', ['data_aquisicao']),
+        'numero_serie': ('Número de série', ['numero_serie']),
+        'valor': ('Maior valor', ['-valor']),
+    }
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['tipos'] = Equipamento.TIPO_CHOICES
+        context['status_choices'] = Equipamento.STATUS_CHOICES
+        context['colaboradores'] = colaboradores_para_filtro()
+        return context
+
+class EquipamentoImportView(UserPassesTestMixin, FormView):
+    form_class = ImportacaoEquipamentosForm
+    template_name = 'documents/equipamento_import.html'
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def form_valid(self, form):
+        arquivo = form.cleaned_data['arquivo']
+        simular = form.cleaned_data['simular']
+        try:
+            resultado = importar_equipamentos(ler_arquivo(arquivo.file, arquivo.name), simular=simular)
+        except (ArquivoInvalido, UnicodeDecodeError) as e:
+            form.add_error('arquivo', str(e))
+            return self.form_invalid(form)
+        
+        verbo = 'seriam' if simular else 'foram'
+        messages.success(
+            self.request,
+            f"{resultado.criados} equipamento(s) {verbo} criado(s) e {resultado.atualizados} {verbo} atualizado(s)."
+        )
+        if not resultado.total_erros and not simular:
+            return redirect('documents:equipamento_list')
+        return self.render_to_response(self.get_context_data(form=form, resultado=resultado))
+
+class EquipamentoExportView(UserPassesTestMixin, View):
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        data = timezone.localdate().strftime('%Y%m%d')
+        if request.GET.get('formato') == 'xlsx':
+            if not XLSX_AVAILABLE:
+                messages.error(request, "Exportação para XLSX indisponível: instale a biblioteca openpyxl.")
+                return redirect('documents:equipamento_list')
+            arquivo = tempfile.TemporaryFile()
+            exportar_xlsx(arquivo)
+            arquivo.seek(0)
+            return FileResponse(
+                arquivo, as_attachment=True, filename=f'equipamentos_{data}.xlsx',
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
+        
+        response = StreamingHttpResponse(exportar_csv(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="equipamentos_{data}.csv"'
+        return response
 
 class EquipamentoDetailView(LoginRequiredMixin, DetailView):
     model = Equipamento
     template_name = 'documents/equipamento_detail.html'
     context_object_name = 'equipamento'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cache_timeout'] = settings.DOCUMENTS_FRAGMENT_CACHE_TIMEOUT
+        return context
+
 class EquipamentoCreateView(LoginRequiredMixin, CreateView):
     model = Equipamento
     template_name = 'documents/equipamento_form.html'
@@ -119,15 +188,36 @@ class DocumentoModeloUpdateView(UserPassesTestMixin, UpdateView):
         return self.request.user.is_staff
 
 # Views de Termo de Responsabilidade
-class TermoListView(LoginRequiredMixin, ListView):
+class TermoListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = TermoResponsabilidade
+    # colaborador é exibido em cada linha da listagem
+    queryset = TermoResponsabilidade.objects.select_related('colaborador')
     template_name = 'documents/termo_list.html'
     context_object_name = 'termos'
+    filtros = {
+        'status': 'status',
+        'colaborador': 'colaborador',
+        'de': 'data_assinatura__date__gte',
+        'ate': 'data_assinatura__date__lte',
+    }
+    ordenacoes = {
+        'recentes': ('Mais recentes', ['-pk']),
+        'antigos': ('Mais antigos', ['pk']),
+        'status': ('Status', ['status', '-pk']),
+    }
     
     def get_queryset(self):
+        queryset = super().get_queryset()
         if self.request.user.is_staff:
-            return TermoResponsabilidade.objects.all()
-        return TermoResponsabilidade.objects.filter(colaborador=self.request.user)
+            return queryset
+        return queryset.filter(colaborador=self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['status_choices'] = TermoResponsabilidade.Status.choices
+        if self.request.user.is_staff:
+            context['colaboradores'] = colaboradores_para_filtro()
+        return context
 
 class TermoDetailView(LoginRequiredMixin, DetailView):
     model = TermoResponsabilidade
@@ -137,23 +227,31 @@ class TermoDetailView(LoginRequiredMixin, DetailView):
     slug_url_kwarg = 'uuid'
     
     def get_queryset(self):
+        # A última modificação dos equipamentos entra na chave do cache dos
+        # detalhes: editar um equipamento também renova o fragmento
+        queryset = TermoResponsabilidade.objects.select_related('colaborador', 'modelo').annotate(
+            equipamentos_modificados=Max('itemtermo__equipamento__data_modificacao')
+        )
         if self.request.user.is_staff:
-            return TermoResponsabilidade.objects.all()
-        return TermoResponsabilidade.objects.filter(colaborador=self.request.user)
+            return queryset
+        return queryset.filter(colaborador=self.request.user)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        termo = self.get_object()
+        termo = self.object
         
-        # Adicionar o conteúdo do modelo ao contexto
-        if termo.modelo:
-            context['conteudo_documento'] = termo.modelo.conteudo
-            
         # Verificar se o usuário pode assinar
         context['pode_assinar'] = (
             termo.status == 'PENDENTE' and 
             termo.colaborador == self.request.user
         )
+        # Só é consultado se o fragmento não estiver em cache (ou no formulário de assinatura)
+        context['itens'] = termo.itemtermo_set.select_related('equipamento')
+        context['cache_timeout'] = (
+            settings.DOCUMENTS_FRAGMENT_CACHE_TIMEOUT_ASSINADO
+            if termo.status == TermoResponsabilidade.Status.ASSINADO
+            else settings.DOCUMENTS_FRAGMENT_CACHE_TIMEOUT
+        )
         
         return context
 
@@ -170,17 +268,81 @@ class TermoCreateView(UserPassesTestMixin, CreateView):
         form.instance.status = 'PENDENTE'
         self.object = form.save(commit=False)
         self.object.save()
-        form.instance.equipamentos.clear()
         
-        for equipamento in form.cleaned_data['equipamentos']:
-            ItemTermo.objects.create(
+        # Os itens são criados aqui, com os dados da entrega; o save_m2m do
+        # formulário não é chamado para não regravar a relação
+        ItemTermo.objects.bulk_create([
+            ItemTermo(
                 termo=self.object,
                 equipamento=equipamento,
-                data_entrega=timezone.now(),
+                data_entrega=timezone.localdate(),
                 estado_entrega='Novo'
             )
+            for equipamento in form.cleaned_data['equipamentos']
+        ])
         
-        return super().form_valid(form)
+        return HttpResponseRedirect(self.get_success_url())
+
+class TermoBulkCreateView(UserPassesTestMixin, FormView):
+    form_class = TermosLoteForm
+    template_name = 'documents/termo_bulk_form.html'
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def form_valid(self, form):
+        arquivo = form.cleaned_data['arquivo']
+        try:
+            linhas = ler_linhas(arquivo.read(), nome_arquivo=arquivo.name)
+        except (LoteInvalido, UnicodeDecodeError) as e:
+            form.add_error('arquivo', str(e))
+            return self.form_invalid(form)
+        
+        resultado = criar_termos_em_lote(linhas, parcial=form.cleaned_data['parcial'])
+        logger.info(f"Criação em lote: {len(resultado.termos)} termo(s) criado(s), {len(resultado.erros)} linha(s) com erro")
+        if resultado.termos:
+            messages.success(self.request, f"{len(resultado.termos)} termo(s) criado(s) com sucesso.")
+        if resultado.erros and not resultado.termos:
+            messages.error(self.request, "Nenhum termo foi criado. Corrija as linhas com erro e envie o arquivo novamente.")
+        if not resultado.erros:
+            return redirect('documents:termo_list')
+        return self.render_to_response(self.get_context_data(form=form, resultado=resultado, total_linhas=len(linhas)))
+
+class AuditoriaTermosView(UserPassesTestMixin, FormView):
+    form_class = AuditoriaTermosForm
+    template_name = 'documents/termo_auditoria.html'
+    max_problemas_exibidos = 500
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_context_data(self, **kwargs):
+        kwargs.setdefault('limite', self.limite())
+        return super().get_context_data(**kwargs)
+
+    def limite(self):
+        return getattr(settings, 'DOCUMENTS_AUDITORIA_LIMITE', 2000)
+
+    def form_valid(self, form):
+        # Só os termos mais recentes (pk crescente acompanha a criação): uma
+        # auditoria do acervo inteiro não cabe no tempo de uma requisição
+        termos = TermoResponsabilidade.objects.filter(status=TermoResponsabilidade.Status.ASSINADO)
+        corte = termos.order_by('-pk').values_list('pk', flat=True)[self.limite() - 1:self.limite()].first()
+        if corte is not None:
+            termos = termos.filter(pk__gte=corte)
+        resultado = auditar_termos(
+            processos=getattr(settings, 'DOCUMENTS_AUDITORIA_PROCESSOS', 1),
+            incremental=form.cleaned_data['incremental'],
+            assinatura_digital=form.cleaned_data['assinatura_digital'],
+            queryset=termos,
+        )
+        if resultado.problemas:
+            messages.error(self.request, f"{resultado.termos_com_problema} termo(s) com problema de integridade.")
+        else:
+            messages.success(self.request, f"{resultado.verificados} termo(s) verificado(s), nenhum problema encontrado.")
+        return self.render_to_response(self.get_context_data(
+            form=form, resultado=resultado, problemas=resultado.problemas[:self.max_problemas_exibidos],
+        ))
 
 class TermoUpdateView(UserPassesTestMixin, UpdateView):
     model = TermoResponsabilidade
@@ -204,7 +366,7 @@ class TermoUpdateView(UserPassesTestMixin, UpdateView):
 class TermoSignView(LoginRequiredMixin, View):
     def get(self, request, uuid):
         try:
-            termo = TermoResponsabilidade.objects.get(uuid=uuid)
+            termo = TermoResponsabilidade.objects.select_related('colaborador', 'modelo').get(uuid=uuid)
         except TermoResponsabilidade.DoesNotExist:
             messages.error(request, "Termo não encontrado.")
             return redirect('documents:termo_list')
@@ -235,7 +397,7 @@ class TermoSignView(LoginRequiredMixin, View):
         }
         
         # Obtém os equipamentos associados ao termo através da relação ItemTermo
-        itens_termo = ItemTermo.objects.filter(termo=termo)
+        itens_termo = list(ItemTermo.objects.filter(termo=termo).select_related('equipamento'))
         equipamentos = [item.equipamento for item in itens_termo]
         
         context = {
@@ -249,7 +411,7 @@ class TermoSignView(LoginRequiredMixin, View):
     
     def post(self, request, uuid):
         try:
-            termo = TermoResponsabilidade.objects.get(uuid=uuid)
+            termo = TermoResponsabilidade.objects.select_related('colaborador', 'modelo').get(uuid=uuid)
         except TermoResponsabilidade.DoesNotExist:
             messages.error(request, "Termo não encontrado.")
             return redirect('documents:termo_list')
@@ -274,39 +436,6 @@ class TermoSignView(LoginRequiredMixin, View):
                 messages.error(request, f"O campo {field.title()} é obrigatório.")
                 return redirect('documents:termo_sign', uuid=termo.uuid)
         
-        # Atualiza os dados do colaborador
-        user = termo.colaborador
-        user.cpf = form_data.get('cpf')
-        user.rg = form_data.get('rg')
-        user.endereco = form_data.get('endereco')
-        user.numero = form_data.get('numero', '')
-        user.complemento = form_data.get('complemento', '')
-        user.bairro = form_data.get('bairro')
-        user.cidade = form_data.get('cidade')
-        user.estado = form_data.get('estado')
-        user.cep = form_data.get('cep')
-        user.save()
-        
-        # Atualiza o estado dos equipamentos e vincula o usuário aos equipamentos
-        # Obter equipamentos associados ao termo através da relação ItemTermo
-        itens_termo = ItemTermo.objects.filter(termo=termo)
-        for item in itens_termo:
-            equip = item.equipamento
-            # Atribuir o usuário ao equipamento
-            equip.usuario = user
-            equip.status = 'EM_USO'  # Atualiza o status do equipamento para Em Uso
-            equip.save()
-            
-            # Atualiza o estado de entrega se tiver sido informado
-            estado_key = f"estado_{equip.id}"
-            if estado_key in form_data:
-                item.estado_entrega = form_data.get(estado_key)
-                item.save()
-        
-        # Processa a assinatura
-        termo.status = TermoResponsabilidade.Status.ASSINADO
-        termo.data_assinatura = timezone.now()
-        
         # Capturar o IP do cliente de forma mais completa
         # Tenta vários cabeçalhos HTTP para identificar o IP real do cliente
         cliente_ip = None
@@ -323,166 +452,97 @@ class TermoSignView(LoginRequiredMixin, View):
         # Captura informações do navegador/dispositivo
         user_agent = request.META.get('HTTP_USER_AGENT', 'Navegador não identificado')
         
-        # Usa o IP capturado ou "não identificado" se não encontrado
-        termo.ip_assinatura = cliente_ip or "IP não identificado"
-        
+        # A assinatura inteira acontece em uma transação. O primeiro comando é um
+        # UPDATE condicional, que bloqueia a linha do termo e só tem efeito se ele
+        # ainda não estiver assinado: de dois envios simultâneos, apenas um assina
+        data_assinatura = timezone.now()
+        # Os cabeçalhos podem trazer qualquer texto: só um endereço válido é
+        # gravado no campo de IP, já na forma canônica que também entra no
+        # hash; sem ele o campo fica vazio e o texto registra "não identificado"
+        ip_assinatura = normalizar_ip(cliente_ip)
         # Adiciona informações do dispositivo usado para assinatura
-        termo.observacoes += f"\n\nInformações da assinatura:\nIP: {termo.ip_assinatura}\nDispositivo: {user_agent}"
-        
-        # Gera hash para a assinatura
-        signature_data = f"{termo.uuid}_{termo.colaborador.username}_{termo.data_assinatura.isoformat()}_{termo.ip_assinatura}"
-        termo.hash_assinatura = hashlib.sha256(signature_data.encode()).hexdigest()
+        informacoes = f"\n\nInformações da assinatura:\nIP: {ip_assinatura or IP_NAO_IDENTIFICADO}\nDispositivo: {user_agent}"
+        
+        with transaction.atomic():
+            assinado = TermoResponsabilidade.objects.filter(pk=termo.pk).exclude(
+                status=TermoResponsabilidade.Status.ASSINADO
+            ).update(
+                status=TermoResponsabilidade.Status.ASSINADO,
+                data_assinatura=data_assinatura,
+                ip_assinatura=ip_assinatura,
+                hash_assinatura=calcular_hash_assinatura(termo.uuid, termo.colaborador.username, data_assinatura, ip_assinatura),
+                observacoes=Concat('observacoes', Value(informacoes), output_field=TextField()),
+                data_modificacao=data_assinatura,
+            )
+            if not assinado:
+                messages.warning(request, "Este termo já foi assinado.")
+                return redirect('documents:termo_detail', uuid=termo.uuid)
+            termo = TermoResponsabilidade.objects.select_for_update().select_related('colaborador', 'modelo').get(pk=termo.pk)
+            
+            # Atualiza os dados do colaborador
+            user = termo.colaborador
+            user.cpf = form_data.get('cpf')
+            user.rg = form_data.get('rg')
+            user.endereco = form_data.get('endereco')
+            user.numero = form_data.get('numero', '')
+            user.complemento = form_data.get('complemento', '')
+            user.bairro = form_data.get('bairro')
+            user.cidade = form_data.get('cidade')
+            user.estado = form_data.get('estado')
+            user.cep = form_data.get('cep')
+            user.save(update_fields=['cpf', 'rg', 'endereco', 'numero', 'complemento', 'bairro', 'cidade', 'estado', 'cep'])
+            
+            # Vincula os equipamentos ao colaborador com um único UPDATE e grava
+            # de uma vez o estado de entrega informado para cada item
+            itens_termo = list(ItemTermo.objects.filter(termo=termo).only('pk', 'equipamento_id', 'estado_entrega'))
+            equipamentos = Equipamento.objects.filter(pk__in=[item.equipamento_id for item in itens_termo])
+            equipamentos.update(usuario=user, status='EM_USO', data_modificacao=data_assinatura)
+            alterados = []
+            for item in itens_termo:
+                estado = form_data.get(f"estado_{item.equipamento_id}")
+                if estado and estado != item.estado_entrega:
+                    item.estado_entrega = estado
+                    alterados.append(item)
+            if alterados:
+                ItemTermo.objects.bulk_update(alterados, ['estado_entrega'])
+            
+            # UPDATEs em lote não disparam post_save: o índice de busca (novo dono
+            # dos equipamentos, status do termo) é atualizado aqui
+            busca.indexar_queryset(equipamentos)
+            busca.indexar([termo])
         
-        termo.save()
+        invalidar_estatisticas()
         
-        # Gerar o PDF do termo
-        self.gerar_pdf_termo(termo)
+        # A geração do PDF fica com os workers da fila; o signatário não espera a conversão
+        enfileirar_geracao_pdf(termo)
         
-        messages.success(request, "Termo assinado com sucesso!")
+        messages.success(request, "Termo assinado com sucesso! O PDF está sendo gerado.")
         return redirect('documents:termo_detail', uuid=termo.uuid)
     
     def gerar_pdf_termo(self, termo, custom_path=None):
-        """
-        Gera o PDF do termo de responsabilidade assinado usando uma abordagem mais simples
-        
-        Args:
-            termo: Objeto TermoResponsabilidade
-            custom_path: Caminho personalizado para o arquivo PDF (opcional)
-        """
-        logger.info(f"Iniciando geração de PDF para termo {termo.uuid}")
-        
-        # Verificar o modelo
-        if not termo.modelo:
-            logger.error(f"Termo {termo.uuid} não possui modelo associado")
-            raise Exception("O termo não possui um modelo de documento associado.")
+        """Mantido por compatibilidade; a geração fica em documents.pdf."""
+        return gerar_pdf_termo(termo, custom_path=custom_path)
 
-        # Extrair o user_agent das observações, se existir
-        user_agent = None
-        if termo.observacoes and 'Dispositivo:' in termo.observacoes:
-            try:
-                for linha in termo.observacoes.split('\n'):
-                    if linha.strip().startswith('Dispositivo:'):
-                        user_agent = linha.replace('Dispositivo:', '').strip()
-                        break
-            except Exception as e:
-                logger.error(f"Erro ao extrair user_agent: {e}")
-        
-        # Configuração do caminho do PDF
-        if custom_path:
-            pdf_path = custom_path
-        else:
-            media_root = settings.MEDIA_ROOT
-            pdf_dir = os.path.join(media_root, 'documentos', 'termos')
-            os.makedirs(pdf_dir, exist_ok=True)
-            file_name = f"termo_{termo.uuid}.pdf"
-            pdf_path = os.path.join(pdf_dir, file_name)
-        
-        # Verificar se existe um arquivo Word associado ao modelo e se as bibliotecas necessárias estão disponíveis
-        if DOCX_AVAILABLE and termo.modelo and termo.modelo.arquivo_word:
-            logger.info(f"Gerando PDF a partir do arquivo Word: {termo.modelo.arquivo_word.path}")
-            
-            # Verificar se o arquivo Word existe
-            if not os.path.exists(termo.modelo.arquivo_word.path):
-                logger.error(f"Arquivo Word não encontrado: {termo.modelo.arquivo_word.path}")
-                raise Exception(f"Arquivo do modelo não encontrado: {termo.modelo.arquivo_word.path}")
-            
-            try:
-                # Criar um arquivo temporário para trabalhar com o Word
-                with tempfile.NamedTemporaryFile(suffix='.docx', delete=False) as temp_docx:
-                    temp_docx_path = temp_docx.name
-                    with open(termo.modelo.arquivo_word.path, 'rb') as original_file:
-                        temp_docx.write(original_file.read())
-                
-                # Substituir placeholders no documento Word
-                doc = Document(temp_docx_path)
-                user = termo.colaborador
-                nome_completo = f"{user.first_name} {user.last_name}"
-                
-                # Obter o endereço completo
-                endereco_completo = f"{user.endereco}, {user.numero}"
-                if user.complemento:
-                    endereco_completo += f", {user.complemento}"
-                endereco_completo += f", {user.bairro}, {user.cidade}/{user.estado}, CEP: {user.cep}"
-                
-                # Placeholders para substituir
-                placeholders = {
-                    "${NOME}": nome_completo,
-                    "${CPF}": user.cpf or "",
-                    "${RG}": user.rg or "",
-                    "${ENDERECO}": user.endereco or "",
-                    "${NUMERO}": user.numero or "",
-                    "${COMPLEMENTO}": user.complemento or "",
-                    "${BAIRRO}": user.bairro or "",
-                    "${CIDADE}": user.cidade or "",
-                    "${ESTADO}": user.estado or "",
-                    "${CEP}": user.cep or "",
-                    "${ENDERECO_COMPLETO}": endereco_completo,
-                    "${DATA_ASSINATURA}": termo.data_assinatura.strftime("%d/%m/%Y") if termo.data_assinatura else "",
-                    "${IP_ASSINATURA}": termo.ip_assinatura or "",
-                    "${DISPOSITIVO_ASSINATURA}": user_agent if 'user_agent' in locals() else "",
-                    "${HASH_ASSINATURA}": termo.hash_assinatura or "",
-                }
-                
-                # Adicionar informações dos equipamentos para a tabela
-                itens_termo = ItemTermo.objects.filter(termo=termo)
-                equipamentos = [item.equipamento for item in itens_termo]
-                
-                # Para cada equipamento, adicione placeholders específicos
-                for i, equip in enumerate(equipamentos):
-                    placeholders[f"${{EQUIP_{i+1}_DESCRICAO}}"] = f"{equip.tipo} {equip.marca} {equip.modelo} - {equip.numero_serie}"
-                    placeholders[f"${{EQUIP_{i+1}_VALOR}}"] = f"R$ {equip.valor:.2f}".replace('.', ',')
-                
-                # Placeholder para valor total
-                total_valor = sum(equip.valor for equip in equipamentos)
-                placeholders["${VALOR_TOTAL}"] = f"R$ {total_valor:.2f}".replace('.', ',')
-                
-                # Procurar e substituir texto em todos os parágrafos
-                for paragraph in doc.paragraphs:
-                    for key, value in placeholders.items():
-                        if key in paragraph.text:
-                            paragraph.text = paragraph.text.replace(key, str(value or ""))
-                
-                # Procurar e substituir texto em todas as tabelas
-                for table in doc.tables:
-                    for row in table.rows:
-                        for cell in row.cells:
-                            for paragraph in cell.paragraphs:
-                                for key, value in placeholders.items():
-                                    if key in paragraph.text:
-                                        paragraph.text = paragraph.text.replace(key, str(value or ""))
-                
-                # Salvar o documento com as substituições
-                doc.save(temp_docx_path)
-                
-                # Converter o arquivo docx para PDF
-                try:
-                    pythoncom.CoInitialize()
-                    docx2pdf_convert(temp_docx_path, pdf_path)
-                    pythoncom.CoUninitialize()
-                except ImportError:
-                    docx2pdf_convert(temp_docx_path, pdf_path)
-                
-                # Limpar o arquivo temporário
-                os.unlink(temp_docx_path)
-                
-                # Atualizar o termo com o caminho do PDF apenas se não for uma prévia
-                if not custom_path:
-                    termo.arquivo_pdf.save(file_name, ContentFile(open(pdf_path, 'rb').read()), save=True)
-                
-                return pdf_path
-                
-            except Exception as e:
-                # Se ocorrer um erro, voltar para o método padrão de geração de PDF
-                logger.error(f"Erro ao converter Word para PDF: {str(e)}")
-        else:
-            # Se não houver arquivo Word, lançar erro e não permitir geração do termo
-            logger.error("O modelo de documento não possui um arquivo Word associado. Não é possível gerar o termo.")
-            raise Exception("O modelo de documento não possui um arquivo Word associado. Não é possível gerar o termo.")
+class TermoPDFStatusView(LoginRequiredMixin, View):
+    """Status da geração do PDF, consultado periodicamente pela página do termo."""
+
+    def get(self, request, uuid):
+        termo = get_object_or_404(TermoResponsabilidade, uuid=uuid)
+        if request.user != termo.colaborador and not request.user.is_staff:
+            raise PermissionDenied
+        
+        pronto = termo.status_pdf == TermoResponsabilidade.StatusPDF.GERADO and bool(termo.arquivo_pdf)
+        return JsonResponse({
+            'status_pdf': termo.status_pdf,
+            'status_pdf_display': termo.get_status_pdf_display(),
+            'pronto': pronto,
+            'download_url': reverse('documents:termo_download', kwargs={'uuid': termo.uuid}) if pronto else None,
+        })
 
 class TermoDownloadView(LoginRequiredMixin, View):
     def get(self, request, uuid):
         try:
-            termo = TermoResponsabilidade.objects.get(uuid=uuid)
+            termo = TermoResponsabilidade.objects.select_related('colaborador').get(uuid=uuid)
         except TermoResponsabilidade.DoesNotExist:
             messages.error(request, "Termo não encontrado.")
             return redirect('documents:termo_list')
@@ -500,20 +560,16 @@ class TermoDownloadView(LoginRequiredMixin, View):
         
         # Verifica se o arquivo PDF existe
         if not termo.arquivo_pdf:
-            # Tenta gerar o PDF caso ele não exista
+            # Gera o PDF caso ele não exista; requisições simultâneas aguardam
+            # a mesma geração em vez de renderizar o arquivo de novo
             try:
-                # Instanciar TermoSignView para gerar o PDF
-                sign_view = TermoSignView()
-                sign_view.gerar_pdf_termo(termo)
-                # Recarrega o termo para obter o arquivo atualizado
-                termo.refresh_from_db()
-                
-                if not termo.arquivo_pdf:
-                    messages.error(request, "Não foi possível gerar o PDF do termo.")
-                    return redirect('documents:termo_detail', uuid=termo.uuid)
+                gerado = gerar_pdf_sob_demanda(termo)
             except Exception as e:
                 messages.error(request, f"Erro ao gerar o PDF: {str(e)}")
                 return redirect('documents:termo_detail', uuid=termo.uuid)
+            if not gerado:
+                messages.info(request, "O PDF do termo está sendo gerado. Tente novamente em instantes.")
+                return redirect('documents:termo_detail', uuid=termo.uuid)
         
         # Verifica se o arquivo físico existe
         try:
@@ -527,28 +583,53 @@ class TermoDownloadView(LoginRequiredMixin, View):
             nome_colaborador = termo.colaborador.get_full_name().replace(' ', '_')
             nome_arquivo = f"termo_{nome_colaborador}_{termo.uuid}.pdf"
             
-            # Retorna o arquivo como resposta
-            with open(arquivo_path, 'rb') as pdf:
-                if 'download' in request.GET:
-                    # Se o parâmetro download estiver presente, força o download
-                    response = HttpResponse(pdf.read(), content_type='application/pdf')
-                    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
-                else:
-                    # Caso contrário, exibe no navegador
-                    response = HttpResponse(pdf.read(), content_type='application/pdf')
-                    response['Content-Disposition'] = f'inline; filename="{nome_arquivo}"'
-                    response['X-Frame-Options'] = 'SAMEORIGIN'
-                    response['Content-Security-Policy'] = "frame-ancestors 'self'"
-                
-                response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-                response['Pragma'] = 'no-cache'
-                response['Expires'] = '0'
-                return response
+            # O termo assinado não muda; o ETag deriva do hash da assinatura e da
+            # data do arquivo (que só muda se o PDF for regenerado)
+            mtime = int(os.path.getmtime(arquivo_path))
+            etag = f'"{termo.hash_assinatura or termo.uuid}-{mtime:x}"'
+            
+            # Com o parâmetro download força o download; caso contrário exibe no navegador
+            response = servir_arquivo(request, arquivo_path, nome_arquivo, etag, anexo='download' in request.GET)
+            if 'download' not in request.GET:
+                response['X-Frame-Options'] = 'SAMEORIGIN'
+                response['Content-Security-Policy'] = "frame-ancestors 'self'"
+            return response
             
         except Exception as e:
             messages.error(request, f"Erro ao acessar o arquivo: {str(e)}")
             return redirect('documents:termo_detail', uuid=termo.uuid)
 
+class MediaProtegidaView(LoginRequiredMixin, View):
+    """
+    Serve os arquivos de MEDIA_ROOT após verificar a permissão do usuário.
+
+    PDFs de termos ficam disponíveis para o colaborador do termo e para a
+    equipe; os demais arquivos (modelos, prévias), apenas para a equipe.
+    """
+
+    def get(self, request, path):
+        try:
+            caminho = safe_join(settings.MEDIA_ROOT, path)
+        except SuspiciousFileOperation:
+            raise Http404
+        
+        # A permissão depende só do caminho pedido e é verificada antes de
+        # olhar o disco: quem não tem acesso recebe 403 exista o arquivo ou não
+        if path.startswith('documentos/termos/'):
+            termo = TermoResponsabilidade.objects.filter(arquivo_pdf=path).select_related('colaborador').first()
+            if termo is None or (request.user != termo.colaborador and not request.user.is_staff):
+                raise PermissionDenied
+        elif not request.user.is_staff:
+            raise PermissionDenied
+        
+        if not os.path.isfile(caminho):
+            raise Http404
+        
+        stat = os.stat(caminho)
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+        content_type = mimetypes.guess_type(caminho)[0] or 'application/octet-stream'
+        return servir_arquivo(request, caminho, os.path.basename(caminho), etag, content_type=content_type)
+
 class TermoPreviewView(LoginRequiredMixin, View):
     def get(self, request, uuid):
         logger.info(f"Iniciando preview do termo {uuid}")
@@ -579,78 +660,26 @@ class TermoPreviewView(LoginRequiredMixin, View):
             messages.error(request, "Este termo não possui um modelo de documento associado.")
             return redirect('documents:termo_detail', uuid=termo.uuid)
             
-        # Criar uma versão temporária do PDF para prévia
+        # A prévia é servida do cache enquanto as entradas do documento não mudarem
         try:
-            logger.info(f"Gerando prévia do PDF para o termo {termo.uuid}")
-            
-            # Criar uma instância da TermoSignView para usar o método gerar_pdf_termo
-            sign_view = TermoSignView()
-            
-            # Simular temporariamente alguns dados para a prévia
-            # Salvar valores originais
-            original_ip = termo.ip_assinatura
-            original_hash = termo.hash_assinatura
-            original_status = termo.status
-            original_data = termo.data_assinatura
-            
-            # Temporariamente definir valores para a prévia
-            termo.ip_assinatura = "Prévia - Não assinado"
-            termo.hash_assinatura = "Prévia - Este documento ainda não foi assinado"
-            termo.status = TermoResponsabilidade.Status.PENDENTE
-            termo.data_assinatura = timezone.now()  # Data atual apenas para a prévia
+            contexto = montar_contexto_previa(termo)
+            chave = chave_previa(termo.modelo, contexto)
+            etag = f'"{chave}"'
             
-            # Gerar o PDF temporário
-            preview_dir = os.path.join(settings.MEDIA_ROOT, 'documentos', 'previews')
-            os.makedirs(preview_dir, exist_ok=True)
-            
-            preview_filename = f"preview_{termo.uuid}_{int(timezone.now().timestamp())}.pdf"
-            preview_path = os.path.join(preview_dir, preview_filename)
-            
-            # Usa a função existente para gerar o PDF, mas com um caminho diferente
-            try:
-                pdf_path = sign_view.gerar_pdf_termo(termo, custom_path=preview_path)
-                logger.info(f"Prévia do PDF gerada com sucesso: {pdf_path}")
-            except Exception as e:
-                logger.error(f"Erro ao gerar PDF na prévia: {str(e)}")
-                raise
+            if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                return response
             
-            # Restaurar valores originais
-            termo.ip_assinatura = original_ip
-            termo.hash_assinatura = original_hash
-            termo.status = original_status
-            termo.data_assinatura = original_data
-            termo.save()  # Salvar para garantir que não foram feitas alterações permanentes
+            logger.info(f"Obtendo prévia do PDF para o termo {termo.uuid}")
+            preview_path = obter_previa(termo, contexto, chave)
             
-            # Retornar o PDF como resposta
-            if os.path.exists(preview_path):
-                try:
-                    with open(preview_path, 'rb') as pdf:
-                        file_content = pdf.read()
-                        
-                    if not file_content:
-                        logger.error(f"Arquivo de prévia vazio: {preview_path}")
-                        messages.error(request, "Arquivo de prévia vazio. Tente novamente.")
-                        return redirect('documents:termo_detail', uuid=termo.uuid)
-                        
-                    response = HttpResponse(file_content, content_type='application/pdf')
-                    response['Content-Disposition'] = f'inline; filename="preview_{termo.uuid}.pdf"'
-                    response['X-Frame-Options'] = 'SAMEORIGIN'
-                    response['Content-Security-Policy'] = "frame-ancestors 'self'"
-                    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-                    response['Pragma'] = 'no-cache'
-                    response['Expires'] = '0'
-                    logger.info(f"Arquivo PDF sendo servido: {preview_path}")
-                    return response
-                except Exception as e:
-                    logger.error(f"Erro ao ler o arquivo de prévia: {str(e)}")
-                    messages.error(request, f"Erro ao ler o arquivo de prévia: {str(e)}")
-                    return redirect('documents:termo_detail', uuid=termo.uuid)
-            else:
-                logger.error(f"Arquivo de prévia não foi encontrado: {preview_path}")
-                messages.error(request, "Não foi possível gerar a prévia do documento.")
-                return redirect('documents:termo_detail', uuid=termo.uuid)
+            response = servir_arquivo(request, preview_path, f"preview_{termo.uuid}.pdf", etag)
+            response['X-Frame-Options'] = 'SAMEORIGIN'
+            response['Content-Security-Policy'] = "frame-ancestors 'self'"
+            return response
             
         except Exception as e:
             logger.error(f"Erro ao gerar prévia do documento: {e}")
             messages.error(request, f"Erro ao gerar prévia: {str(e)}")
-            return redirect('documents:termo_sign', uuid=termo.uuid)
\ No newline at end of file
+            return redirect('documents:termo_sign', uuid=termo.uuid)
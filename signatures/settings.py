@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro da lista para medir a requisição inteira; só é carregado com INSTRUMENTACAO['ATIVA']
+    'core.middleware.InstrumentacaoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,11 +77,55 @@ WSGI_APPLICATION = 'signatures.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE: 'sqlite' (padrão, desenvolvimento e testes) ou 'postgresql'
+# (produção; driver psycopg, listado no requirements.txt). No PostgreSQL as conexões
+# são mantidas entre requisições por DB_CONN_MAX_AGE segundos e verificadas
+# antes de serem reaproveitadas. Atrás de um pooler (PgBouncer em modo
+# transaction) use DB_POOLER=1, que desativa os cursores do lado do servidor
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'portal_assinatura'),
+            'USER': os.environ.get('DB_USER', 'portal'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_POOLER', '0') == '1',
+            'OPTIONS': {
+                'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME') or BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+            'OPTIONS': {
+                # Segundos que uma escrita aguarda a outra terminar antes de
+                # falhar com "database is locked"
+                'timeout': int(os.environ.get('DB_SQLITE_TIMEOUT', 20)),
+            },
+            # Banco de testes em arquivo, e não em memória: cada thread dos
+            # testes de concorrência abre sua própria conexão, em modo WAL
+            'TEST': {
+                'NAME': os.environ.get('DB_TEST_NAME') or BASE_DIR / 'test_db.sqlite3',
+            },
+        }
     }
+
+# PRAGMAs aplicados a cada conexão SQLite (ver core.signals). Com o WAL as
+# leituras não bloqueiam a escrita em andamento (e vice-versa), então
+# assinaturas simultâneas só esperam umas pelas outras
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('DB_SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': 'normal',
 }
 
 
@@ -125,6 +171,44 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Entrega de arquivos de mídia e PDFs: None (o Django envia os bytes),
+# 'x-accel-redirect' (nginx) ou 'x-sendfile' (Apache/lighttpd)
+DOCUMENTS_FILE_OFFLOAD = os.environ.get('DOCUMENTS_FILE_OFFLOAD') or None
+# Location interna do nginx apontando para MEDIA_ROOT (usada com x-accel-redirect)
+DOCUMENTS_OFFLOAD_PREFIX = os.environ.get('DOCUMENTS_OFFLOAD_PREFIX', '/protected-media/')
+
+# Cache: 'locmem' (padrão, por processo), 'file' (compartilhado pelos processos
+# da máquina, em CACHE_LOCATION) ou 'redis' (compartilhado entre máquinas;
+# CACHE_LOCATION é a URL, ex.: redis://127.0.0.1:6379/1, e requer o pacote redis)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHES = {
+    'default': {
+        'BACKEND': {
+            'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+            'file': 'django.core.cache.backends.filebased.FileBasedCache',
+            'redis': 'django.core.cache.backends.redis.RedisCache',
+        }[CACHE_BACKEND],
+        'LOCATION': os.environ.get('CACHE_LOCATION') or {
+            'locmem': 'portal-assinatura',
+            'file': os.path.join(BASE_DIR, 'cache'),
+            'redis': 'redis://127.0.0.1:6379/1',
+        }[CACHE_BACKEND],
+        'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'portal'),
+    }
+}
+
+# Tempo (s) em cache dos fragmentos das páginas de termos e equipamentos. A
+# chave inclui a data de modificação do objeto, então salvar já invalida;
+# termos assinados não mudam mais e ficam em cache por bem mais tempo
+DOCUMENTS_FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('DOCUMENTS_FRAGMENT_CACHE_TIMEOUT', 60 * 60))
+DOCUMENTS_FRAGMENT_CACHE_TIMEOUT_ASSINADO = int(
+    os.environ.get('DOCUMENTS_FRAGMENT_CACHE_TIMEOUT_ASSINADO', 30 * 24 * 60 * 60)
+)
+
+# Tempo (s) em cache das estatísticas do dashboard; salvar termos ou
+# equipamentos invalida o cache antes disso
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', 60))
+
 # Segurança de frames - permitir iframes na mesma origem
 X_FRAME_OPTIONS = 'SAMEORIGIN'
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -134,6 +218,68 @@ PDF_INLINE_CONTENT_TYPES = [
     'application/pdf',
 ]
 
+# Backend de conversão DOCX -> PDF ('libreoffice', 'docx2pdf' ou caminho de uma classe)
+DOCUMENTS_PDF_BACKEND = os.environ.get(
+    'DOCUMENTS_PDF_BACKEND',
+    'docx2pdf' if sys.platform == 'win32' else 'libreoffice',
+)
+DOCUMENTS_LIBREOFFICE = {
+    'BINARY': os.environ.get('SOFFICE_BINARY', 'soffice'),
+    'HOST': os.environ.get('SOFFICE_HOST', '127.0.0.1'),
+    'PORT': int(os.environ.get('SOFFICE_PORT', 0)),  # 0 = porta livre por processo
+    'TIMEOUT': 120,
+}
+
+# Tamanho máximo do cache de prévias em MEDIA_ROOT/documentos/previews
+DOCUMENTS_PREVIEW_CACHE_MAX_BYTES = int(os.environ.get('DOCUMENTS_PREVIEW_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
+# Fila de geração de PDF (processada por `manage.py processar_fila_pdf`)
+DOCUMENTS_PDF_ASYNC = os.environ.get('DOCUMENTS_PDF_ASYNC', '1') == '1'
+DOCUMENTS_PDF_FILA = {
+    'MAX_TENTATIVAS': 3,
+    'ATRASO_BASE': 30,  # segundos; dobra a cada nova tentativa
+    'TEMPO_LIMITE': 600,  # segundos até uma tarefa em processamento ser liberada
+    'ESPERA_DOWNLOAD': 10,  # segundos que um download aguarda a geração já em andamento do PDF
+}
+
+# Assinatura digital (PAdES) dos PDFs dos termos; sem KEY e CERT os PDFs
+# são gerados sem assinatura embutida
+DOCUMENTS_PDF_SIGNING = {
+    'KEY': os.environ.get('DOCUMENTS_SIGNING_KEY'),
+    'CERT': os.environ.get('DOCUMENTS_SIGNING_CERT'),
+    # Certificados intermediários, separados por vírgula
+    'CHAIN': [c for c in os.environ.get('DOCUMENTS_SIGNING_CHAIN', '').split(',') if c],
+    'PASSPHRASE': os.environ.get('DOCUMENTS_SIGNING_PASSPHRASE'),
+    # Raízes confiáveis na verificação (padrão: o próprio certificado e a cadeia)
+    'TRUST_ROOTS': [c for c in os.environ.get('DOCUMENTS_SIGNING_TRUST_ROOTS', '').split(',') if c],
+    'LOCATION': os.environ.get('DOCUMENTS_SIGNING_LOCATION', ''),
+}
+
+# Processos usados pela auditoria de integridade disparada pela tela de staff
+# (o comando auditar_termos usa um por núcleo)
+DOCUMENTS_AUDITORIA_PROCESSOS = int(os.environ.get('DOCUMENTS_AUDITORIA_PROCESSOS', 1))
+# A tela de staff audita só os termos assinados mais recentemente, para caber
+# no tempo de uma requisição; o acervo inteiro é auditado pelo comando
+DOCUMENTS_AUDITORIA_LIMITE = int(os.environ.get('DOCUMENTS_AUDITORIA_LIMITE', 2000))
+
+# Instrumentação de desempenho (core.middleware.InstrumentacaoMiddleware):
+# métricas por view em /metricas/, no formato do Prometheus, e log das
+# requisições acima de LIMITE_LENTA segundos. Uma fração AMOSTRAGEM_PERFIL
+# (0 a 1) das requisições roda sob o cProfile; o perfil das lentas é gravado
+# em DIRETORIO_PERFIS. /metricas/ responde à equipe, às requisições com o
+# TOKEN_METRICAS (cabeçalho "Authorization: Bearer <token>") e às que chegam
+# diretamente de um dos IPS_METRICAS. Atrás de um proxy na mesma máquina toda
+# requisição vem de 127.0.0.1, então requisições repassadas por proxy
+# (com X-Forwarded-For) nunca são liberadas pelo IP
+INSTRUMENTACAO = {
+    'ATIVA': os.environ.get('INSTRUMENTACAO', '0') == '1',
+    'LIMITE_LENTA': float(os.environ.get('INSTRUMENTACAO_LIMITE_LENTA', 1.0)),
+    'AMOSTRAGEM_PERFIL': float(os.environ.get('INSTRUMENTACAO_AMOSTRAGEM_PERFIL', 0)),
+    'DIRETORIO_PERFIS': os.environ.get('INSTRUMENTACAO_DIRETORIO_PERFIS', os.path.join(BASE_DIR, 'perfis')),
+    'IPS_METRICAS': [ip for ip in os.environ.get('INSTRUMENTACAO_IPS_METRICAS', '').split(',') if ip],
+    'TOKEN_METRICAS': os.environ.get('INSTRUMENTACAO_TOKEN_METRICAS') or None,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -1,7 +1,9 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from documents.views import MediaProtegidaView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -9,4 +11,7 @@ urlpatterns = [
     path('documentos/', include('documents.urls')),
     path('usuarios/', include('users.urls')),
     path('tinymce/', include('tinymce.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Arquivos de mídia passam pela verificação de permissão; a transferência
+    # pode ser delegada ao proxy (ver DOCUMENTS_FILE_OFFLOAD)
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), MediaProtegidaView.as_view(), name='media'),
+]
@@ -5,6 +5,7 @@ from django.urls import reverse_lazy
 from .models import User
 from django.contrib.auth import get_user_model
 from documents.models import TermoResponsabilidade, Equipamento
+from core.pagination import KeysetPaginationMixin
 from django.contrib import messages
 from django.utils.safestring import mark_safe
 from .forms import UserRegisterForm, ColaboradorAdminForm
@@ -37,11 +38,21 @@ class StaffRequiredMixin(UserPassesTestMixin):
     def test_func(self):
         return self.request.user.is_staff
 
-class UserListView(StaffRequiredMixin, ListView):
+class UserListView(StaffRequiredMixin, KeysetPaginationMixin, ListView):
     model = User
     template_name = 'users/colaborador_list.html'
     context_object_name = 'users'
-    ordering = ['first_name', 'last_name']
+    filtros = {
+        'ativo': 'is_active',
+        'de': 'date_joined__date__gte',
+        'ate': 'date_joined__date__lte',
+    }
+    ordenacoes = {
+        'nome': ('Nome', ['first_name', 'last_name']),
+        'username': ('Username', ['username']),
+        'recentes': ('Cadastro mais recente', ['-date_joined']),
+    }
+    ordenacao_padrao = 'nome'
 
 class UserDetailView(StaffRequiredMixin, DetailView):
     model = User